@@ -20,9 +20,9 @@
 from pkg_resources import DistributionNotFound, get_distribution
 
 from py7zr.cli import Cli
-from py7zr.exceptions import (Bad7zFile, DecompressionError,
-                              UnsupportedCompressionMethodError)
-from py7zr.py7zr import (ArchiveInfo, FileInfo, SevenZipFile, is_7zfile,
+from py7zr.exceptions import (Bad7zFile, CrcError, DecompressionError,
+                              UnsupportedCompressionMethodError, WrongPasswordError)
+from py7zr.py7zr import (ArchiveInfo, EndOfMember, FileInfo, SevenZipFile, is_7zfile,
                          pack_7zarchive, unpack_7zarchive)
 
 __copyright__ = 'Copyright (C) 2019 Hiroshi Miura'
@@ -33,8 +33,9 @@ except DistributionNotFound:
     # package is not installed
     __version__ = "unknown"
 
-__all__ = ['__version__', 'ArchiveInfo', 'FileInfo', 'SevenZipFile', 'is_7zfile',
-           'UnsupportedCompressionMethodError', 'Bad7zFile', 'DecompressionError',
+__all__ = ['__version__', 'ArchiveInfo', 'EndOfMember', 'FileInfo', 'SevenZipFile', 'is_7zfile',
+           'UnsupportedCompressionMethodError', 'Bad7zFile', 'DecompressionError', 'CrcError',
+           'WrongPasswordError',
            'pack_7zarchive', 'unpack_7zarchive']
 
 
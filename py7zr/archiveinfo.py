@@ -22,21 +22,27 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+import collections.abc
 import functools
 import io
 import os
 import struct
+from array import array
 from binascii import unhexlify
-from functools import reduce
 from io import BytesIO
-from operator import and_, or_
+from itertools import chain
 from struct import pack, unpack
-from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
-from py7zr.compression import SevenZipCompressor, SevenZipDecompressor
+try:
+    import numpy  # type: ignore
+except ImportError:
+    numpy = None
+
+from py7zr.compression import FolderReader, SevenZipCompressor, SevenZipDecompressor
 from py7zr.exceptions import Bad7zFile, UnsupportedCompressionMethodError
-from py7zr.helpers import ArchiveTimestamp, calculate_crc32
-from py7zr.properties import MAGIC_7Z, CompressionMethod, Property
+from py7zr.helpers import TIMESTAMP_ADJUST, ArchiveTimestamp, CrcWriter, PositionalReader, calculate_crc32
+from py7zr.properties import DECOMPRESS_CHUNKSIZE, MAGIC_7Z, CompressionMethod, Property
 
 MAX_LENGTH = 65536
 P7ZIP_MAJOR_VERSION = b'\x00'
@@ -44,13 +50,21 @@ P7ZIP_MINOR_VERSION = b'\x04'
 
 
 def read_crcs(file: BinaryIO, count: int) -> List[int]:
-    data = file.read(4 * count)
-    return [unpack('<L', data[i * 4:i * 4 + 4])[0] for i in range(count)]
+    return unpack_uint32s(file.read(4 * count), count)
+
+
+def unpack_uint32s(data: Union[bytes, memoryview], count: int) -> List[int]:
+    """unpack a vector of little endian unsigned longs at once."""
+    return list(unpack('<%dL' % count, data[:4 * count]))
+
+
+def unpack_uint64s(data: Union[bytes, memoryview], count: int) -> List[int]:
+    """unpack a vector of little endian unsigned long longs at once."""
+    return list(unpack('<%dQ' % count, data[:8 * count]))
 
 
 def write_crcs(file: BinaryIO, crcs):
-    for crc in crcs:
-        write_uint32(file, crc)
+    file.write(pack('<%dL' % len(crcs), *crcs))
 
 
 def read_bytes(file: BinaryIO, length: int) -> Tuple[bytes, ...]:
@@ -132,27 +146,40 @@ def write_uint64(file: BinaryIO, value: int):
     |  11111110    BYTE y[7]  :                         y
     |  11111111    BYTE y[8]  :                         y
     """
+    file.write(encode_uint64(value))
+
+
+def encode_uint64(value: int) -> bytes:
+    """encode UINT64 as write_uint64() does."""
     if value < 0x80:
-        file.write(pack('B', value))
-        return
-    if value > 0x01ffffffffffffff:
-        file.write(b'\xff')
-        file.write(value.to_bytes(8, 'little'))
-        return
-    byte_length = (value.bit_length() + 7) // 8
-    ba = bytearray(value.to_bytes(byte_length, 'little'))
-    high_byte = int(ba[-1])
-    if high_byte < 2 << (8 - byte_length - 1):
-        for x in range(byte_length - 1):
-            high_byte |= 0x80 >> x
-        file.write(pack('B', high_byte))
-        file.write(ba[:byte_length - 1])
-    else:
-        mask = 0x80
-        for x in range(byte_length):
-            mask |= 0x80 >> x
-        file.write(pack('B', mask))
-        file.write(ba)
+        return bytes((value,))
+    for n in range(1, 8):
+        if value < 1 << (7 * (n + 1)):
+            return bytes((((0xff00 >> n) & 0xff) | (value >> (8 * n)),)) + \
+                (value & ((1 << (8 * n)) - 1)).to_bytes(n, 'little')
+    return b'\xff' + value.to_bytes(8, 'little')
+
+
+def pack_uint64s(values: Sequence[int]) -> bytes:
+    """encode a vector of UINT64 at once."""
+    if len(values) == 0:
+        return b''
+    if max(values) < 0x80:
+        return bytes(values)
+    return b''.join(map(encode_uint64, values))
+
+
+_BOOLEAN_TABLE = [tuple(b & (0x80 >> i) != 0 for i in range(8)) for b in range(256)]
+
+
+def unpack_booleans(data: Union[bytes, memoryview], count: int) -> List[bool]:
+    """expand a bit vector, most significant bit first, into a list of count booleans."""
+    data = data[:bits_to_bytes(count)]
+    if numpy is not None:
+        return numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8))[:count].astype(bool).tolist()
+    result = list(chain.from_iterable(map(_BOOLEAN_TABLE.__getitem__, data)))
+    del result[count:]
+    return result
 
 
 def read_boolean(file: BinaryIO, count: int, checkall: bool = False) -> List[bool]:
@@ -160,29 +187,39 @@ def read_boolean(file: BinaryIO, count: int, checkall: bool = False) -> List[boo
         all_defined = file.read(1)
         if all_defined != unhexlify('00'):
             return [True] * count
-    result = []
-    b = 0
-    mask = 0
-    for i in range(count):
-        if mask == 0:
-            b = ord(file.read(1))
-            mask = 0x80
-        result.append(b & mask != 0)
-        mask >>= 1
-    return result
+    return unpack_booleans(file.read(bits_to_bytes(count)), count)
+
+
+def unpack_defined(data: memoryview, pos: int, count: int) -> Tuple[List[bool], int]:
+    """unpack a bit vector preceded by an 'all defined' flag byte from data at pos,
+    and return booleans and a position after the vector."""
+    if data[pos] != 0:
+        return [True] * count, pos + 1
+    end = pos + 1 + bits_to_bytes(count)
+    return unpack_booleans(data[pos + 1:end], count), end
+
+
+_BIT_CHARS = bytes.maketrans(b'\x00\x01', b'01')
+
+
+def pack_booleans(booleans: Sequence[bool]) -> bytes:
+    """pack booleans into a bit vector, most significant bit first, as a reverse of unpack_booleans()."""
+    count = len(booleans)
+    if count == 0:
+        return b''
+    if numpy is not None:
+        return numpy.packbits(numpy.array(booleans, dtype=bool)).tobytes()
+    bits = bytes(map(bool, booleans)).translate(_BIT_CHARS) + b'0' * (-count % 8)
+    return int(bits, 2).to_bytes(bits_to_bytes(count), 'big')
 
 
 def write_boolean(file: BinaryIO, booleans: List[bool], all_defined: bool = False):
-    if all_defined and reduce(and_, booleans, True):
+    if all_defined and all(booleans):
         file.write(b'\x01')
         return
     elif all_defined:
         file.write(b'\x00')
-    o = bytearray(-(-len(booleans) // 8))
-    for i, b in enumerate(booleans):
-        if b:
-            o[i // 8] |= 1 << (7 - i % 8)
-    file.write(o)
+    file.write(pack_booleans(booleans))
 
 
 def read_utf16(file: BinaryIO) -> str:
@@ -196,11 +233,25 @@ def read_utf16(file: BinaryIO) -> str:
     return val
 
 
+def unpack_utf16s(data: Union[bytes, memoryview], count: int) -> List[str]:
+    """decode count of NULL terminated utf-16 strings at once."""
+    names = str(data[:len(data) & ~1], 'utf-16LE').split('\x00', count)
+    if len(names) <= count:
+        raise Bad7zFile('%d names expected but only %d found' % (count, len(names) - 1))
+    del names[count:]
+    return names
+
+
 def write_utf16(file: BinaryIO, val: str):
     """write a utf-16 string to file"""
-    for c in val:
-        file.write(c.encode('utf-16LE'))
-    file.write(b'\x00\x00')
+    file.write(val.encode('utf-16LE') + b'\x00\x00')
+
+
+def pack_utf16s(values: Sequence[str]) -> bytes:
+    """encode strings into NULL terminated utf-16 strings at once, as a reverse of unpack_utf16s()."""
+    if len(values) == 0:
+        return b''
+    return ('\x00'.join(values) + '\x00').encode('utf-16LE')
 
 
 def bits_to_bytes(bit_length: int) -> int:
@@ -296,7 +347,7 @@ class Folder:
     """
 
     __slots__ = ['unpacksizes', 'solid', 'coders', 'digestdefined', 'totalin', 'totalout',
-                 'bindpairs', 'packed_indices', 'crc', 'decompressor', 'compressor', 'files']
+                 'bindpairs', 'packed_indices', 'crc', 'decompressor', 'compressor', 'files', 'password']
 
     def __init__(self) -> None:
         self.unpacksizes = None  # type: Optional[List[int]]
@@ -314,6 +365,22 @@ class Folder:
         self.decompressor = None  # type: Optional[SevenZipDecompressor]
         self.compressor = None  # type: Optional[SevenZipCompressor]
         self.files = None
+        # password to decrypt the folder, set by SevenZipFile object
+        self.password = None  # type: Optional[str]
+
+    def __getstate__(self):
+        # compressor and decompressor objects hold a native codec state which cannot be pickled,
+        # it is recreated on demand in a destination process.
+        state = {key: getattr(self, key, None) for key in self.__slots__}
+        state['decompressor'] = None
+        state['compressor'] = None
+        # a file list refers to a file table of a whole archive, which is not needed to decode a folder.
+        state['files'] = None
+        return state
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
 
     @classmethod
     def retrieve(cls, file: BinaryIO):
@@ -390,7 +457,7 @@ class Folder:
             return self.decompressor
         else:
             try:
-                self.decompressor = SevenZipDecompressor(self.coders, size, self.crc)
+                self.decompressor = SevenZipDecompressor(self.coders, size, self.crc, self.password)
             except Exception as e:
                 raise e
             if self.decompressor is not None:
@@ -578,22 +645,25 @@ class SubstreamsInfo:
         if self.unpacksizes is None:
             raise ValueError
         write_byte(file, Property.SUBSTREAMS_INFO)
-        if not functools.reduce(lambda x, y: x and (y == 1), self.num_unpackstreams_folders, True):
+        if any(n != 1 for n in self.num_unpackstreams_folders):
             write_byte(file, Property.NUM_UNPACK_STREAM)
-            for n in self.num_unpackstreams_folders:
-                write_uint64(file, n)
+            file.write(pack_uint64s(self.num_unpackstreams_folders))
         write_byte(file, Property.SIZE)
+        # size of the last stream in each folder is not stored
+        sizes = []  # type: List[int]
         idx = 0
         for i in range(numfolders):
-            for j in range(1, self.num_unpackstreams_folders[i]):
-                size = self.unpacksizes[idx]
-                write_uint64(file, size)
-                idx += 1
-            idx += 1
-        if functools.reduce(lambda x, y: x or y, self.digestsdefined, False):
+            num = self.num_unpackstreams_folders[i]
+            sizes.extend(self.unpacksizes[idx:idx + num - 1])
+            idx += max(num, 1)
+        file.write(pack_uint64s(sizes))
+        if any(self.digestsdefined):
             write_byte(file, Property.CRC)
             write_boolean(file, self.digestsdefined, all_defined=True)
-            write_crcs(file, self.digests)
+            if all(self.digestsdefined):
+                write_crcs(file, self.digests)
+            else:
+                write_crcs(file, [d for d, defined in zip(self.digests, self.digestsdefined) if defined])
         write_byte(file, Property.END)
 
 
@@ -627,6 +697,19 @@ class StreamsInfo:
         if pid != Property.END:
             raise Bad7zFile('end id expected but %s found' % repr(pid))
 
+    def folder_positions(self) -> List[Tuple[int, int]]:
+        """Return start and end offsets of packed streams of each folder from packpos.
+        Packed streams of a folder are its input streams which are not bound to other coders,
+        e.g. BCJ2 folder has four of them, so a folder starts at a running sum of their numbers."""
+        positions = self.packinfo.packpositions
+        result = []  # type: List[Tuple[int, int]]
+        index = 0
+        for folder in self.unpackinfo.folders:
+            num = max(folder.totalin - len(folder.bindpairs), 1)
+            result.append((positions[index], positions[index + num]))
+            index += num
+        return result
+
     def write(self, file: BinaryIO):
         write_byte(file, Property.MAIN_STREAMS_INFO)
         self._write(file)
@@ -663,26 +746,358 @@ class HeaderStreamsInfo(StreamsInfo):
         self._write(file)
 
 
+class FileTable:
+    """Column oriented table of properties of files in an archive.
+
+    Sizes, CRCs, attributes and timestamps are stored in arrays, names are stored as
+    basenames and indexes of shared directory names, and a folder of each file is stored
+    as an index of `folders`. An item of the table is a dict-like :class:`FileRecord` view of a row,
+    so ``files_info.files[i]['filename']`` works as same as a list of dicts. A value which does not
+    fit in a column, such as a property set by an application, is kept in a sparse dict of the row.
+    Undefined numeric values are read as None.
+    Columns can be decoded lazily; a loader registered for property keys is called on first access
+    to one of the keys.
+    """
+
+    INT_COLUMNS = frozenset(['attributes', 'digest', 'compressed', 'maxsize', 'startpos'])
+    TIME_COLUMNS = frozenset(['creationtime', 'lastaccesstime', 'lastwritetime'])
+    STREAM_COLUMNS = ('folder', 'uncompressed', 'compressed', 'maxsize', 'digest', 'packsizes')
+
+    __slots__ = ['numfiles', 'emptystream', 'columns', 'folders', 'folder_index', '_folder_ids', 'uncompressed',
+                 'numcoders', 'packsizes', 'dirnames', '_dirids', 'dirindex', 'basenames', 'extras', 'loaders']
+
+    def __init__(self, numfiles: int) -> None:
+        self.numfiles = numfiles
+        self.emptystream = bytearray(numfiles)
+        self.columns = {}  # type: Dict[str, array]
+        self.folders = []  # type: List[Folder]
+        self.folder_index = None  # type: Optional[array]
+        self._folder_ids = {}  # type: Dict[int, int]
+        self.uncompressed = None  # type: Optional[array]
+        self.numcoders = None  # type: Optional[bytearray]
+        self.packsizes = {}  # type: Dict[int, List[int]]
+        self.dirnames = ['']  # type: List[str]
+        self._dirids = {'': 0}  # type: Dict[str, int]
+        self.dirindex = array('l', [0]) * numfiles
+        self.basenames = [None] * numfiles  # type: List[Optional[str]]
+        self.extras = {}  # type: Dict[int, Dict[str, Any]]
+        self.loaders = {}  # type: Dict[str, Callable[[], None]]
+
+    def __len__(self) -> int:
+        return self.numfiles
+
+    def __getstate__(self):
+        # pending loaders refer to header data which is not kept, and folder ids are object ids of a process.
+        self.load()
+        state = {key: getattr(self, key) for key in self.__slots__}
+        del state['_folder_ids']
+        del state['loaders']
+        return state
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+        self._folder_ids = {id(folder): i for i, folder in enumerate(self.folders)}
+        self.loaders = {}
+
+    def add_loader(self, keys: Sequence[str], loader: Callable[[], None]) -> None:
+        """register a loader which fills columns of keys on first access to one of them."""
+        for key in keys:
+            self.loaders[key] = loader
+
+    def load(self, keys: Optional[Sequence[str]] = None) -> None:
+        """call pending loaders of keys, or all the pending loaders when keys is None."""
+        if keys is None:
+            keys = list(self.loaders.keys())
+        for key in keys:
+            self._load(key)
+
+    def _load(self, key: str) -> None:
+        loader = self.loaders.get(key)
+        if loader is not None:
+            for k in [k for k, v in self.loaders.items() if v is loader]:
+                del self.loaders[k]
+            loader()
+
+    def column(self, key: str) -> Optional[array]:
+        """return an array of an integer or timestamp property, or None when it is not defined."""
+        if self.loaders:
+            self._load(key)
+        return self.columns.get(key)
+
+    def __getitem__(self, index: int) -> 'FileRecord':
+        if index < 0:
+            index += self.numfiles
+        if not 0 <= index < self.numfiles:
+            raise IndexError('file index out of range')
+        return FileRecord(self, index)
+
+    def __iter__(self):
+        return (FileRecord(self, i) for i in range(self.numfiles))
+
+    def set_folders(self, folders: List[Folder]) -> None:
+        """set folders which are referred by 'folder' property of files."""
+        self.folders = folders
+        self._folder_ids = {id(folder): i for i, folder in enumerate(folders)}
+        self.folder_index = array('l', [-1]) * self.numfiles
+        self.uncompressed = array('Q', [0]) * self.numfiles
+        self.numcoders = bytearray(b'\x01') * self.numfiles
+        self.columns['maxsize'] = array('q', [0]) * self.numfiles
+        self.columns['compressed'] = array('q', [0]) * self.numfiles
+
+    def set_stream(self, index: int, folder_index: int, maxsize: Optional[int], compressed: Optional[int],
+                   uncompressed: List[int], packsizes: List[int], digest: Optional[int]) -> None:
+        """set properties of a file which is stored in a folder at once."""
+        self.folder_index[index] = folder_index
+        self.columns['maxsize'][index] = -1 if maxsize is None else maxsize
+        if compressed is None or isinstance(compressed, int):
+            self.columns['compressed'][index] = -1 if compressed is None else compressed
+        else:
+            self.set(index, 'compressed', compressed)
+        if len(uncompressed) == 1 or uncompressed.count(uncompressed[0]) == len(uncompressed):
+            self.uncompressed[index] = uncompressed[0]
+            self.numcoders[index] = len(uncompressed)
+        else:
+            self.set(index, 'uncompressed', uncompressed)
+        if folder_index not in self.packsizes:
+            self.packsizes[folder_index] = packsizes
+        if digest is not None:
+            self.set(index, 'digest', digest)
+
+    def set_names(self, names: List[str]) -> None:
+        for i, name in enumerate(names):
+            self._set_name(i, name)
+
+    def set_column(self, key: str, values: List[Optional[int]]) -> None:
+        """set a whole column of an integer or timestamp property."""
+        self.columns[key] = array('q', [-1 if v is None else v for v in values])
+
+    def name(self, index: int) -> str:
+        if self.loaders:
+            self._load('filename')
+        basename = self.basenames[index]
+        if basename is None:
+            raise KeyError('filename')
+        dirname = self.dirnames[self.dirindex[index]]
+        return dirname + basename if dirname else basename
+
+    def names(self) -> List[str]:
+        """return names of all the files, None for a file without a name."""
+        if self.loaders:
+            self._load('filename')
+        dirnames = self.dirnames
+        return [dirnames[d] + b if b is not None else None for d, b in zip(self.dirindex, self.basenames)]
+
+    def _set_name(self, index: int, name: str) -> None:
+        head, sep, basename = name.rpartition('/')
+        dirname = head + sep
+        dirid = self._dirids.get(dirname)
+        if dirid is None:
+            dirid = len(self.dirnames)
+            self.dirnames.append(dirname)
+            self._dirids[dirname] = dirid
+        self.dirindex[index] = dirid
+        self.basenames[index] = basename
+
+    def keys(self, index: int) -> List[str]:
+        self.load()
+        keys = ['emptystream']
+        if self.basenames[index] is not None:
+            keys.append('filename')
+        keys.extend(self.columns.keys())
+        if self.folder_index is not None:
+            keys.extend(['folder', 'uncompressed'])
+            if self.folder_index[index] < 0 or self.folder_index[index] in self.packsizes:
+                keys.append('packsizes')
+        extra = self.extras.get(index)
+        if extra is not None:
+            keys.extend(k for k in extra if k not in keys)
+        return keys
+
+    def get(self, index: int, key: str) -> Any:
+        if self.loaders:
+            self._load(key)
+        if self.extras:
+            extra = self.extras.get(index)
+            if extra is not None and key in extra:
+                return extra[key]
+        column = self.columns.get(key)
+        if column is not None:
+            value = column[index]
+            if value < 0:
+                return None
+            return ArchiveTimestamp(value) if key in self.TIME_COLUMNS else value
+        if key == 'filename':
+            return self.name(index)
+        if key == 'emptystream':
+            return self.emptystream[index] != 0
+        if self.folder_index is not None:
+            if key == 'folder':
+                folder_index = self.folder_index[index]
+                return self.folders[folder_index] if folder_index >= 0 else None
+            if key == 'uncompressed':
+                return [self.uncompressed[index]] * self.numcoders[index]
+            if key == 'packsizes':
+                folder_index = self.folder_index[index]
+                return self.packsizes[folder_index] if folder_index >= 0 else [0]
+        raise KeyError(key)
+
+    def set(self, index: int, key: str, value: Any) -> None:
+        if self.loaders:
+            self._load(key)
+        if not self._set_column_value(index, key, value):
+            self.extras.setdefault(index, {})[key] = value
+            return
+        extra = self.extras.get(index)
+        if extra is not None and key in extra:
+            del extra[key]
+            if not extra:
+                del self.extras[index]
+
+    def _set_column_value(self, index: int, key: str, value: Any) -> bool:
+        """store value in a column, and return False when it does not fit in columns."""
+        if key == 'filename':
+            if not isinstance(value, str):
+                return False
+            self._set_name(index, value)
+        elif key == 'emptystream':
+            if not isinstance(value, bool):
+                return False
+            self.emptystream[index] = value
+        elif key in self.INT_COLUMNS or key in self.TIME_COLUMNS:
+            if value is not None and not (isinstance(value, int) and 0 <= value < 1 << 63):
+                return False
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = array('q', [-1]) * self.numfiles
+            column[index] = -1 if value is None else value
+        elif self.folder_index is None:
+            return False
+        elif key == 'folder':
+            if value is not None and id(value) not in self._folder_ids:
+                return False
+            self.folder_index[index] = -1 if value is None else self._folder_ids[id(value)]
+        elif key == 'uncompressed':
+            if not (isinstance(value, (list, tuple)) and 0 < len(value) < 256 and value.count(value[0]) == len(value)
+                    and isinstance(value[0], int) and 0 <= value[0] < 1 << 64):
+                return False
+            self.uncompressed[index] = value[0]
+            self.numcoders[index] = len(value)
+        elif key == 'packsizes':
+            folder_index = self.folder_index[index]
+            if folder_index < 0:
+                return value == [0]
+            if self.packsizes.setdefault(folder_index, value) != value:
+                return False
+        else:
+            return False
+        return True
+
+    def delete(self, index: int, key: str) -> None:
+        if self.loaders:
+            self._load(key)
+        extra = self.extras.get(index)
+        if extra is not None and key in extra:
+            del extra[key]
+        elif key == 'filename' and self.basenames[index] is not None:
+            self.basenames[index] = None
+        elif key in self.columns:
+            self.columns[key][index] = -1
+        else:
+            raise KeyError(key)
+
+    def numeric_columns(self) -> Dict[str, array]:
+        """return arrays of numeric properties of files keyed by property names.
+        Undefined values are -1, and 'folder' holds indexes of folders."""
+        self.load()
+        columns = dict(self.columns)  # type: Dict[str, array]
+        columns['emptystream'] = array('B', self.emptystream)
+        if self.folder_index is not None:
+            columns['folder'] = self.folder_index
+            columns['uncompressed'] = self.uncompressed
+        return columns
+
+    def to_numpy(self) -> Dict[str, Any]:
+        """return numeric columns as NumPy arrays which share memory with the table.
+        It raises ImportError when NumPy is not installed."""
+        if numpy is None:
+            raise ImportError('NumPy is required to export a file table.')
+        return {key: numpy.frombuffer(column, dtype=numpy.dtype(column.typecode))
+                for key, column in self.numeric_columns().items()}
+
+
+class FileRecord(collections.abc.MutableMapping):
+    """dict-like view of a row of FileTable."""
+
+    __slots__ = ['table', 'index']
+
+    def __init__(self, table: FileTable, index: int) -> None:
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key: str) -> Any:
+        return self.table.get(self.index, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.table.set(self.index, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self.table.delete(self.index, key)
+
+    def __iter__(self):
+        return iter(self.table.keys(self.index))
+
+    def __len__(self) -> int:
+        return len(self.table.keys(self.index))
+
+    def __repr__(self) -> str:
+        return 'FileRecord({!r})'.format(dict(self))
+
+
+class FileTableView:
+    """Sequence of FileRecord of selected files in FileTable."""
+
+    __slots__ = ['table', 'ids']
+
+    def __init__(self, table: FileTable, ids: Sequence[int]) -> None:
+        self.table = table
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> FileRecord:
+        return FileRecord(self.table, self.ids[index])
+
+    def __iter__(self):
+        table = self.table
+        return (FileRecord(table, i) for i in self.ids)
+
+
 class FilesInfo:
     """ holds file properties """
 
     __slots__ = ['files', 'emptyfiles', 'antifiles']
 
     def __init__(self):
-        self.files = []  # type: List[Dict[str, Any]]
+        self.files = []  # type: Union[List[Dict[str, Any]], FileTable]
         self.emptyfiles = []  # type: List[bool]
         self.antifiles = None
 
     @classmethod
-    def retrieve(cls, file: BinaryIO):
+    def retrieve(cls, file: BinaryIO, lazy: bool = False):
         obj = cls()
-        obj._read(file)
+        obj._read(file, lazy)
         return obj
 
-    def _read(self, fp: BinaryIO):
+    def _read(self, fp: BinaryIO, lazy: bool = False):
+        """read properties of files. When lazy is True, names, timestamps, attributes and start positions
+        are decoded on first access instead."""
         numfiles = read_uint64(fp)
-        self.files = [{'emptystream': False} for _ in range(numfiles)]
+        self.files = FileTable(numfiles)
         numemptystreams = 0
+        # property data is sliced from a buffer of header without copy when it is in memory
+        view = fp.getbuffer() if isinstance(fp, io.BytesIO) else None
         while True:
             prop = fp.read(1)
             if prop == Property.END:
@@ -692,167 +1107,174 @@ class FilesInfo:
                 # Added by newer versions of 7z to adjust padding.
                 fp.seek(size, os.SEEK_CUR)
                 continue
-            buffer = io.BytesIO(fp.read(size))
+            if view is not None:
+                pos = fp.tell()
+                data = view[pos:pos + size]
+                fp.seek(size, os.SEEK_CUR)
+            else:
+                data = memoryview(fp.read(size))
             if prop == Property.EMPTY_STREAM:
-                isempty = read_boolean(buffer, numfiles, checkall=False)
-                list(map(lambda x, y: x.update({'emptystream': y}), self.files, isempty))  # type: ignore
+                isempty = unpack_booleans(data, numfiles)
+                self.files.emptystream[:] = bytearray(isempty)
                 numemptystreams += isempty.count(True)
             elif prop == Property.EMPTY_FILE:
-                self.emptyfiles = read_boolean(buffer, numemptystreams, checkall=False)
+                self.emptyfiles = unpack_booleans(data, numemptystreams)
             elif prop == Property.ANTI:
-                self.antifiles = read_boolean(buffer, numemptystreams, checkall=False)
+                self.antifiles = unpack_booleans(data, numemptystreams)
             elif prop == Property.NAME:
-                external = buffer.read(1)
-                if external == b'\x00':
-                    self._read_name(buffer)
-                else:
-                    dataindex = read_uint64(buffer)
-                    current_pos = fp.tell()
-                    fp.seek(dataindex, 0)
-                    self._read_name(fp)
-                    fp.seek(current_pos, 0)
+                self.files.add_loader(['filename'], functools.partial(self._read_name, self._get_vector_data(fp, data, 0)))
             elif prop == Property.CREATION_TIME:
-                self._read_times(buffer, 'creationtime')
+                self._add_column_loader(fp, data, 'creationtime', unpack_uint64s)
             elif prop == Property.LAST_ACCESS_TIME:
-                self._read_times(buffer, 'lastaccesstime')
+                self._add_column_loader(fp, data, 'lastaccesstime', unpack_uint64s)
             elif prop == Property.LAST_WRITE_TIME:
-                self._read_times(buffer, 'lastwritetime')
+                self._add_column_loader(fp, data, 'lastwritetime', unpack_uint64s)
             elif prop == Property.ATTRIBUTES:
-                defined = read_boolean(buffer, numfiles, checkall=True)
-                external = buffer.read(1)
-                if external == b'\x00':
-                    self._read_attributes(buffer, defined)
-                else:
-                    dataindex = read_uint64(buffer)
-                    # try to read external data
-                    current_pos = fp.tell()
-                    fp.seek(dataindex, 0)
-                    self._read_attributes(fp, defined)
-                    fp.seek(current_pos, 0)
+                self._add_column_loader(fp, data, 'attributes', unpack_uint32s)
             elif prop == Property.START_POS:
-                self._read_start_pos(buffer)
+                self._add_column_loader(fp, data, 'startpos', unpack_uint64s)
             else:
                 raise Bad7zFile('invalid type %r' % prop)
+        if not lazy:
+            self.files.load()
 
-    def _read_name(self, buffer: BinaryIO) -> None:
-        for f in self.files:
-            f['filename'] = read_utf16(buffer)
-
-    def _read_attributes(self, buffer: BinaryIO, defined: List[bool]) -> None:
-        for idx, f in enumerate(self.files):
-            f['attributes'] = read_uint32(buffer)[0] if defined[idx] else None
-
-    def _read_times(self, fp: BinaryIO, name: str) -> None:
-        defined = read_boolean(fp, len(self.files), checkall=True)
-        # NOTE: the "external" flag is currently ignored, should be 0x00
-        external = fp.read(1)
-        assert external == b'\x00'
-        for i, f in enumerate(self.files):
-            f[name] = ArchiveTimestamp(read_real_uint64(fp)[0]) if defined[i] else None
-
-    def _read_start_pos(self, fp: BinaryIO) -> None:
-        defined = read_boolean(fp, len(self.files), checkall=True)
-        # NOTE: the "external" flag is currently ignored, should be 0x00
-        external = fp.read(1)
-        assert external == 0x00
-        for i, f in enumerate(self.files):
-            f['startpos'] = read_real_uint64(fp)[0] if defined[i] else None
-
-    def _write_times(self, fp: BinaryIO, propid, name: str) -> None:
-        write_byte(fp, propid)
-        defined = []  # type: List[bool]
-        num_defined = 0  # type: int
-        for f in self.files:
-            if name in f.keys():
-                if f[name] is not None:
-                    defined.append(True)
-                    num_defined += 1
-        size = num_defined * 8 + 2
-        if not reduce(and_, defined, True):
-            size += bits_to_bytes(num_defined)
-        write_uint64(fp, size)
-        write_boolean(fp, defined, all_defined=True)
-        write_byte(fp, b'\x00')
-        for i, file in enumerate(self.files):
-            if defined[i]:
-                write_real_uint64(fp, ArchiveTimestamp.from_datetime(file[name]))
-            else:
-                pass
+    @staticmethod
+    def _get_vector_data(fp: BinaryIO, data: memoryview, pos: int) -> memoryview:
+        """return vector data which follows an external flag at pos of property data.
+        When the flag is set, the vector is stored in fp at a data index."""
+        if data[pos] == 0:
+            return data[pos + 1:]
+        dataindex = read_uint64(io.BytesIO(data[pos + 1:]))
+        current_pos = fp.tell()
+        fp.seek(dataindex, 0)
+        external = memoryview(fp.read())
+        fp.seek(current_pos, 0)
+        return external
 
-    def _write_prop_bool_vector(self, fp: BinaryIO, propid, vector) -> None:
-        write_byte(fp, propid)
-        write_boolean(fp, vector, all_defined=True)
+    @staticmethod
+    def _scatter(values: Sequence[Any], defined: List[bool]) -> List[Any]:
+        """distribute values to defined positions, None for others."""
+        if len(values) == len(defined):
+            return list(values)
+        it = iter(values)
+        return [next(it) if d else None for d in defined]
+
+    def _read_name(self, data: memoryview) -> None:
+        self.files.set_names(unpack_utf16s(data, len(self.files)))
+
+    def _add_column_loader(self, fp: BinaryIO, data: memoryview, name: str,
+                           unpack: Callable[[memoryview, int], List[int]]) -> None:
+        """register a loader of a column stored as a defined vector followed by an external flag and values.
+        An external vector is read from fp here, because fp may not be available at loading time."""
+        pos = 1 if data[0] != 0 else 1 + bits_to_bytes(len(self.files))
+        values = self._get_vector_data(fp, data, pos)
+        self.files.add_loader([name], functools.partial(self._read_column, data[:pos], values, name, unpack))
+
+    def _read_column(self, defined_data: memoryview, data: memoryview, name: str,
+                     unpack: Callable[[memoryview, int], List[int]]) -> None:
+        defined, _ = unpack_defined(defined_data, 0, len(self.files))
+        values = unpack(data, defined.count(True))
+        self.files.set_column(name, self._scatter(values, defined))
 
     @staticmethod
-    def _are_there(vector) -> bool:
-        if vector is not None:
-            if functools.reduce(or_, vector, False):
-                return True
-        return False
-
-    def _write_names(self, file: BinaryIO):
-        name_defined = 0
-        names = []
-        name_size = 0
-        for f in self.files:
-            if f.get('filename', None) is not None:
-                name_defined += 1
-                names.append(f['filename'])
-                name_size += len(f['filename'].encode('utf-16LE')) + 2  # len(str + NULL_WORD)
-        if name_defined > 0:
-            write_byte(file, Property.NAME)
-            write_uint64(file, name_size + 1)
-            write_byte(file, b'\x00')
-            for n in names:
-                write_utf16(file, n)
-
-    def _write_attributes(self, file):
-        defined = []  # type: List[bool]
-        num_defined = 0
-        for f in self.files:
-            if 'attributes' in f.keys() and f['attributes'] is not None:
-                defined.append(True)
-                num_defined += 1
-            else:
-                defined.append(False)
-        size = num_defined * 4 + 2
-        if num_defined != len(defined):
-            size += bits_to_bytes(num_defined)
-        write_byte(file, Property.ATTRIBUTES)
-        write_uint64(file, size)
-        write_boolean(file, defined, all_defined=True)
-        write_byte(file, b'\x00')
-        for i, f in enumerate(self.files):
-            if defined[i]:
-                write_uint32(file, f['attributes'])
+    def _to_table(files: List[Dict[str, Any]]) -> FileTable:
+        """build a FileTable of properties written in header from a list of dicts of files."""
+        table = FileTable(len(files))
+        table.emptystream[:] = bytes(bool(f.get('emptystream', False)) for f in files)
+        for i, f in enumerate(files):
+            name = f.get('filename')
+            if name is not None:
+                table._set_name(i, name)
+        for key in ('creationtime', 'lastaccesstime', 'lastwritetime'):
+            values = [f.get(key) for f in files]
+            if any(v is not None for v in values):
+                if all(isinstance(v, float) for v in values):
+                    # fast path for timestamps from os.stat()
+                    table.set_column(key, [int((v - TIMESTAMP_ADJUST) * 10000000.0) for v in values])
+                else:
+                    table.set_column(key, [FilesInfo._to_filetime(v) for v in values])
+        values = [f.get('attributes') for f in files]
+        if any(v is not None for v in values):
+            table.set_column('attributes', values)
+        return table
+
+    @staticmethod
+    def _to_filetime(value: Any) -> Optional[int]:
+        """convert a python timestamp to FILETIME, FILETIME values are left as is."""
+        if value is None or isinstance(value, int):
+            return value
+        return ArchiveTimestamp.from_datetime(value)
+
+    @staticmethod
+    def _get_column_values(table: FileTable, key: str) -> Tuple[List[bool], List[int]]:
+        """return a defined vector and defined values of a property of all the files."""
+        column = table.column(key)
+        extras = [(i, extra[key]) for i, extra in table.extras.items() if key in extra]
+        if not extras:
+            if column is None:
+                return [], []
+            return [v >= 0 for v in column], [v for v in column if v >= 0]
+        values = [None] * len(table) if column is None else [v if v >= 0 else None for v in column]
+        for i, value in extras:
+            values[i] = value
+        return [v is not None for v in values], [v for v in values if v is not None]
+
+    @staticmethod
+    def _write_vector(file: BinaryIO, propid: bytes, defined: List[bool], data: bytes) -> None:
+        """write a property of a defined vector, an external flag and values."""
+        if all(defined):
+            header = b'\x01\x00'
+        else:
+            header = b'\x00' + pack_booleans(defined) + b'\x00'
+        write_byte(file, propid)
+        write_uint64(file, len(header) + len(data))
+        file.write(header)
+        file.write(data)
 
     def write(self, file: BinaryIO):
+        """write properties of files. Each property is encoded at once from columns of a FileTable;
+        a list of dicts of files is converted into a FileTable before writing."""
         assert self.files is not None
+        if isinstance(self.files, FileTable):
+            table = self.files
+        else:
+            table = self._to_table(self.files)
         write_byte(file, Property.FILES_INFO)
-        numfiles = len(self.files)
+        numfiles = len(table)
         write_uint64(file, numfiles)
-        emptystreams = []  # List[bool]
-        for f in self.files:
-            emptystreams.append(f['emptystream'])
-        if self._are_there(emptystreams):
+        emptystreams = [b != 0 for b in table.emptystream]
+        numemptystreams = emptystreams.count(True)
+        if numemptystreams > 0:
             write_byte(file, Property.EMPTY_STREAM)
             write_uint64(file, bits_to_bytes(numfiles))
-            write_boolean(file, emptystreams, all_defined=False)
-        else:
-            if self._are_there(self.emptyfiles):
-                self._write_prop_bool_vector(file, Property.EMPTY_FILE, self.emptyfiles)
-            if self._are_there(self.antifiles):
-                self._write_prop_bool_vector(file, Property.ANTI, self.antifiles)
+            file.write(pack_booleans(emptystreams))
+            for propid, vector in ((Property.EMPTY_FILE, self.emptyfiles), (Property.ANTI, self.antifiles)):
+                if vector is not None and len(vector) == numemptystreams and any(vector):
+                    write_byte(file, propid)
+                    write_uint64(file, bits_to_bytes(numemptystreams))
+                    file.write(pack_booleans(vector))
         # Name
-        self._write_names(file)
+        names = [n for n in table.names() if n is not None]
+        if names:
+            data = pack_utf16s(names)
+            write_byte(file, Property.NAME)
+            write_uint64(file, len(data) + 1)
+            write_byte(file, b'\x00')
+            file.write(data)
         # timestamps
-        self._write_times(file, Property.CREATION_TIME, 'creationtime')
-        self._write_times(file, Property.LAST_ACCESS_TIME, 'lastaccesstime')
-        self._write_times(file, Property.LAST_WRITE_TIME, 'lastwritetime')
+        for propid, key in ((Property.CREATION_TIME, 'creationtime'), (Property.LAST_ACCESS_TIME, 'lastaccesstime'),
+                            (Property.LAST_WRITE_TIME, 'lastwritetime')):
+            defined, values = self._get_column_values(table, key)
+            if values:
+                if table.extras:
+                    values = [self._to_filetime(v) for v in values]
+                self._write_vector(file, propid, defined, pack('<%dQ' % len(values), *values))
         # start_pos
         # FIXME: TBD
         # attribute
-        self._write_attributes(file)
+        defined, values = self._get_column_values(table, 'attributes')
+        if values:
+            self._write_vector(file, Property.ATTRIBUTES, defined, pack('<%dL' % len(values), *values))
         write_byte(file, Property.END)
 
 
@@ -872,17 +1294,17 @@ class Header:
         self._start_pos = 0
 
     @classmethod
-    def retrieve(cls, fp: BinaryIO, buffer: BytesIO, start_pos: int):
+    def retrieve(cls, fp: BinaryIO, buffer: BytesIO, start_pos: int, lazy: bool = False):
         obj = cls()
-        obj._read(fp, buffer, start_pos)
+        obj._read(fp, buffer, start_pos, lazy)
         return obj
 
-    def _read(self, fp: BinaryIO, buffer: BytesIO, start_pos: int) -> None:
+    def _read(self, fp: BinaryIO, buffer: BytesIO, start_pos: int, lazy: bool = False) -> None:
         self._start_pos = start_pos
         fp.seek(self._start_pos)
-        self._decode_header(fp, buffer)
+        self._decode_header(fp, buffer, lazy)
 
-    def _decode_header(self, fp: BinaryIO, buffer: BytesIO) -> None:
+    def _decode_header(self, fp: BinaryIO, buffer: BytesIO, lazy: bool = False) -> None:
         """
         Decode header data or encoded header data from buffer.
         When buffer consist of encoded buffer, it get stream data
@@ -893,59 +1315,68 @@ class Header:
             # empty archive
             return
         elif pid == Property.HEADER:
-            self._extract_header_info(buffer)
+            self._extract_header_info(buffer, lazy)
             return
         elif pid != Property.ENCODED_HEADER:
             raise TypeError('Unknown field: %r' % id)
         # get from encoded header
         streams = HeaderStreamsInfo.retrieve(buffer)
-        self._decode_header(fp, self._get_headerdata_from_streams(fp, streams))
+        self._decode_header(fp, self._get_headerdata_from_streams(fp, streams), lazy)
 
     def _get_headerdata_from_streams(self, fp: BinaryIO, streams: StreamsInfo) -> BytesIO:
         """get header data from given streams.unpackinfo and packinfo.
-        folder data are stored in raw data positioned in afterheader."""
-        buffer = io.BytesIO()
-        src_start = self._start_pos
-        for folder in streams.unpackinfo.folders:
+        folder data are stored in raw data positioned in afterheader.
+        Data is decompressed in chunks into a buffer allocated with the size of header in advance,
+        and CRC is calculated incrementally."""
+        folders = streams.unpackinfo.folders
+        sizes = []  # type: List[int]
+        for folder in folders:
             if folder.is_encrypted():
                 raise UnsupportedCompressionMethodError()
-
             uncompressed = folder.unpacksizes
-            if not isinstance(uncompressed, (list, tuple)):
-                uncompressed = [uncompressed] * len(folder.coders)
-            compressed_size = streams.packinfo.packsizes[0]
-            uncompressed_size = uncompressed[-1]
-
-            src_start += streams.packinfo.packpos
-            fp.seek(src_start, 0)
-            decompressor = folder.get_decompressor(compressed_size)
-            folder_data = decompressor.decompress(fp.read(compressed_size))[:uncompressed_size]
-            src_start += uncompressed_size
-            if folder.digestdefined:
-                if folder.crc != calculate_crc32(folder_data):
-                    raise Bad7zFile('invalid block data')
-            buffer.write(folder_data)
+            sizes.append(uncompressed[-1] if isinstance(uncompressed, (list, tuple)) else uncompressed)
+        buffer = io.BytesIO()
+        if sum(sizes) > 0:
+            buffer.seek(sum(sizes) - 1)
+            buffer.write(b'\x00')
+        view = buffer.getbuffer()
+        reader = PositionalReader(fp)
+        src_pos = self._start_pos + streams.packinfo.packpos
+        pos = 0
+        for i, (folder, (start, end)) in enumerate(zip(folders, streams.folder_positions())):
+            src_start = src_pos + start
+            compressed_size = end - start
+            decompressor = SevenZipDecompressor(folder.coders, compressed_size, None, folder.password)
+            folder_reader = FolderReader(reader, decompressor, src_start, src_start + compressed_size)
+            end = pos + sizes[i]
+            crc = 0
+            while pos < end:
+                data = folder_reader.read(min(end - pos, DECOMPRESS_CHUNKSIZE))
+                view[pos:pos + len(data)] = data
+                crc = calculate_crc32(data, crc)
+                pos += len(data)
+            if folder.digestdefined and folder.crc != crc:
+                raise Bad7zFile('invalid block data')
+        view.release()
         buffer.seek(0, 0)
         return buffer
 
-    def _encode_header(self, file: BinaryIO, afterheader: int):
+    def _encode_header(self, file: BinaryIO, afterheader: int) -> Tuple[int, int, int]:
         startpos = file.tell()
         packpos = startpos - afterheader
         buf = io.BytesIO()
-        _, raw_header_len, raw_crc = self.write(buf, 0, False)
+        writer = CrcWriter(buf)
+        self._write(writer)
         streams = HeaderStreamsInfo()
         streams.packinfo.packpos = packpos
         folder = streams.unpackinfo.folders[0]
-        folder.crc = [raw_crc]
-        folder.unpacksizes = [raw_header_len]
-        compressed_len = 0
-        buf.seek(0, 0)
-        data = buf.read(io.DEFAULT_BUFFER_SIZE)
-        while data:
-            out = folder.compressor.compress(data)
-            compressed_len += len(out)
-            file.write(out)
-            data = buf.read(io.DEFAULT_BUFFER_SIZE)
+        folder.crc = [writer.crc]
+        folder.unpacksizes = [writer.size]
+        view = buf.getbuffer()
+        out = folder.compressor.compress(view)
+        view.release()
+        compressed_len = len(out)
+        file.write(out)
         out = folder.compressor.flush()
         compressed_len += len(out)
         file.write(out)
@@ -953,37 +1384,37 @@ class Header:
         streams.packinfo.packsizes = [compressed_len]
         # actual header start position
         startpos = file.tell()
-        write_byte(file, Property.ENCODED_HEADER)
-        streams.write(file)
+        writer = CrcWriter(file)
+        write_byte(writer, Property.ENCODED_HEADER)
+        streams.write(writer)
+        write_byte(writer, Property.END)
+        return startpos, writer.size, writer.crc
+
+    def write(self, file: BinaryIO, afterheader: int, encoded: bool = True) -> Tuple[int, int, int]:
+        """write header and return its position, length and CRC. The CRC is calculated while writing."""
+        if encoded:
+            return self._encode_header(file, afterheader)
+        startpos = file.tell()
+        writer = CrcWriter(file)
+        self._write(writer)
+        return startpos, writer.size, writer.crc
+
+    def _write(self, file: BinaryIO) -> None:
+        write_byte(file, Property.HEADER)
+        # Archive properties
+        if self.main_streams is not None:
+            self.main_streams.write(file)
+        # Files Info
+        if self.files_info is not None:
+            self.files_info.write(file)
+        if self.properties is not None:
+            self.properties.write(file)
+        # AdditionalStreams
+        if self.additional_streams is not None:
+            self.additional_streams.write(file)
         write_byte(file, Property.END)
-        return startpos
 
-    def write(self, file: BinaryIO, afterheader: int, encoded: bool = True):
-        startpos = file.tell()
-        if encoded:
-            startpos = self._encode_header(file, afterheader)
-        else:
-            write_byte(file, Property.HEADER)
-            # Archive properties
-            if self.main_streams is not None:
-                self.main_streams.write(file)
-            # Files Info
-            if self.files_info is not None:
-                self.files_info.write(file)
-            if self.properties is not None:
-                self.properties.write(file)
-            # AdditionalStreams
-            if self.additional_streams is not None:
-                self.additional_streams.write(file)
-            write_byte(file, Property.END)
-        endpos = file.tell()
-        header_len = endpos - startpos
-        file.seek(startpos, io.SEEK_SET)
-        crc = calculate_crc32(file.read(header_len))
-        file.seek(endpos, io.SEEK_SET)
-        return startpos, header_len, crc
-
-    def _extract_header_info(self, fp: BinaryIO) -> None:
+    def _extract_header_info(self, fp: BinaryIO, lazy: bool = False) -> None:
         pid = fp.read(1)
         if pid == Property.ARCHIVE_PROPERTIES:
             self.properties = ArchiveProperties.retrieve(fp)
@@ -995,7 +1426,7 @@ class Header:
             self.main_streams = StreamsInfo.retrieve(fp)
             pid = fp.read(1)
         if pid == Property.FILES_INFO:
-            self.files_info = FilesInfo.retrieve(fp)
+            self.files_info = FilesInfo.retrieve(fp, lazy)
             pid = fp.read(1)
         if pid != Property.END:
             raise Bad7zFile('end id expected but %s found' % (repr(pid)))
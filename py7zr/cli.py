@@ -47,12 +47,16 @@ class Cli():
         list_parser.set_defaults(func=self.run_list)
         list_parser.add_argument("arcfile", help="7z archive file")
         list_parser.add_argument("--verbose", action="store_true", help="verbose output")
+        list_parser.add_argument("-i", "--include", action="append", metavar="PATTERN",
+                                 help="list only members which match a glob pattern, can be repeated")
         extract_parser = subparsers.add_parser('x')
         extract_parser.set_defaults(func=self.run_extract)
         extract_parser.add_argument("arcfile", help="7z archive file")
         extract_parser.add_argument("odir", nargs="?", help="output directory")
         extract_parser.add_argument("-P", "--password", action="store_true",
                                     help="Password protected archive(you will be asked a password).")
+        extract_parser.add_argument("-i", "--include", action="append", metavar="PATTERN",
+                                    help="extract only members which match a glob pattern, can be repeated")
         create_parser = subparsers.add_parser('c')
         create_parser.set_defaults(func=self.run_create)
         create_parser.add_argument("arcfile", help="7z archive file")
@@ -109,6 +113,9 @@ class Cli():
             file = sys.stdout
             archive_info = a.archiveinfo()
             archive_list = a.list()
+            if args.include:
+                selected = set(a.select(args.include))
+                archive_list = [f for f in archive_list if f.filename in selected]
             if verbose:
                 file.write("Listing archive: {}\n".format(target))
                 file.write("--\n")
@@ -203,10 +210,11 @@ class Cli():
                 sys.stderr.write('Warning: your password may be shown.\n')
                 return(1)
         a = py7zr.SevenZipFile(target, 'r', password=password)
+        targets = a.select(args.include) if args.include else None
         if args.odir:
-            a.extractall(path=args.odir)
+            a.extract(path=args.odir, targets=targets)
         else:
-            a.extractall()
+            a.extract(targets=targets)
         return(0)
 
     def run_create(self, args):
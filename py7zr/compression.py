@@ -22,191 +22,966 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 import bz2
+import collections
+import concurrent.futures
+import functools
 import io
 import lzma
+import mmap
+import operator
 import os
+import shutil
 import sys
-import threading
-from typing import IO, Any, BinaryIO, Dict, List, Optional, Union
+import tempfile
+import zlib
+from typing import IO, Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
-from py7zr import UnsupportedCompressionMethodError
-from py7zr.extra import AESDecompressor, CopyDecompressor, DeflateDecompressor
-from py7zr.helpers import NullIO, calculate_crc32, readlink
-from py7zr.properties import READ_BLOCKSIZE, ArchivePassword, CompressionMethod
+from py7zr.exceptions import CrcError, DecompressionError, UnsupportedCompressionMethodError
+from py7zr.extra import AESDecompressor, CopyDecompressor, DeflateDecompressor, get_aes_properties
+from py7zr.helpers import (MemIO, NullIO, PositionalReader, calculate_crc32, copy_file_range, get_cpu_count, key_cache,
+                           readlink)
+from py7zr.properties import (AES_READ_BLOCKSIZE, DECOMPRESS_CHUNKSIZE, PASSWORD_CHECK_SIZE, READ_BLOCKSIZE,
+                              CompressionMethod)
 
 if sys.version_info < (3, 6):
     import pathlib2 as pathlib
 else:
     import pathlib
 
+# packed data of a folder is kept in memory up to this size until it is appended to an archive
+ARCHIVE_SPOOL_SIZE = 64 * 1024 * 1024
+# minimum uncompressed size of a segment of an LZMA2 stream decoded by a thread
+LZMA2_SEGMENT_SIZE = 4 * 1024 * 1024
+# a folder which has a larger segment is decoded sequentially, not to hold whole of the segment in memory
+LZMA2_MAX_SEGMENT_SIZE = 64 * 1024 * 1024
+# uncompressed size of segments decoded ahead of a reader, at least one segment is decoded ahead
+SEGMENT_QUEUE_SIZE = 256 * 1024 * 1024
+
 
 class Worker:
     """Extract worker class to invoke handler"""
 
-    def __init__(self, files, src_start: int, header) -> None:
-        self.target_filepath = {}  # type: Dict[int, Optional[pathlib.Path]]
+    def __init__(self, files, src_start: int, header, mp: bool = False, chunk_size: int = DECOMPRESS_CHUNKSIZE,
+                 copy_crc: bool = True) -> None:
+        self.target_filepath = {}  # type: Dict[int, Union[MemIO, pathlib.Path, None]]
         self.files = files
         self.src_start = src_start
         self.header = header
+        self.mp = mp
+        self.chunk_size = chunk_size
+        # False skips CRC check of files in folders stored without compression
+        self.copy_crc = copy_crc
+        self.crc_errors = []  # type: List[Tuple[int, int]]
 
-    def extract(self, fp: BinaryIO, parallel: bool) -> None:
-        """Extract worker method to handle 7zip folder and decompress each files."""
-        if hasattr(self.header, 'main_streams') and self.header.main_streams is not None:
-            src_end = self.src_start + self.header.main_streams.packinfo.packpositions[-1]
-            numfolders = self.header.main_streams.unpackinfo.numfolders
-            if numfolders == 1:
-                self.extract_single(fp, self.files, self.src_start, src_end)
+    def extract(self, fp: Union[BinaryIO, PositionalReader], parallel: bool, max_workers: Optional[int] = None,
+                only_targets: bool = False) -> None:
+        """Extract worker method to handle 7zip folder and decompress each files.
+        When parallel is True, folders are extracted concurrently by at most max_workers workers,
+        it defaults to a number of CPUs available for the process.
+        All workers read the archive through a single PositionalReader.
+        A folder extracted alone in parallel mode is decoded by segments in max_workers threads
+        when it is an LZMA2 stream with dictionary resets, see SegmentReader.
+        When only_targets is True, folders are decompressed only as far as registered targets, see plan().
+        CRC errors of files and folders are kept in crc_errors, and CrcError is raised after all folders."""
+        if not isinstance(fp, PositionalReader):
+            fp = PositionalReader(fp)
+        self.crc_errors = []
+        plan = self.plan(only_targets)
+        self.extract_single(fp, plan.empty_files, 0, 0)
+        if len(plan.folders) > 0:
+            self._precompute_keys([p.folder for p in plan.folders], max_workers)
+            if max_workers is None:
+                max_workers = get_cpu_count()
+            if not parallel or len(plan.folders) == 1:
+                for p in plan.folders:
+                    self.extract_single(fp, p.files, p.src_start, p.src_end, max_workers if parallel else 1)
             else:
-                folders = self.header.main_streams.unpackinfo.folders
-                positions = self.header.main_streams.packinfo.packpositions
-                empty_files = [f for f in self.files if f.emptystream]
-                if not parallel:
-                    self.extract_single(fp, empty_files, 0, 0)
-                    for i in range(numfolders):
-                        self.extract_single(fp, folders[i].files, self.src_start + positions[i],
-                                            self.src_start + positions[i + 1])
+                schedule = self._schedule_folders(plan.folders)
+                if self.mp and fp.is_regular_file and self._targets_are_paths():
+                    self._extract_processes(fp.name, schedule, max_workers)
                 else:
-                    filename = getattr(fp, 'name', None)
-                    self.extract_single(open(filename, 'rb'), empty_files, 0, 0)
-                    extract_threads = []
-                    for i in range(numfolders):
-                        p = threading.Thread(target=self.extract_single,
-                                             args=(filename, folders[i].files,
-                                                   self.src_start + positions[i], self.src_start + positions[i + 1]))
-                        p.start()
-                        extract_threads.append((p))
-                    for p in extract_threads:
-                        p.join()
-        else:
-            empty_files = [f for f in self.files if f.emptystream]
-            self.extract_single(fp, empty_files, 0, 0)
+                    self._extract_threads(fp, schedule, max_workers)
+        if len(self.crc_errors) > 0:
+            expected, real = self.crc_errors[0]
+            raise CrcError('CRC error! expected: {}, real: {}'.format(expected, real))
+
+    def plan(self, only_targets: bool = False) -> 'ExtractPlan':
+        """Make a plan of extraction which tells files to be decompressed in each folder.
+        When only_targets is True, folders which have no registered target are skipped, and
+        decompression of a solid folder stops after its last target.
+        Otherwise all files are decompressed to check CRC of data."""
+        plan = ExtractPlan()
+        if self.files is not None:
+            plan.empty_files = [f for f in self.files if f.emptystream and
+                                (not only_targets or self.target_filepath.get(f.id, None) is not None)]
+        if getattr(self.header, 'main_streams', None) is None:
+            return plan
+        folders = self.header.main_streams.unpackinfo.folders
+        positions = self.header.main_streams.folder_positions()
+        for i, folder in enumerate(folders):
+            files = list(folder.files) if folder.files is not None else []
+            plan.unpack_size += sum(f.uncompressed[-1] for f in files)
+            if only_targets:
+                last = -1
+                for j, f in enumerate(files):
+                    if self.target_filepath.get(f.id, None) is not None:
+                        last = j
+                files = files[:last + 1]
+            if len(files) == 0:
+                plan.skipped_folders.append(i)
+                continue
+            start, end = positions[i]
+            plan.folders.append(FolderPlan(i, folder, files, self.src_start + start, self.src_start + end))
+        return plan
+
+    def _precompute_keys(self, folders, max_workers: Optional[int] = None) -> None:
+        """Derive keys of encrypted folders ahead of decompression.
+        Folders usually share a salt so the key is derived once, distinct salts are derived
+        in parallel by processes only in mp mode."""
+        params = []  # type: List[Tuple[bytes, int, bytes]]
+        for folder in folders:
+            for coder in folder.coders:
+                if coder['method'] == CompressionMethod.CRYPT_AES256_SHA256:
+                    try:
+                        numcyclespower, salt, _ = get_aes_properties(coder['properties'])
+                    except UnsupportedCompressionMethodError:
+                        continue  # reported when a decompressor is created
+                    password = folder.password if folder.password is not None else ''
+                    params.append((password.encode('utf-16LE'), numcyclespower, salt))
+        if len(params) > 0:
+            key_cache.precompute(params, 'sha256', max_workers, processes=self.mp)
+
+    @staticmethod
+    def _schedule_folders(folders: List['FolderPlan']) -> List['FolderPlan']:
+        """Return planned folders ordered by estimated cost of decompression.
+        The largest folder comes first so the longest task does not start last."""
+        return sorted(folders, key=lambda p: (p.decode_size, p.pack_size), reverse=True)
+
+    def _targets_are_paths(self) -> bool:
+        """Return True when all targets can be handed to another process."""
+        return all(fileish is None or isinstance(fileish, pathlib.PurePath) for fileish in self.target_filepath.values())
+
+    def _extract_threads(self, fp: PositionalReader, schedule: List['FolderPlan'], max_workers: int) -> None:
+        """Extract folders in a bounded thread pool which shares a positional reader."""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            tasks = [executor.submit(self.extract_single, fp, p.files, p.src_start, p.src_end) for p in schedule]
+            for task in concurrent.futures.as_completed(tasks):
+                task.result()
+
+    def _extract_processes(self, filename: str, schedule: List['FolderPlan'], max_workers: int) -> None:
+        """Extract each folder in a worker process of a bounded process pool.
+        Every process opens the archive by itself and writes its target files directly,
+        so only folder metadata, target paths and CRC results travel between processes."""
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            tasks = []
+            for p in schedule:
+                targets = {}  # type: Dict[int, Optional[pathlib.Path]]
+                for f in p.files:
+                    targets[f.id] = self.target_filepath.get(f.id, None)
+                tasks.append(executor.submit(_extract_folder_process, filename, p.files, targets,
+                                             p.src_start, p.src_end, self.chunk_size))
+            for task in concurrent.futures.as_completed(tasks):
+                self.crc_errors.extend(task.result())
 
-    def extract_single(self, fp: Union[BinaryIO, str], files, src_start: int, src_end: int) -> None:
-        """Single thread extractor that takes file lists in single 7zip folder."""
+    def extract_single(self, fp: Union[BinaryIO, PositionalReader, str], files, src_start: int, src_end: int,
+                       max_workers: int = 1) -> None:
+        """Single thread extractor that takes file lists in single 7zip folder.
+        When fp is a filename, the archive is opened and closed by the method itself.
+        When max_workers is more than 1, independent segments of an LZMA2 folder are decoded in parallel."""
         if files is None:
             return
         if isinstance(fp, str):
-            fp = open(fp, 'rb')
-        fp.seek(src_start)
+            with open(fp, 'rb') as ifp:
+                self._extract_single(PositionalReader(ifp), files, src_start, src_end, max_workers)
+        elif not isinstance(fp, PositionalReader):
+            self._extract_single(PositionalReader(fp), files, src_start, src_end, max_workers)
+        else:
+            self._extract_single(fp, files, src_start, src_end, max_workers)
+
+    def iter_content(self, fp: Union[BinaryIO, PositionalReader], files: List[Any],
+                     chunk_size: int) -> Iterator[Tuple[Any, Union[memoryview, 'EndOfMember']]]:
+        """Generator which decompresses files in physical order of folders and yields a pair of
+        file and a chunk of its data which is not larger than chunk_size. After the last chunk of each file,
+        the pair of the file and EndOfMember object which hold a result of CRC check is yielded.
+        Each folder is decoded with its own decompressor, so the generator can be used while extracting."""
+        if not isinstance(fp, PositionalReader):
+            fp = PositionalReader(fp)
+        ranges = {}  # type: Dict[int, Tuple[int, int]]
+        if getattr(self.header, 'main_streams', None) is not None:
+            positions = self.header.main_streams.folder_positions()
+            for folder, (start, end) in zip(self.header.main_streams.unpackinfo.folders, positions):
+                ranges[id(folder)] = (self.src_start + start, self.src_start + end)
+        current = None
+        reader = None  # type: Optional[FolderReader]
         for f in files:
-            fileish = self.target_filepath.get(f.id, None)
-            if fileish is not None:
-                with fileish.open(mode='wb') as ofp:
-                    if not f.emptystream:
-                        # extract to file
-                        self.decompress(fp, f.folder, ofp, f.uncompressed[-1], f.compressed, src_end)
-                    else:
-                        pass  # just create empty file
-            elif not f.emptystream:
-                # read and bin off a data but check crc
-                with NullIO() as ofp:
-                    self.decompress(fp, f.folder, ofp, f.uncompressed[-1], f.compressed, src_end)
-
-    def decompress(self, fp: BinaryIO, folder, fq: IO[Any],
-                   size: int, compressed_size: Optional[int], src_end: int) -> None:
+            if f.emptystream:
+                yield f, EndOfMember(0, 0, f.digest)
+                continue
+            if f.folder is not current:
+                current = f.folder
+                src_start, src_end = ranges[id(current)]
+                decompressor = SevenZipDecompressor(current.coders, src_end - src_start, None, current.password)
+                reader = FolderReader(fp, decompressor, src_start, src_end)
+            assert reader is not None
+            size = f.uncompressed[-1]
+            remaining = size
+            crc = 0
+            while remaining > 0:
+                data = reader.read(min(remaining, chunk_size))
+                remaining -= len(data)
+                crc = calculate_crc32(data, crc)
+                yield f, memoryview(data)
+            yield f, EndOfMember(size, crc, f.digest)
+
+    def _extract_single(self, fp: PositionalReader, files, src_start: int, src_end: int, max_workers: int = 1) -> None:
+        folder = next((f.folder for f in files if not f.emptystream), None)
+        if fp.fd is not None and self._is_copy_folder(folder):
+            self._copy_single(fp, files, src_start, src_end)
+            return
+        reader = None  # type: Optional[Union[FolderReader, SegmentReader]]
+        if folder is not None and max_workers > 1:
+            reader = SegmentReader.create(fp, folder, src_start, src_end, max_workers)
+        try:
+            for f in files:
+                if not f.emptystream and reader is None:
+                    reader = FolderReader(fp, f.folder.get_decompressor(f.compressed, reset=True), src_start, src_end)
+                fileish = self.target_filepath.get(f.id, None)
+                if fileish is not None:
+                    with fileish.open(mode='wb') as ofp:
+                        if not f.emptystream:
+                            # extract to file
+                            self.decompress(reader, ofp, f.uncompressed[-1], f.digest)
+                        else:
+                            pass  # just create empty file
+                elif not f.emptystream:
+                    # read and bin off a data but check crc
+                    with NullIO() as ofp:
+                        self.decompress(reader, ofp, f.uncompressed[-1], f.digest)
+        finally:
+            if isinstance(reader, SegmentReader):
+                reader.close()
+
+    @staticmethod
+    def _is_copy_folder(folder) -> bool:
+        return folder is not None and len(folder.coders) == 1 and folder.coders[0]['method'] == CompressionMethod.COPY
+
+    def _copy_single(self, fp: PositionalReader, files, src_start: int, src_end: int) -> None:
+        """Extract files in a folder stored without compression from a regular file.
+        Data is copied in kernel from the archive into target files, and CRC of each file is
+        calculated from a memory mapped view of the archive unless copy_crc is False."""
+        mm = None
+        view = None  # type: Optional[memoryview]
+        if self.copy_crc:
+            try:
+                mm = mmap.mmap(fp.fd, 0, access=mmap.ACCESS_READ)  # type: ignore
+                view = memoryview(mm)
+            except (OSError, ValueError, OverflowError):
+                pass
+        try:
+            pos = src_start
+            for f in files:
+                if f.emptystream:
+                    fileish = self.target_filepath.get(f.id, None)
+                    if fileish is not None:
+                        with fileish.open(mode='wb'):
+                            pass
+                    continue
+                size = f.uncompressed[-1]
+                if pos + size > src_end:
+                    raise DecompressionError("archive is truncated.")
+                self._copy_file(fp, view, f, pos, size)
+                pos += size
+        finally:
+            if view is not None:
+                view.release()
+            if mm is not None:
+                mm.close()
+
+    def _copy_file(self, fp: PositionalReader, view: Optional[memoryview], f, pos: int, size: int) -> None:
+        fileish = self.target_filepath.get(f.id, None)
+        if isinstance(fileish, pathlib.PurePath):
+            with fileish.open(mode='wb') as ofp:
+                ofp.flush()
+                if copy_file_range(fp.fd, ofp.fileno(), pos, size) < size:  # type: ignore
+                    raise DecompressionError("archive is truncated.")
+        elif fileish is not None:
+            with fileish.open(mode='wb') as ofp:
+                if view is not None:
+                    ofp.write(view[pos:pos + size])
+                else:
+                    ofp.write(fp.pread(size, pos))
+        if not self.copy_crc or f.digest is None:
+            return
+        if view is not None:
+            crc = calculate_crc32(view[pos:pos + size])
+        else:
+            crc = 0
+            for offset in range(pos, pos + size, READ_BLOCKSIZE):
+                crc = calculate_crc32(fp.pread(min(READ_BLOCKSIZE, pos + size - offset), offset), crc)
+        if crc != f.digest:
+            self.crc_errors.append((f.digest, crc))
+
+    def decompress(self, reader: Union['FolderReader', 'SegmentReader'], fq: IO[Any], size: int,
+                   digest: Optional[int] = None) -> None:
         """decompressor wrapper called from extract method.
 
-           :parameter fp: archive source file pointer
-           :parameter folder: Folder object that have decompressor object.
-           :parameter fq: output file pathlib.Path
+           :parameter reader: FolderReader or SegmentReader object of a folder where the file is stored.
+           :parameter fq: output file object
            :parameter size: uncompressed size of target file.
-           :parameter compressed_size: compressed size of target file.
-           :parameter src_end: end position of the folder
-           :returns None
+           :parameter digest: CRC32 of target file, it is checked when given.
         """
-        assert folder is not None
         out_remaining = size
-        decompressor = folder.get_decompressor(compressed_size)
+        crc = 0
         while out_remaining > 0:
-            max_length = min(out_remaining, io.DEFAULT_BUFFER_SIZE)
-            rest_size = src_end - fp.tell()
-            read_size = min(READ_BLOCKSIZE, rest_size)
-            if read_size == 0:
-                tmp = decompressor.decompress(b'', max_length)
-                if len(tmp) == 0:
-                    raise Exception("decompression get wrong: no output data.")
-            else:
-                inp = fp.read(read_size)
-                tmp = decompressor.decompress(inp, max_length)
-            if len(tmp) > 0 and out_remaining >= len(tmp):
-                out_remaining -= len(tmp)
-                fq.write(tmp)
-            if out_remaining <= 0:
-                break
-        if fp.tell() >= src_end:
-            if decompressor.crc is not None and not decompressor.check_crc():
-                print('\nCRC error! expected: {}, real: {}'.format(decompressor.crc, decompressor.digest))
-        return
+            tmp = reader.read(min(out_remaining, self.chunk_size))
+            out_remaining -= len(tmp)
+            if digest is not None:
+                crc = calculate_crc32(tmp, crc)
+            fq.write(tmp)
+        if digest is not None and crc != digest:
+            self.crc_errors.append((digest, crc))
+        error = reader.crc_error()
+        if error is not None:
+            self.crc_errors.append(error)
 
-    def archive(self, fp: BinaryIO, folder):
-        """Run archive task for specified 7zip folder."""
+    def check_password(self, fp: Union[BinaryIO, PositionalReader]) -> Optional[bool]:
+        """Verify a password of encrypted archive without decrypting whole folders.
+        It decrypts only a beginning of the smallest encrypted folder. A wrong key is detected
+        when decoder rejects decrypted data, or when a CRC of the first non-empty file with a digest
+        mismatches; files are decoded in order up to PASSWORD_CHECK_SIZE bytes of the folder.
+        It returns True when the CRC matches or the folder ends, False for a wrong key, and None when
+        neither is reached in PASSWORD_CHECK_SIZE bytes."""
+        if not isinstance(fp, PositionalReader):
+            fp = PositionalReader(fp)
+        if getattr(self.header, 'main_streams', None) is None:
+            return True
+        folders = self.header.main_streams.unpackinfo.folders
+        positions = self.header.main_streams.folder_positions()
+        encrypted = [i for i, folder in enumerate(folders) if folder.is_encrypted()]
+        if len(encrypted) == 0:
+            return True
+        i = min(encrypted, key=lambda x: positions[x][1] - positions[x][0])
+        folder = folders[i]
+        src_start = self.src_start + positions[i][0]
+        src_end = self.src_start + positions[i][1]
+        # sizes and CRCs of files in the folder, or the folder itself when files are unknown
+        members = [(f.uncompressed[-1], f.digest) for f in folder.files if not f.emptystream] \
+            if folder.files is not None else []  # type: List[Tuple[int, Optional[int]]]
+        if len(members) == 0:
+            members = [(folder.get_unpack_size(), folder.crc if folder.digestdefined else None)]
+        # use an own decompressor not to disturb a state of the one which folder holds.
+        decompressor = SevenZipDecompressor(folder.coders, src_end - src_start, None, folder.password)
+        src_pos = src_start
+        src_limit = min(src_start + PASSWORD_CHECK_SIZE, src_end)
+        try:
+            # decode files in order until a file of non-zero size is verified by its CRC,
+            # or PASSWORD_CHECK_SIZE bytes of input are decoded by a decoder which validates its input.
+            for size, digest in members:
+                remaining = size
+                crc = 0
+                while remaining > 0:
+                    if decompressor.needs_input and src_pos < src_limit:
+                        inp = fp.pread(min(READ_BLOCKSIZE, src_limit - src_pos), src_pos)
+                        src_pos += len(inp)
+                    elif decompressor.needs_input and src_limit < src_end:
+                        return None  # not determined in PASSWORD_CHECK_SIZE bytes
+                    else:
+                        inp = b''  # flush
+                    tmp = decompressor.decompress(inp, min(remaining, DECOMPRESS_CHUNKSIZE))
+                    if len(inp) == 0 and len(tmp) == 0:
+                        # stream ends before files do
+                        return False
+                    remaining -= len(tmp)
+                    crc = calculate_crc32(tmp, crc)
+                if size > 0 and digest is not None:
+                    return crc == digest
+        except (lzma.LZMAError, zlib.error, OSError, EOFError, ValueError):
+            return False
+        # whole folder is decoded without CRC of files
+        return True if decompressor.eof else None
+
+    def archive(self, fp: BinaryIO, folders: List[Any], max_workers: Optional[int] = None) -> None:
+        """Run archive task which compresses files into 7zip folders.
+        Files which have data are split into contiguous groups of similar size, one for each folder,
+        and folders are compressed concurrently by at most max_workers threads.
+        Block compressors of the folders share the budget, so they run max_workers // folders threads each.
+        The first folder is written to fp directly, others are spooled and appended to fp in order."""
+        header = self.header
+        files = list(self.files)
+        streams = []  # type: List[int]
+        for i, f in enumerate(files):
+            header.files_info.files.append(f.file_properties())
+            header.files_info.emptyfiles.append(f.emptystream)
+            if f.is_symlink or not f.emptystream:
+                streams.append(i)
+        groups = self._split_streams(streams, [header.files_info.files[i].get('uncompressed', 0) for i in streams],
+                                     len(folders))
+        folders = folders[:len(groups)]
+        if max_workers is None:
+            max_workers = get_cpu_count()
+        workers = min(max_workers, len(folders))
+        for folder in folders:
+            # share the budget of threads with block compressors of folders compressed at once
+            folder.get_compressor().max_workers = max(1, max_workers // workers)
+        if len(folders) == 1:
+            results = [self._archive_folder(fp, folders[0], [files[i] for i in groups[0]])]
+        else:
+            results = []
+            spools = [tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE) for _ in folders[1:]]
+            try:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                    outs = [fp] + spools
+                    tasks = [executor.submit(self._archive_folder, out, folder, [files[i] for i in group])
+                             for out, folder, group in zip(outs, folders, groups)]
+                    try:
+                        for out, task in zip(outs, tasks):
+                            results.append(task.result())
+                            if out is not fp:
+                                out.seek(0)
+                                shutil.copyfileobj(out, fp, DECOMPRESS_CHUNKSIZE)
+                                out.close()
+                    except BaseException:
+                        for task in tasks:
+                            task.cancel()
+                        raise
+            finally:
+                for spool in spools:
+                    spool.close()
+        # Update size data in header
+        header.main_streams.unpackinfo.folders = folders
+        header.main_streams.unpackinfo.numfolders = len(folders)
+        header.main_streams.packinfo.numstreams = len(folders)
+        header.main_streams.packinfo.packsizes = []
+        substreamsinfo = header.main_streams.substreamsinfo
+        substreamsinfo.num_unpackstreams_folders = []
+        substreamsinfo.digests = []
+        substreamsinfo.digestsdefined = []
+        for folder, group, (packsize, sizes, crcs, maxsizes) in zip(folders, groups, results):
+            header.main_streams.packinfo.packsizes.append(packsize)
+            folder.unpacksizes = [sum(sizes)]
+            substreamsinfo.num_unpackstreams_folders.append(len(group))
+            substreamsinfo.unpacksizes.extend(sizes)
+            substreamsinfo.digests.extend(crcs)
+            substreamsinfo.digestsdefined.extend([True] * len(crcs))
+            for i, maxsize in zip(group, maxsizes):
+                header.files_info.files[i]['maxsize'] = maxsize
+
+    @staticmethod
+    def _split_streams(streams: List[int], sizes: List[int], num: int) -> List[List[int]]:
+        """Split indexes of streams into at most num contiguous groups of similar total size.
+        There is always at least one group, which is empty when there is no stream."""
+        if len(streams) == 0 or num <= 1:
+            return [streams]
+        # a weight of each file has one more than its size to spread empty files as well
+        total = sum(sizes) + len(sizes)
+        groups = [[] for _ in range(num)]  # type: List[List[int]]
+        acc = 0
+        for i, size in zip(streams, sizes):
+            groups[min(num - 1, acc * num // total)].append(i)
+            acc += size + 1
+        return [g for g in groups if len(g) > 0]
+
+    @staticmethod
+    def _archive_folder(fp: BinaryIO, folder, files: List[Any]) -> Tuple[int, List[int], List[int], List[int]]:
+        """Compress files into a folder and write packed data to fp.
+        It returns packed size of the folder, sizes, CRCs and compressed sizes of files."""
         compressor = folder.get_compressor()
         outsize = 0
-        self.header.main_streams.packinfo.numstreams = 1
-        num_unpack_streams = 0
-        self.header.main_streams.substreamsinfo.digests = []
-        self.header.main_streams.substreamsinfo.digestsdefined = []
-        last_file_index = 0
-        foutsize = 0
-        for i, f in enumerate(self.files):
-            file_info = f.file_properties()
-            self.header.files_info.files.append(file_info)
-            self.header.files_info.emptyfiles.append(f.emptystream)
+        sizes = []  # type: List[int]
+        crcs = []  # type: List[int]
+        maxsizes = []  # type: List[int]
+        for f in files:
             foutsize = 0
+            insize = 0
+            crc = 0
             if f.is_symlink:
-                last_file_index = i
-                num_unpack_streams += 1
                 dirname = os.path.dirname(f.origin)
                 basename = os.path.basename(f.origin)
                 link_target = readlink(str(pathlib.Path(dirname) / basename))  # type: str
                 tgt = link_target.encode('utf-8')  # type: bytes
                 insize = len(tgt)
-                crc = calculate_crc32(tgt, 0)  # type: int
+                crc = calculate_crc32(tgt, 0)
                 out = compressor.compress(tgt)
-                outsize += len(out)
                 foutsize += len(out)
                 fp.write(out)
-                self.header.main_streams.substreamsinfo.digests.append(crc)
-                self.header.main_streams.substreamsinfo.digestsdefined.append(True)
-                self.header.main_streams.substreamsinfo.unpacksizes.append(insize)
-                self.header.files_info.files[i]['maxsize'] = foutsize
-            elif not f.emptystream:
-                last_file_index = i
-                num_unpack_streams += 1
-                insize = 0
+            else:
                 with pathlib.Path(f.origin).open(mode='rb') as fd:
                     data = fd.read(READ_BLOCKSIZE)
-                    insize += len(data)
-                    crc = 0
                     while data:
+                        insize += len(data)
                         crc = calculate_crc32(data, crc)
                         out = compressor.compress(data)
-                        outsize += len(out)
                         foutsize += len(out)
                         fp.write(out)
                         data = fd.read(READ_BLOCKSIZE)
-                        insize += len(data)
-                    self.header.main_streams.substreamsinfo.digests.append(crc)
-                    self.header.main_streams.substreamsinfo.digestsdefined.append(True)
-                    self.header.files_info.files[i]['maxsize'] = foutsize
-                self.header.main_streams.substreamsinfo.unpacksizes.append(insize)
-        else:
-            out = compressor.flush()
-            outsize += len(out)
-            foutsize += len(out)
-            fp.write(out)
-            if len(self.files) > 0:
-                self.header.files_info.files[last_file_index]['maxsize'] = foutsize
-        # Update size data in header
-        self.header.main_streams.packinfo.packsizes = [outsize]
-        folder.unpacksizes = [sum(self.header.main_streams.substreamsinfo.unpacksizes)]
-        self.header.main_streams.substreamsinfo.num_unpackstreams_folders = [num_unpack_streams]
+            outsize += foutsize
+            sizes.append(insize)
+            crcs.append(crc)
+            maxsizes.append(foutsize)
+        out = compressor.flush()
+        outsize += len(out)
+        fp.write(out)
+        if len(maxsizes) > 0:
+            maxsizes[-1] += len(out)
+        return outsize, sizes, crcs, maxsizes
 
-    def register_filelike(self, id: int, fileish: Optional[pathlib.Path]) -> None:
+    def register_filelike(self, id: int, fileish: Union[MemIO, pathlib.Path, None]) -> None:
         """register file-ish to worker."""
         self.target_filepath[id] = fileish
 
 
+def _extract_folder_process(filename: str, files, targets: Dict[int, Optional[pathlib.Path]],
+                            src_start: int, src_end: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """Entry point of a worker process which extracts files in a single 7zip folder.
+    It returns CRC errors found, file contents are written by the process itself."""
+    worker = Worker(None, src_start, None, chunk_size=chunk_size)
+    for file_id, fileish in targets.items():
+        worker.register_filelike(file_id, fileish)
+    worker.extract_single(filename, files, src_start, src_end)
+    return worker.crc_errors
+
+
+class FolderPlan:
+    """Files to be decompressed in a 7zip folder and range of its packed data in archive."""
+
+    __slots__ = ['index', 'folder', 'files', 'src_start', 'src_end', 'decode_size']
+
+    def __init__(self, index: int, folder, files: List[Any], src_start: int, src_end: int) -> None:
+        self.index = index
+        self.folder = folder
+        self.files = files
+        self.src_start = src_start
+        self.src_end = src_end
+        self.decode_size = sum(f.uncompressed[-1] for f in files)
+
+    @property
+    def pack_size(self) -> int:
+        return self.src_end - self.src_start
+
+
+class ExtractPlan:
+    """Plan of extraction made by Worker.plan()."""
+
+    def __init__(self) -> None:
+        self.folders = []  # type: List[FolderPlan]
+        self.skipped_folders = []  # type: List[int]
+        self.empty_files = []  # type: List[Any]
+        self.unpack_size = 0
+
+    @property
+    def decode_size(self) -> int:
+        """Bytes to be decompressed."""
+        return sum(p.decode_size for p in self.folders)
+
+    def __str__(self) -> str:
+        lines = ['folder  files  decode size']
+        for p in self.folders:
+            lines.append('{:6d} {:6d} {:12d}'.format(p.index, len(p.files), p.decode_size))
+        lines.append('decode {} of {} bytes, skip {} folders'.format(
+            self.decode_size, self.unpack_size, len(self.skipped_folders)))
+        return '\n'.join(lines)
+
+
+class EndOfMember:
+    """Marker yielded by Worker.iter_content() after the last chunk of a file."""
+
+    __slots__ = ['size', 'crc', 'digest']
+
+    def __init__(self, size: int, crc: int, digest: Optional[int]) -> None:
+        self.size = size
+        self.crc = crc
+        self.digest = digest
+
+    @property
+    def crc_ok(self) -> bool:
+        """True when CRC of data matches a digest recorded in archive, or archive has no digest of the file."""
+        return self.digest is None or self.crc == self.digest
+
+
+class FolderReader:
+    """Incremental reader of uncompressed data of a 7zip folder.
+    It reads compressed data of the folder from src_start to src_end through a positional reader
+    and feeds it to decompressor on demand, so several readers can share a single archive file.
+    Encrypted folders are read in larger blocks, so AESDecompressor decrypts more cipher blocks at once."""
+
+    def __init__(self, fp: PositionalReader, decompressor: 'SevenZipDecompressor', src_start: int, src_end: int) -> None:
+        self.fp = fp
+        self.decompressor = decompressor
+        self.src_pos = src_start
+        self.src_end = src_end
+        blocksize = AES_READ_BLOCKSIZE if isinstance(decompressor.decompressor, AESDecompressor) else READ_BLOCKSIZE
+        self._buffer = memoryview(bytearray(min(blocksize, max(src_end - src_start, 1))))
+
+    def read(self, max_length: int) -> bytes:
+        """Return decompressed data of at most max_length bytes.
+        New input is read into a reusable buffer only when the decompressor needs it,
+        and no input is read after the end of compressed stream."""
+        decompressor = self.decompressor
+        while True:
+            if decompressor.needs_input and not decompressor.eof and self.src_pos < self.src_end:
+                view = self._buffer[:min(len(self._buffer), self.src_end - self.src_pos)]
+                length = self.fp.preadinto(view, self.src_pos)
+                if length == 0:
+                    raise DecompressionError("archive is truncated.")
+                self.src_pos += length
+                data = decompressor.decompress(view[:length], max_length)
+            elif decompressor.eof:
+                raise DecompressionError("decompression get wrong: reached end of stream.")
+            else:
+                data = decompressor.decompress(b'', max_length)
+                if len(data) == 0 and (self.src_pos >= self.src_end or not decompressor.needs_input):
+                    raise DecompressionError("decompression get wrong: no output data.")
+            if len(data) > 0:
+                return data
+
+    def skip(self, length: int) -> None:
+        """Decompress and discard length bytes."""
+        while length > 0:
+            length -= len(self.read(min(length, DECOMPRESS_CHUNKSIZE)))
+
+    def crc_error(self) -> Optional[Tuple[int, int]]:
+        """Return a pair of expected and actual CRC of the folder when whole input is read and they differ."""
+        decompressor = self.decompressor
+        if self.src_pos >= self.src_end and decompressor.crc is not None and not decompressor.check_crc():
+            return decompressor.crc, decompressor.digest
+        return None
+
+
+def scan_lzma2_chunks(fp: PositionalReader, src_start: int, src_end: int) -> Optional[List[Tuple[int, int]]]:
+    """Scan headers of chunks in an LZMA2 stream without decoding it.
+    It returns pairs of compressed and uncompressed positions of chunks where a decoder can start,
+    followed by the positions of the end marker. The stream starts at the first pair. A decoder can start
+    at a chunk which resets dictionary and sets new properties, or at an uncompressed chunk which resets
+    dictionary when a first LZMA chunk after it sets new properties, as incompressible data is stored.
+    None is returned when the stream is malformed or has no end marker."""
+    points = [(src_start, 0)]  # type: List[Tuple[int, int]]
+    reset = None  # type: Optional[Tuple[int, int]]
+    pos = src_start
+    out = 0
+    while pos < src_end:
+        header = fp.pread(5, pos)
+        if len(header) == 0:
+            return None
+        control = header[0]
+        if control == 0x00:
+            if reset is not None and reset[0] > src_start:
+                points.append(reset)
+            points.append((pos, out))
+            return points
+        elif control in (0x01, 0x02):
+            if len(header) < 3:
+                return None
+            if control == 0x01 and reset is None:
+                reset = (pos, out)
+            size = (header[1] << 8 | header[2]) + 1
+            pos += 3 + size
+            out += size
+        elif control >= 0x80:
+            if len(header) < 5:
+                return None
+            if control >= 0xc0 and reset is not None and reset[0] > src_start:
+                points.append(reset)
+            if control >= 0xe0 and pos > src_start:
+                points.append((pos, out))
+            reset = None
+            pos += (6 if control >= 0xc0 else 5) + (header[3] << 8 | header[4]) + 1
+            out += ((control & 0x1f) << 16 | header[1] << 8 | header[2]) + 1
+        else:
+            return None
+    return None
+
+
+BZIP2_BLOCK_MAGIC = 0x314159265359
+BZIP2_EOS_MAGIC = 0x177245385090
+# a compressed block of 900k bytes data hardly exceeds 1 MiB, a little margin is given
+BZIP2_MAX_BLOCK_BITS = 2 * 1024 * 1024 * 8
+
+
+def _bit_patterns(magic: int) -> List[Tuple[int, bytes, int, int, int, int]]:
+    """Return a byte pattern of a 48 bits magic number for each bit offset in a byte, as a tuple of
+    the offset, 5 bytes which are fully covered by the magic, and a value and mask of bytes before and after them."""
+    patterns = []
+    for shift in range(8):
+        window = (magic << (8 - shift)).to_bytes(7, 'big')
+        head_mask = 0xff >> shift
+        tail_mask = (0xff << (8 - shift)) & 0xff
+        patterns.append((shift, window[1:6], window[0] & head_mask, head_mask, window[6] & tail_mask, tail_mask))
+    return patterns
+
+
+_BZIP2_PATTERNS = [(True, p) for p in _bit_patterns(BZIP2_BLOCK_MAGIC)] + \
+    [(False, p) for p in _bit_patterns(BZIP2_EOS_MAGIC)]
+
+
+def scan_bzip2_blocks(fp: PositionalReader, src_start: int, src_end: int,
+                      window: int = DECOMPRESS_CHUNKSIZE * 8) -> Optional[List[Tuple[int, int]]]:
+    """Scan a bzip2 stream for block and end of stream magic numbers, which are not aligned to bytes,
+    without decoding it. It returns pairs of bit positions of start and end of blocks, or None when
+    the data does not look like bzip2 streams. A magic number can appear in compressed data by chance,
+    so a block found may be a part of a real block."""
+    if fp.pread(3, src_start) != b'BZh':
+        return None
+    marks = []  # type: List[Tuple[int, bool]]
+    pos = src_start
+    while pos < src_end:
+        data = fp.pread(min(window + 6, src_end - pos), pos)
+        if len(data) == 0:
+            return None
+        for is_block, (shift, pattern, head, head_mask, tail, tail_mask) in _BZIP2_PATTERNS:
+            idx = data.find(pattern, 1)
+            while idx >= 0:
+                b = idx - 1
+                if b >= window:
+                    break
+                if b + 7 <= len(data) and data[b] & head_mask == head and data[b + 6] & tail_mask == tail:
+                    marks.append(((pos + b) * 8 + shift, is_block))
+                idx = data.find(pattern, idx + 1)
+        pos += window
+    marks.sort()
+    if len(marks) < 2 or marks[0] != ((src_start + 4) * 8, True) or marks[-1][1]:
+        return None
+    return [(bit, marks[i + 1][0]) for i, (bit, is_block) in enumerate(marks) if is_block]
+
+
+class SegmentReader:
+    """Reader of uncompressed data of a 7zip folder which decodes independent segments of
+    the folder in a thread pool. Segments are LZMA2 streams which start at dictionary resets,
+    or bzip2 blocks. They are returned in order, and at most twice of max_workers segments are decoded ahead.
+    When sizeof gives an uncompressed size of a segment, segments decoded ahead are also limited to
+    SEGMENT_QUEUE_SIZE bytes in total, except for the first one.
+    When a segment fails to decode and segments can be merged, it is decoded again together with a next one.
+    It has the same read() interface as FolderReader."""
+
+    def __init__(self, fp: PositionalReader, decode: Callable[..., bytes], segments: List[Tuple[int, ...]],
+                 max_workers: int, crc: Optional[int] = None,
+                 merge: Optional[Callable[[Tuple[int, ...], Tuple[int, ...]], Optional[Tuple[int, ...]]]] = None,
+                 sizeof: Optional[Callable[[Tuple[int, ...]], int]] = None) -> None:
+        self.fp = fp
+        self.decode = decode
+        self.merge = merge
+        self.sizeof = sizeof
+        self.crc = crc
+        self.digest = None  # type: Optional[int]
+        self.max_workers = max_workers
+        self._segments = iter(segments)
+        self._following = next(self._segments, None)  # type: Optional[Tuple[int, ...]]
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = collections.deque()  # type: collections.deque
+        self._queued = 0
+        self._data = memoryview(b'')
+        self._fill()
+
+    @classmethod
+    def create(cls, fp: PositionalReader, folder, src_start: int, src_end: int,
+               max_workers: int) -> Optional['SegmentReader']:
+        """Return a reader when the folder is a single LZMA2 or bzip2 stream which has two or more
+        independent segments, otherwise None."""
+        coders = folder.coders
+        if len(coders) != 1 or coders[0]['numinstreams'] != 1:
+            return None
+        if coders[0]['method'] == CompressionMethod.LZMA2:
+            return cls._create_lzma2(fp, folder, src_start, src_end, max_workers)
+        if coders[0]['method'] == CompressionMethod.MISC_BZIP2:
+            blocks = scan_bzip2_blocks(fp, src_start, src_end)
+            if blocks is None or len(blocks) < 2:
+                return None
+            # a block size of 100k to 900k bytes is given in the stream header, 'BZh1' to 'BZh9'
+            block_size = (fp.pread(4, src_start)[3] - 0x30) * 100000
+            return cls(fp, cls._decode_bzip2, blocks, max_workers, folder.crc, merge=cls._merge_bzip2,
+                       sizeof=lambda block: block_size)
+        return None
+
+    @classmethod
+    def _create_lzma2(cls, fp: PositionalReader, folder, src_start: int, src_end: int,
+                      max_workers: int) -> Optional['SegmentReader']:
+        """Segments are at least LZMA2_SEGMENT_SIZE bytes and have their uncompressed size."""
+        points = scan_lzma2_chunks(fp, src_start, src_end)
+        if points is None or points[-1][1] != folder.get_unpack_size():
+            return None
+        segments = []  # type: List[Tuple[int, ...]]
+        start, start_out = points[0]
+        for pos, out in points[1:]:
+            if out - start_out >= LZMA2_SEGMENT_SIZE or pos == points[-1][0]:
+                segments.append((start, pos, out - start_out))
+                start, start_out = pos, out
+        if len(segments) < 2 or max(size for _, _, size in segments) > LZMA2_MAX_SEGMENT_SIZE:
+            return None
+        properties = folder.coders[0].get('properties', None)
+        if properties is not None:
+            filters = [lzma._decode_filter_properties(lzma.FILTER_LZMA2, properties)]  # type: ignore
+        else:
+            filters = [{'id': lzma.FILTER_LZMA2}]
+        return cls(fp, functools.partial(cls._decode_lzma2, filters), segments, max_workers, folder.crc,
+                   sizeof=operator.itemgetter(2))
+
+    def _submit(self, segment: Tuple[int, ...], first: bool = False) -> None:
+        size = self.sizeof(segment) if self.sizeof is not None else 0
+        entry = (segment, size, self._executor.submit(self.decode, self.fp, *segment))
+        self._queued += size
+        if first:
+            self._pending.appendleft(entry)
+        else:
+            self._pending.append(entry)
+
+    def _fill(self) -> None:
+        """Submit following segments as long as they are in limits of a number and a size of pending segments."""
+        while self._following is not None and len(self._pending) < 2 * self.max_workers:
+            if len(self._pending) > 0 and self.sizeof is not None and \
+                    self._queued + self.sizeof(self._following) > SEGMENT_QUEUE_SIZE:
+                break
+            self._submit(self._following)
+            self._following = next(self._segments, None)
+
+    @staticmethod
+    def _decode_lzma2(filters: List[Dict[str, Any]], fp: PositionalReader, start: int, end: int, size: int) -> bytes:
+        data = fp.pread(end - start, start)
+        if len(data) < end - start:
+            raise DecompressionError("archive is truncated.")
+        decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=filters)
+        # terminate the segment by an end marker
+        out = decompressor.decompress(data + b'\x00')
+        if len(out) != size or not decompressor.eof:
+            raise DecompressionError("decompression get wrong: wrong size of segment.")
+        return out
+
+    @staticmethod
+    def _decode_bzip2(fp: PositionalReader, start: int, end: int) -> bytes:
+        """Decode a block between bit positions start and end as a bzip2 stream which has only the block.
+        A CRC of the stream is same as the CRC of its single block."""
+        first = start // 8
+        last = (end + 7) // 8
+        data = fp.pread(last - first, first)
+        if len(data) < last - first:
+            raise DecompressionError("archive is truncated.")
+        length = end - start
+        block = (int.from_bytes(data, 'big') >> (last * 8 - end)) & ((1 << length) - 1)
+        crc = (block >> (length - 80)) & 0xffffffff
+        pad = -(length + 80) % 8
+        stream = ((block << 80) | (BZIP2_EOS_MAGIC << 32) | crc) << pad
+        try:
+            return bz2.decompress(b'BZh9' + stream.to_bytes((length + 80 + pad) // 8, 'big'))
+        except (OSError, ValueError, EOFError) as e:
+            raise DecompressionError("decompression get wrong: {}".format(e))
+
+    @staticmethod
+    def _merge_bzip2(first: Tuple[int, ...], second: Tuple[int, ...]) -> Optional[Tuple[int, ...]]:
+        """Join two blocks unless the result exceeds the largest size of a compressed block."""
+        if second[1] - first[0] > BZIP2_MAX_BLOCK_BITS:
+            return None
+        return first[0], second[1]
+
+    def _next_segment(self) -> bytes:
+        segment, size, task = self._pending.popleft()
+        self._queued -= size
+        try:
+            data = task.result()
+        except DecompressionError:
+            if self.merge is None:
+                raise
+            # a segment may end at a false boundary, try again with a next segment
+            self._fill()
+            if len(self._pending) == 0:
+                raise
+            following, following_size, next_task = self._pending.popleft()
+            self._queued -= following_size
+            merged = self.merge(segment, following)
+            if merged is None:
+                raise
+            next_task.cancel()
+            self._submit(merged, first=True)
+            return b''
+        self._fill()
+        return data
+
+    def read(self, max_length: int) -> bytes:
+        """Return decompressed data of at most max_length bytes."""
+        while len(self._data) == 0:
+            if len(self._pending) == 0:
+                raise DecompressionError("decompression get wrong: reached end of stream.")
+            self._data = memoryview(self._next_segment())
+        data = self._data[:max_length].tobytes()
+        self._data = self._data[max_length:]
+        if self.crc is not None:
+            self.digest = calculate_crc32(data, self.digest)
+        return data
+
+    def crc_error(self) -> Optional[Tuple[int, int]]:
+        """Return a pair of expected and actual CRC of the folder when whole data is read and they differ."""
+        if len(self._data) == 0 and len(self._pending) == 0 and self.crc is not None and self.digest != self.crc:
+            return self.crc, self.digest if self.digest is not None else 0
+        return None
+
+    def close(self) -> None:
+        for _, _, task in self._pending:
+            task.cancel()
+        self._pending.clear()
+        self._queued = 0
+        self._executor.shutdown()
+
+
+class ArchiveFileReader(io.RawIOBase):
+    """Read-only file object of a member of archive, returned by SevenZipFile.open().
+    Data is decompressed lazily on read with its own decompressor. Preceding members in a solid folder
+    are decompressed and discarded at the first read, and CRC of the member is checked at the end of file."""
+
+    def __init__(self, fp: PositionalReader, folder, offset: int, size: int, digest: Optional[int],
+                 src_start: int, src_end: int) -> None:
+        super().__init__()
+        self._size = size
+        self._remaining = size
+        self._skip = offset
+        self._digest = digest
+        self._crc = 0
+        if size > 0:
+            decompressor = SevenZipDecompressor(folder.coders, src_end - src_start, None, folder.password)
+            self._reader = FolderReader(fp, decompressor, src_start, src_end)  # type: Optional[FolderReader]
+        else:
+            self._reader = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        if size is None or size < 0:
+            return self.readall()
+        return self._read(size)
+
+    def readall(self) -> bytes:
+        chunks = []  # type: List[bytes]
+        while self._remaining > 0:
+            chunks.append(self._read(self._remaining))
+        return b''.join(chunks)
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def _read(self, size: int) -> bytes:
+        if size == 0 or self._remaining == 0:
+            return b''
+        assert self._reader is not None
+        if self._skip > 0:
+            self._reader.skip(self._skip)
+            self._skip = 0
+        data = self._reader.read(min(size, self._remaining))
+        self._remaining -= len(data)
+        self._crc = calculate_crc32(data, self._crc)
+        if self._remaining == 0 and self._digest is not None and self._crc != self._digest:
+            raise CrcError('CRC error! expected: {}, real: {}'.format(self._digest, self._crc))
+        return data
+
+    def close(self) -> None:
+        self._reader = None
+        super().close()
+
+
 class SevenZipDecompressor:
     """Main decompressor object which is properly configured and bind to each 7zip folder.
     because 7zip folder can have a custom compression method"""
@@ -234,8 +1009,10 @@ class SevenZipDecompressor:
         CompressionMethod.CRYPT_AES256_SHA256: FILTER_AES,
     }
 
-    def __init__(self, coders: List[Dict[str, Any]], size: int, crc: Optional[int]) -> None:
-        # Get password which was set when creation of py7zr.SevenZipFile object.
+    def __init__(self, coders: List[Dict[str, Any]], size: int, crc: Optional[int],
+                 password: Optional[str] = None) -> None:
+        # password is given by a folder which gets it from its py7zr.SevenZipFile object.
+        self.password = password
         self.input_size = size
         self.consumed = 0  # type: int
         self.crc = crc
@@ -269,7 +1046,7 @@ class SevenZipDecompressor:
         elif filter_id == self.FILTER_COPY:
             self.decompressor = CopyDecompressor()
         elif filter_id == self.FILTER_AES:
-            password = ArchivePassword().get()
+            password = self.password if self.password is not None else ''
             properties = coders[0].get('properties', None)
             self.decompressor = AESDecompressor(properties, password, coders[1:])
         else:
@@ -286,14 +1063,28 @@ class SevenZipDecompressor:
             self.digest = calculate_crc32(folder_data, self.digest)
         return folder_data
 
+    @property
+    def needs_input(self) -> bool:
+        """False when the decompressor can return more data without a new input."""
+        return self.decompressor.needs_input
+
+    @property
+    def eof(self) -> bool:
+        return self.decompressor.eof
+
     def check_crc(self):
         return self.crc == self.digest
 
 
 class SevenZipCompressor():
-    """Main compressor object to configured for each 7zip folder."""
+    """Main compressor object to configured for each 7zip folder.
+
+    When block_size is given, input is cut into blocks of the size which are compressed independently
+    by at most max_workers threads, and the results are concatenated into a single LZMA2 stream.
+    Each block starts with a dictionary reset, so the stream is decoded by any LZMA2 decoder.
+    It is only available with a sole LZMA2 filter."""
 
-    __slots__ = ['filters', 'compressor', 'coders']
+    __slots__ = ['filters', 'compressor', 'coders', 'block_size', 'max_workers', '_executor', '_buffer', '_pending']
 
     lzma_methods_map_r = {
         lzma.FILTER_LZMA2: CompressionMethod.LZMA2,
@@ -301,11 +1092,21 @@ class SevenZipCompressor():
         lzma.FILTER_X86: CompressionMethod.P7Z_BCJ,
     }
 
-    def __init__(self, filters=None):
+    def __init__(self, filters=None, block_size: Optional[int] = None, max_workers: Optional[int] = None):
         if filters is None:
             self.filters = [{"id": lzma.FILTER_LZMA2, "preset": 7 | lzma.PRESET_EXTREME}, ]
         else:
             self.filters = filters
+        if block_size is not None:
+            if block_size <= 0:
+                raise ValueError('block_size should be positive.')
+            if len(self.filters) != 1 or self.filters[0]['id'] != lzma.FILTER_LZMA2:
+                raise UnsupportedCompressionMethodError('Block compression is only available with a sole LZMA2 filter.')
+        self.block_size = block_size
+        self.max_workers = max_workers if max_workers is not None else get_cpu_count()
+        self._executor = None  # type: Optional[concurrent.futures.ThreadPoolExecutor]
+        self._buffer = bytearray()
+        self._pending = collections.deque()  # type: collections.deque
         self.compressor = lzma.LZMACompressor(format=lzma.FORMAT_RAW, filters=self.filters)
         self.coders = []
         for filter in self.filters:
@@ -316,10 +1117,44 @@ class SevenZipCompressor():
             self.coders.append({'method': method, 'properties': properties, 'numinstreams': 1, 'numoutstreams': 1})
 
     def compress(self, data):
-        return self.compressor.compress(data)
+        if self.block_size is None:
+            return self.compressor.compress(data)
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        # bound blocks in flight, and return compressed blocks which are ready in order
+        out = []  # type: List[bytes]
+        while self._pending and (self._pending[0].done() or len(self._pending) > 2 * self.max_workers):
+            out.append(self._pending.popleft().result())
+        return b''.join(out)
 
     def flush(self):
-        return self.compressor.flush()
+        if self.block_size is None:
+            return self.compressor.flush()
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+        try:
+            out = [task.result() for task in self._pending]
+        finally:
+            self._pending.clear()
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        # LZMA2 end marker
+        out.append(b'\x00')
+        return b''.join(out)
+
+    def _submit(self, block: bytes) -> None:
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        self._pending.append(self._executor.submit(self._compress_block, block, self.filters))
+
+    @staticmethod
+    def _compress_block(block: bytes, filters) -> bytes:
+        """Compress a block into an LZMA2 stream without its end marker."""
+        return lzma.compress(block, format=lzma.FORMAT_RAW, filters=filters)[:-1]
 
 
 def get_methods_names(coders: List[dict]) -> List[str]:
@@ -334,6 +1169,7 @@ def get_methods_names(coders: List[dict]) -> List[str]:
         CompressionMethod.BCJ_IA64: "BCJ(IA64)",
         CompressionMethod.BCJ_PPC: "BCJ(POWERPC)",
         CompressionMethod.BCJ_SPARC: "BCJ(SPARC)",
+        CompressionMethod.COPY: "COPY",
     }
     methods_names = []  # type: List[str]
     for coder in coders:
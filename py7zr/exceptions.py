@@ -40,3 +40,11 @@ class DecompressionError(ArchiveError):
 
 class InternalError(ArchiveError):
     pass
+
+
+class WrongPasswordError(ArchiveError):
+    pass
+
+
+class CrcError(DecompressionError):
+    pass
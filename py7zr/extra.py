@@ -23,49 +23,96 @@
 #
 import lzma
 import zlib
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from Crypto.Cipher import AES
 from py7zr import UnsupportedCompressionMethodError
-from py7zr.helpers import Buffer, calculate_key
+from py7zr.helpers import key_cache
 from py7zr.properties import READ_BLOCKSIZE, CompressionMethod
 
 
+def get_aes_properties(aes_properties: bytes) -> Tuple[int, bytes, bytes]:
+    """Parse properties of 7zAES coder and return numcyclespower, salt and iv."""
+    firstbyte = aes_properties[0]
+    numcyclespower = firstbyte & 0x3f
+    if firstbyte & 0xc0 == 0:
+        raise UnsupportedCompressionMethodError
+    saltsize = (firstbyte >> 7) & 1
+    ivsize = (firstbyte >> 6) & 1
+    secondbyte = aes_properties[1]
+    saltsize += (secondbyte >> 4)
+    ivsize += (secondbyte & 0x0f)
+    assert len(aes_properties) == 2 + saltsize + ivsize
+    salt = aes_properties[2:2 + saltsize]
+    iv = aes_properties[2 + saltsize:2 + saltsize + ivsize]
+    assert len(salt) == saltsize
+    assert len(iv) == ivsize
+    assert numcyclespower <= 24
+    if ivsize < 16:
+        iv += bytes('\x00' * (16 - ivsize), 'ascii')
+    return numcyclespower, salt, iv
+
+
 class DeflateDecompressor:
+    """Decompressor of Deflate method. Input exceeding max_length is kept by zlib as unconsumed_tail
+    and decompressed by following calls, so output is never buffered and sliced."""
+
     def __init__(self):
-        self.buf = b''
         self._decompressor = zlib.decompressobj(-15)
 
-    def decompress(self, data: Union[bytes, bytearray, memoryview], max_length: int = -1):
+    def decompress(self, data: Union[bytes, bytearray, memoryview], max_length: int = -1) -> bytes:
+        tail = self._decompressor.unconsumed_tail
+        if len(tail) > 0:
+            data = tail + data if len(data) > 0 else tail
         if max_length < 0:
-            res = self.buf + self._decompressor.decompress(data)
-            self.buf = b''
-        else:
-            tmp = self.buf + self._decompressor.decompress(data)
-            res = tmp[:max_length]
-            self.buf = tmp[max_length:]
-        return res
+            return self._decompressor.decompress(data)
+        elif max_length == 0:
+            return b''
+        return self._decompressor.decompress(data, max_length)
+
+    @property
+    def needs_input(self) -> bool:
+        return len(self._decompressor.unconsumed_tail) == 0
+
+    @property
+    def eof(self) -> bool:
+        return self._decompressor.eof and len(self._decompressor.unconsumed_tail) == 0
 
 
 class CopyDecompressor:
+    """Decompressor of COPY method. Only a part of input exceeding max_length is kept, and it is
+    consumed from an offset of the buffer, so every byte is copied a constant number of times."""
 
     def __init__(self):
-        self._buf = bytes()
+        self._buf = bytearray()
+        self._pos = 0
 
     def decompress(self, data: Union[bytes, bytearray, memoryview], max_length: int = -1) -> bytes:
-        if max_length < 0:
-            length = len(data)
-        else:
-            length = min(len(data), max_length)
-        buflen = len(self._buf)
-        if length > buflen:
-            res = self._buf + data[:length - buflen]
-            self._buf = data[length - buflen:]
-        else:
-            res = self._buf[:length]
-            self._buf = self._buf[length:] + data
+        if self._pos == len(self._buf):
+            # nothing is kept
+            if max_length < 0 or len(data) <= max_length:
+                return bytes(data)
+            view = memoryview(data)
+            self._buf = bytearray(view[max_length:])
+            self._pos = 0
+            return view[:max_length].tobytes()
+        if len(data) > 0:
+            del self._buf[:self._pos]
+            self._pos = 0
+            self._buf += data
+        end = len(self._buf) if max_length < 0 else min(len(self._buf), self._pos + max_length)
+        res = bytes(self._buf[self._pos:end])
+        self._pos = end
         return res
 
+    @property
+    def needs_input(self) -> bool:
+        return self._pos == len(self._buf)
+
+    @property
+    def eof(self) -> bool:
+        return False
+
 
 class AESDecompressor:
 
@@ -83,29 +130,14 @@ class AESDecompressor:
 
     def __init__(self, aes_properties: bytes, password: str, coders: List[Dict[str, Any]]) -> None:
         byte_password = password.encode('utf-16LE')
-        firstbyte = aes_properties[0]
-        numcyclespower = firstbyte & 0x3f
-        if firstbyte & 0xc0 != 0:
-            saltsize = (firstbyte >> 7) & 1
-            ivsize = (firstbyte >> 6) & 1
-            secondbyte = aes_properties[1]
-            saltsize += (secondbyte >> 4)
-            ivsize += (secondbyte & 0x0f)
-            assert len(aes_properties) == 2 + saltsize + ivsize
-            salt = aes_properties[2:2 + saltsize]
-            iv = aes_properties[2 + saltsize:2 + saltsize + ivsize]
-            assert len(salt) == saltsize
-            assert len(iv) == ivsize
-            assert numcyclespower <= 24
-            if ivsize < 16:
-                iv += bytes('\x00' * (16 - ivsize), 'ascii')
-            key = calculate_key(byte_password, numcyclespower, salt, 'sha256')
-            self.lzma_decompressor = self._set_lzma_decompressor(coders)  # type: lzma.LZMADecompressor
-            self.cipher = AES.new(key, AES.MODE_CBC, iv)
-            self.buf = Buffer(size=READ_BLOCKSIZE + 16)
-            self.flushed = False
-        else:
-            raise UnsupportedCompressionMethodError
+        numcyclespower, salt, iv = get_aes_properties(aes_properties)
+        key = key_cache.get(byte_password, numcyclespower, salt, 'sha256')
+        self.lzma_decompressor = self._set_lzma_decompressor(coders)  # type: lzma.LZMADecompressor
+        self.cipher = AES.new(key, AES.MODE_CBC, iv)
+        self._carry = bytearray(16)  # head of a cipher block which is not received yet
+        self._carrylen = 0
+        self._plain = bytearray(READ_BLOCKSIZE)  # reused buffer of decrypted data
+        self.flushed = False
 
     # set pipeline decompressor
     def _set_lzma_decompressor(self, coders: List[Dict[str, Any]]) -> lzma.LZMADecompressor:
@@ -123,32 +155,55 @@ class AESDecompressor:
         return lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=filters)
 
     def decompress(self, data: Union[bytes, bytearray, memoryview], max_length: int = -1) -> bytes:
-        if len(data) == 0 and len(self.buf) == 0:  # action flush
+        """Decrypt whole cipher blocks of data at once into a reused buffer and decompress them.
+        A head of incomplete block is carried to the next call, and it is padded with zeros
+        when called with empty data at the end of input."""
+        if len(data) == 0:
+            if self._carrylen == 0 or not self.lzma_decompressor.needs_input:  # action flush
+                return self.lzma_decompressor.decompress(b'', max_length)
+            # action padding
+            self.flushed = True
+            self._carry[self._carrylen:] = bytes(16 - self._carrylen)
+            self._carrylen = 0
+            return self.lzma_decompressor.decompress(self._decrypt(self._carry, None, 16), max_length)
+        total = self._carrylen + len(data)
+        length = total & ~15
+        if length == 0:
+            self._carry[self._carrylen:total] = data
+            self._carrylen = total
             return self.lzma_decompressor.decompress(b'', max_length)
-        elif len(data) == 0:  # action padding
-            self.flushded = True
-            # align = 16
-            # padlen = (align - offset % align) % align
-            #       = (align - (offset & (align - 1))) & (align - 1)
-            #       = -offset & (align -1)
-            #       = -offset & (16 - 1) = -offset & 15
-            padlen = -len(self.buf) & 15
-            self.buf.add(bytes(padlen))
-            temp = self.cipher.decrypt(self.buf.view)  # type: bytes
-            self.buf.reset()
-            return self.lzma_decompressor.decompress(temp, max_length)
+        if self._carrylen > 0:
+            head = 16 - self._carrylen
+            self._carry[self._carrylen:] = data[:head]
+            plain = self._decrypt(self._carry, data[head:length - self._carrylen], length)
         else:
-            currentlen = len(self.buf) + len(data)
-            nextpos = (currentlen // 16) * 16
-            if currentlen == nextpos:
-                self.buf.add(data)
-                temp = self.cipher.decrypt(self.buf.view)
-                self.buf.reset()
-                return self.lzma_decompressor.decompress(temp, max_length)
-            else:
-                buflen = len(self.buf)
-                temp2 = data[nextpos - buflen:]
-                self.buf.add(data[:nextpos - buflen])
-                temp = self.cipher.decrypt(self.buf.view)
-                self.buf.set(temp2)
-                return self.lzma_decompressor.decompress(temp, max_length)
+            plain = self._decrypt(None, data[:length], length)
+        rest = total - length
+        self._carry[:rest] = data[len(data) - rest:]
+        self._carrylen = rest
+        try:
+            return self.lzma_decompressor.decompress(plain, max_length)
+        except EOFError:
+            return b''  # ignore padding after end of stream
+
+    def _decrypt(self, block: Optional[bytearray], data: Optional[Union[bytes, bytearray, memoryview]],
+                 length: int) -> memoryview:
+        """Decrypt a carried block and following data of total length into the reused buffer."""
+        if len(self._plain) < length:
+            self._plain = bytearray(length)
+        view = memoryview(self._plain)[:length]
+        pos = 0
+        if block is not None:
+            self.cipher.decrypt(block, output=view[:16])
+            pos = 16
+        if data is not None and len(data) > 0:
+            self.cipher.decrypt(data, output=view[pos:length])
+        return view
+
+    @property
+    def needs_input(self) -> bool:
+        return self.lzma_decompressor.needs_input
+
+    @property
+    def eof(self) -> bool:
+        return self.lzma_decompressor.eof
@@ -22,16 +22,27 @@
 #
 
 import _hashlib  # type: ignore  # noqa
+import collections
+import concurrent.futures
 import ctypes
+import errno
+import hashlib
+import io
+import math
+import mmap
 import os
+import pathlib
+import pickle
 import platform
 import stat
 import struct
 import sys
+import tempfile
+import threading
 import time as _time
 import zlib
 from datetime import datetime, timedelta, timezone, tzinfo
-from typing import Optional, Union
+from typing import Any, BinaryIO, List, Optional, Tuple, Union
 
 if sys.platform == "win32":
     from win32file import (CloseHandle, CreateFileW, DeviceIoControl, GENERIC_READ, GetFileAttributes,
@@ -54,6 +65,48 @@ def calculate_crc32(data: bytes, value: Optional[int] = None, blocksize: int = 1
     return value & 0xffffffff
 
 
+_COPY_FALLBACK_ERRNOS = (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF)
+
+
+def copy_file_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    """Copy count bytes at offset of src_fd to a current position of dst_fd.
+    The data is copied in kernel with os.copy_file_range() or os.sendfile() when available,
+    otherwise by os.pread() and os.write(). It returns a number of bytes copied, which is less
+    than count only when src_fd ends."""
+    done = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while done < count:
+                n = os.copy_file_range(src_fd, dst_fd, count - done, offset + done)  # type: ignore
+                if n == 0:
+                    break
+                done += n
+            return done
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        try:
+            while done < count:
+                n = os.sendfile(dst_fd, src_fd, offset + done, count - done)
+                if n == 0:
+                    break
+                done += n
+            return done
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+    while done < count:
+        data = os.pread(src_fd, min(count - done, 1024 * 1024), offset + done)
+        if len(data) == 0:
+            break
+        view = memoryview(data)
+        while len(view) > 0:
+            view = view[os.write(dst_fd, view):]
+        done += len(data)
+    return done
+
+
 def _calculate_key1(password: bytes, cycles: int, salt: bytes, digest: str) -> bytes:
     """Calculate 7zip AES encryption key."""
     if digest not in ('sha256'):
@@ -109,6 +162,243 @@ else:
     calculate_key = _calculate_key2  # ver2 is 1.7-2.0 times faster than ver1
 
 
+def _cgroup_cpu_limit() -> Optional[int]:
+    """Return number of CPUs allowed by a cgroup(v2 or v1) CPU bandwidth quota, or None if unlimited."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return max(1, math.ceil(int(quota) / int(period)))
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota_us = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period_us = int(f.read())
+        if quota_us > 0 and period_us > 0:
+            return max(1, math.ceil(quota_us / period_us))
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def get_cpu_count() -> int:
+    """Return number of CPUs which current process can actually use.
+    It takes CPU affinity and a cgroup CPU quota of containers into account."""
+    if hasattr(os, 'sched_getaffinity'):
+        count = len(os.sched_getaffinity(0))
+    else:
+        count = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        count = min(count, limit)
+    return max(1, count)
+
+
+class DerivedKeyCache:
+    """Process wide LRU cache of keys derived from passwords by calculate_key().
+
+    Entries are identified by SHA-256 of a password, salt, cycles and digest method, so
+    the cache does not hold plain passwords. Derived keys are kept in bytearray and
+    overwritten with zero when evicted or cleared. Threads which need a key under
+    derivation by another thread wait for it instead of deriving it again."""
+
+    def __init__(self, maxsize: int = 32) -> None:
+        self.maxsize = maxsize
+        self._keys = collections.OrderedDict()  # type: collections.OrderedDict
+        self._pending = {}  # type: dict
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(password: bytes, cycles: int, salt: bytes, digest: str) -> Tuple[bytes, int, bytes, str]:
+        return hashlib.sha256(password).digest(), cycles, bytes(salt), digest
+
+    def _lookup(self, ckey: Tuple[bytes, int, bytes, str]) -> Optional[bytes]:
+        key = self._keys.get(ckey, None)
+        if key is None:
+            return None
+        self._keys.move_to_end(ckey)
+        return bytes(key)
+
+    def _store(self, ckey: Tuple[bytes, int, bytes, str], key: bytes) -> None:
+        self._keys[ckey] = bytearray(key)
+        self._keys.move_to_end(ckey)
+        while len(self._keys) > self.maxsize:
+            _, evicted = self._keys.popitem(last=False)
+            self._wipe(evicted)
+
+    @staticmethod
+    def _wipe(key: bytearray) -> None:
+        key[:] = bytes(len(key))
+
+    def get(self, password: bytes, cycles: int, salt: bytes, digest: str = 'sha256') -> bytes:
+        """Return a derived key, calculate it when it is not in the cache."""
+        ckey = self._cache_key(password, cycles, salt, digest)
+        while True:
+            with self._lock:
+                key = self._lookup(ckey)
+                if key is not None:
+                    return key
+                event = self._pending.get(ckey, None)
+                if event is None:
+                    event = threading.Event()
+                    self._pending[ckey] = event
+                    break
+            event.wait()
+        try:
+            key = calculate_key(password, cycles, salt, digest)
+            with self._lock:
+                self._store(ckey, key)
+        finally:
+            with self._lock:
+                del self._pending[ckey]
+            event.set()
+        return key
+
+    def precompute(self, params: List[Tuple[bytes, int, bytes]], digest: str = 'sha256',
+                   max_workers: Optional[int] = None, processes: bool = False) -> None:
+        """Derive keys for a list of (password, cycles, salt) in advance.
+        Keys which are not cached yet are derived in the calling thread. When processes is True,
+        distinct keys are derived in parallel by worker processes instead, because hashing small round
+        buffers does not release GIL. Keys are derived in the calling thread when processes cannot start,
+        e.g. in a daemonic process."""
+        missing = collections.OrderedDict()  # type: collections.OrderedDict
+        with self._lock:
+            for password, cycles, salt in params:
+                ckey = self._cache_key(password, cycles, salt, digest)
+                if ckey not in self._keys and ckey not in self._pending:
+                    missing[ckey] = (password, cycles, salt)
+        if len(missing) == 0:
+            return
+        elif len(missing) == 1:
+            password, cycles, salt = next(iter(missing.values()))
+            self.get(password, cycles, salt, digest)
+            return
+        if processes:
+            if max_workers is None:
+                max_workers = get_cpu_count()
+            try:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+                    tasks = {executor.submit(calculate_key, password, cycles, salt, digest): ckey
+                             for ckey, (password, cycles, salt) in missing.items()}
+                    for task in concurrent.futures.as_completed(tasks):
+                        key = task.result()
+                        with self._lock:
+                            self._store(tasks[task], key)
+            except (AssertionError, OSError, RuntimeError):
+                pass  # keys which are not derived yet are derived below
+        for password, cycles, salt in missing.values():
+            self.get(password, cycles, salt, digest)
+
+    def clear(self) -> None:
+        """Remove all keys from the cache and wipe them."""
+        with self._lock:
+            for key in self._keys.values():
+                self._wipe(key)
+            self._keys.clear()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+key_cache = DerivedKeyCache()
+
+
+class HeaderCache:
+    """Persistent cache of parsed archive headers in a directory, which can be shared by processes.
+
+    An entry is a file named by SHA-256 of its key. It is written to a temporary file and renamed,
+    so readers never see a partial entry, and it is read through a read-only memory map.
+    Least recently used entries are removed when the total size of entries exceeds maxsize.
+    Entries are pickled objects, so the directory should be writable only by trusted users."""
+
+    MAGIC = b'py7zr header cache\x00\x01'
+    SUFFIX = '.p7c'
+
+    def __init__(self, path: Union[str, pathlib.Path], maxsize: int = 256 * 1024 * 1024) -> None:
+        self.path = str(path)
+        self.maxsize = maxsize
+        os.makedirs(self.path, exist_ok=True)
+
+    def _entry_path(self, key: Tuple) -> str:
+        return os.path.join(self.path, hashlib.sha256(repr(key).encode('utf-8')).hexdigest() + self.SUFFIX)
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Return a cached object of key, or None when there is no valid entry."""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size <= len(self.MAGIC):
+                    return None
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if mm[:len(self.MAGIC)] != self.MAGIC:
+                        return None
+                    view = memoryview(mm)
+                    data = view[len(self.MAGIC):]
+                    try:
+                        obj = pickle.loads(data)
+                    finally:
+                        data.release()
+                        view.release()
+            # mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # a broken or incompatible entry is treated as missing, and replaced on next put().
+            return None
+        return obj
+
+    def put(self, key: Tuple, obj: Any) -> None:
+        """Store obj as an entry of key and evict old entries. An object larger than maxsize is not stored."""
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(self.MAGIC) + len(data) > self.maxsize:
+            return
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.MAGIC)
+                f.write(data)
+            os.replace(tmp, self._entry_path(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []  # type: List[Tuple[float, int, str]]
+        for name in os.listdir(self.path):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxsize:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        for name in os.listdir(self.path):
+            if name.endswith(self.SUFFIX):
+                try:
+                    os.unlink(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+
 def filetime_to_dt(ft):
     """Convert Windows NTFS file time into python datetime object."""
     EPOCH_AS_FILETIME = 116444736000000000
@@ -348,6 +638,69 @@ class NullIO:
         pass
 
 
+class CrcWriter:
+    """Writer which passes data to a file object and calculates CRC32 and size of data written,
+    so that a caller does not need to read the data back to check it."""
+
+    __slots__ = ['fp', 'crc', 'size']
+
+    def __init__(self, fp: BinaryIO) -> None:
+        self.fp = fp
+        self.crc = 0
+        self.size = 0
+
+    def write(self, data: Union[bytes, bytearray, memoryview]) -> int:
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        return self.fp.write(data)
+
+
+class MemIO:
+    """Target of extraction which stores data into a BytesIO buffer preallocated to a size of the member.
+    Worker writes to it as same as a file opened from pathlib.Path object."""
+
+    def __init__(self, size: int) -> None:
+        self.buffer = io.BytesIO()
+        if size > 0:
+            self.buffer.seek(size - 1)
+            self.buffer.write(b'\0')
+            self.buffer.seek(0)
+        self._view = None  # type: Optional[memoryview]
+        self._pos = 0
+
+    def open(self, mode='wb') -> 'MemIO':
+        self._pos = 0
+        self._view = self.buffer.getbuffer()
+        return self
+
+    def write(self, data) -> int:
+        length = len(data)
+        if self._view is not None and self._pos + length <= len(self._view):
+            self._view[self._pos:self._pos + length] = data
+        else:
+            # data is longer than a size recorded in archive
+            self._release()
+            self.buffer.seek(self._pos)
+            self.buffer.write(data)
+        self._pos += length
+        return length
+
+    def _release(self) -> None:
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+    def close(self) -> None:
+        self._release()
+        self.buffer.seek(0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 class BufferOverflow(Exception):
     pass
 
@@ -382,3 +735,101 @@ class Buffer:
 
     def __len__(self) -> int:
         return self._buflen
+
+
+class PositionalReader:
+    """Read data at an absolute position of an archive without moving a shared file pointer.
+
+    Regular files are read with os.pread() and buffer-backed objects such as io.BytesIO are sliced,
+    so any number of threads can read from the same object concurrently. Other file-like objects
+    fall back to seek() and read() serialized by a lock."""
+
+    def __init__(self, fp: BinaryIO) -> None:
+        self.fp = fp
+        self.name = getattr(fp, 'name', None)
+        self._fd = None  # type: Optional[int]
+        self._lock = threading.Lock()
+        if hasattr(os, 'pread'):
+            try:
+                fd = fp.fileno()
+                if stat.S_ISREG(os.fstat(fd).st_mode):
+                    self._fd = fd
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                pass
+        if self._fd is not None:
+            self._pread = self._pread_fd
+            self._preadinto = self._preadinto_fd
+        elif hasattr(fp, 'getbuffer'):
+            self._pread = self._pread_buffer
+            self._preadinto = self._preadinto_buffer
+        else:
+            self._pread = self._pread_locked
+            self._preadinto = self._preadinto_locked
+
+    @property
+    def fd(self) -> Optional[int]:
+        """File descriptor of the source when it is a regular file, otherwise None."""
+        return self._fd
+
+    @property
+    def is_regular_file(self) -> bool:
+        """True when the source is a regular file which other processes can open by its name."""
+        return self._fd is not None and isinstance(self.name, str)
+
+    def pread(self, size: int, offset: int) -> bytes:
+        """Read at most size bytes at offset. It returns less bytes only at end of the source."""
+        return self._pread(size, offset)
+
+    def preadinto(self, buffer: Union[bytearray, memoryview], offset: int) -> int:
+        """Read into a writable buffer at offset and return a number of bytes read.
+        It reads less than a length of the buffer only at end of the source."""
+        return self._preadinto(buffer, offset)
+
+    def _pread_fd(self, size: int, offset: int) -> bytes:
+        data = os.pread(self._fd, size, offset)
+        if len(data) == size or len(data) == 0:
+            return data
+        chunks = [data]
+        length = len(data)
+        while length < size:
+            data = os.pread(self._fd, size - length, offset + length)
+            if not data:
+                break
+            chunks.append(data)
+            length += len(data)
+        return b''.join(chunks)
+
+    def _pread_buffer(self, size: int, offset: int) -> bytes:
+        with self.fp.getbuffer() as view:  # type: ignore
+            return bytes(view[offset:offset + size])
+
+    def _pread_locked(self, size: int, offset: int) -> bytes:
+        with self._lock:
+            self.fp.seek(offset)
+            return self.fp.read(size)
+
+    def _preadinto_fd(self, buffer: Union[bytearray, memoryview], offset: int) -> int:
+        size = len(buffer)
+        if not hasattr(os, 'preadv'):  # python < 3.7 or platforms without preadv(2)
+            data = self._pread_fd(size, offset)
+            buffer[:len(data)] = data
+            return len(data)
+        view = memoryview(buffer)
+        length = 0
+        while length < size:
+            n = os.preadv(self._fd, [view[length:]], offset + length)
+            if n == 0:
+                break
+            length += n
+        return length
+
+    def _preadinto_buffer(self, buffer: Union[bytearray, memoryview], offset: int) -> int:
+        with self.fp.getbuffer() as view:  # type: ignore
+            data = view[offset:offset + len(buffer)]
+            buffer[:len(data)] = data
+            return len(data)
+
+    def _preadinto_locked(self, buffer: Union[bytearray, memoryview], offset: int) -> int:
+        data = self._pread_locked(len(buffer), offset)
+        buffer[:len(data)] = data
+        return len(data)
@@ -29,6 +29,9 @@ MAGIC_7Z = binascii.unhexlify('377abcaf271c')
 FINISH_7Z = binascii.unhexlify('377abcaf271d')
 READ_BLOCKSIZE = 32248
 QUEUELEN = READ_BLOCKSIZE * 2
+PASSWORD_CHECK_SIZE = 65536
+DECOMPRESS_CHUNKSIZE = 1048576
+AES_READ_BLOCKSIZE = 262144  # input block of encrypted folders, decrypted in a batch
 
 READ_BLOCKSIZE = 32248
 
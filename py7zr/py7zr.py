@@ -25,20 +25,25 @@
 """Read 7zip format archives."""
 import datetime
 import errno
+import fnmatch
 import functools
 import io
 import operator
 import os
+import re
 import stat
 import sys
+from array import array
 from io import BytesIO
-from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple, Union
 
-from py7zr.archiveinfo import Folder, Header, SignatureHeader
-from py7zr.compression import SevenZipCompressor, Worker, get_methods_names
-from py7zr.exceptions import Bad7zFile
-from py7zr.helpers import ArchiveTimestamp, calculate_crc32, filetime_to_dt
-from py7zr.properties import MAGIC_7Z, READ_BLOCKSIZE, ArchivePassword
+from py7zr.archiveinfo import FileTable, FileTableView, Folder, Header, SignatureHeader
+from py7zr.compression import (ArchiveFileReader, EndOfMember, ExtractPlan, SevenZipCompressor, Worker,
+                               get_methods_names)
+from py7zr.exceptions import Bad7zFile, DecompressionError, WrongPasswordError
+from py7zr.helpers import (ArchiveTimestamp, HeaderCache, MemIO, PositionalReader, calculate_crc32,
+                           filetime_to_dt)
+from py7zr.properties import MAGIC_7Z, READ_BLOCKSIZE
 
 if sys.version_info < (3, 6):
     import contextlib2 as contextlib
@@ -64,17 +69,29 @@ class ArchiveFile:
     Each object stores information about a single member of the 7z archive. Most of users use :meth:`extractall()`.
 
     The class also hold an archive parameter where file is exist in
-    archive file folder(container)."""
+    archive file folder(container).
+    It is a lightweight view of a dict or a row of a file table of the archive."""
+
+    __slots__ = ['id', '_file_info']
+
     def __init__(self, id: int, file_info: Dict[str, Any]) -> None:
         self.id = id
         self._file_info = file_info
 
+    def __getstate__(self):
+        # a view of a file table is pickled as a dict of its own properties, not with a whole table.
+        file_info = dict(self._file_info) if self._file_info is not None else None
+        return self.id, file_info
+
+    def __setstate__(self, state):
+        self.id, self._file_info = state
+
     def file_properties(self) -> Dict[str, Any]:
         """Return file properties as a hash object. Following keys are included: ‘readonly’, ‘is_directory’,
         ‘posix_mode’, ‘archivable’, ‘emptystream’, ‘filename’, ‘creationtime’, ‘lastaccesstime’,
         ‘lastwritetime’, ‘attributes’
         """
-        properties = self._file_info
+        properties = dict(self._file_info) if self._file_info is not None else None
         if properties is not None:
             properties['readonly'] = self.readonly
             properties['posix_mode'] = self.posix_mode
@@ -120,6 +137,11 @@ class ArchiveFile:
         """Compressed size"""
         return self._get_property('compressed')
 
+    @property
+    def digest(self) -> Optional[int]:
+        """CRC32 digest of uncompressed data, or None when archive does not have it."""
+        return self._get_property('digest')
+
     def _test_attribute(self, target_bit: int) -> bool:
         attributes = self._get_property('attributes')
         if attributes is None:
@@ -197,15 +219,32 @@ class ArchiveFile:
 
 
 class ArchiveFileList:
-    """Iteratable container of ArchiveFile."""
+    """Iteratable container of ArchiveFile.
+    When a file table is given, it holds only ids of files and files_list is a view of the table."""
 
-    def __init__(self, offset: int = 0):
-        self.files_list = []  # type: List[dict]
+    def __init__(self, offset: int = 0, table: Optional[FileTable] = None):
+        self.table = table
+        self.ids = array('l')
+        self.files_list = [] if table is None else FileTableView(table, self.ids)  # type: Any
         self.index = 0
         self.offset = offset
 
-    def append(self, file_info: Dict[str, Any]) -> None:
-        self.files_list.append(file_info)
+    def append(self, file_info: Optional[Dict[str, Any]], id: Optional[int] = None) -> None:
+        """Append file_info. id is an index of the file in archive, default is next to the last one.
+        file_info is not used when the list is a view of a file table."""
+        if id is None:
+            id = self.ids[-1] + 1 if len(self.ids) > 0 else self.offset
+        if self.table is None:
+            self.files_list.append(file_info)
+        self.ids.append(id)
+
+    def names(self) -> List[str]:
+        """Return names of files in the list."""
+        if self.table is not None:
+            if len(self.ids) == len(self.table):
+                return self.table.names()
+            return [self.table.name(i) for i in self.ids]
+        return [ArchiveFile(0, file_info).filename for file_info in self.files_list]
 
     def __len__(self) -> int:
         return len(self.files_list)
@@ -217,11 +256,77 @@ class ArchiveFileList:
     def __next__(self) -> ArchiveFile:
         if self.index == len(self.files_list):
             raise StopIteration
-        res = ArchiveFile(self.index + self.offset, self.files_list[self.index])
+        res = ArchiveFile(self.ids[self.index], self.files_list[self.index])
         self.index += 1
         return res
 
 
+class ArchiveIndex:
+    """Index of names of members in an archive.
+    It holds a hash map from a name to ids of members and a directory tree of names,
+    which is made of sets of entry names keyed by their parent directory path."""
+
+    def __init__(self, files: ArchiveFileList) -> None:
+        self.names = files.names()  # type: List[str]
+        self.ids = files.ids
+        self.name_ids = {}  # type: Dict[str, int]
+        self.duplicates = {}  # type: Dict[str, List[int]]
+        self.children = {'': set()}  # type: Dict[str, Set[str]]
+        for name, file_id in zip(self.names, self.ids):
+            if name in self.name_ids:
+                self.duplicates.setdefault(name, [self.name_ids[name]]).append(file_id)
+            self.name_ids[name] = file_id
+            self._add_path(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _add_path(self, name: str) -> None:
+        path = name.rstrip('/')
+        while path:
+            parent, _, entry = path.rpartition('/')
+            entries = self.children.setdefault(parent, set())
+            if entry in entries:
+                break
+            entries.add(entry)
+            path = parent
+
+    def get_ids(self, name: str) -> List[int]:
+        """Return ids of members of the name, which is empty when there is no such member."""
+        if name in self.duplicates:
+            return self.duplicates[name]
+        if name in self.name_ids:
+            return [self.name_ids[name]]
+        return []
+
+    def select_ids(self, names: List[str]) -> Set[int]:
+        """Return a set of ids of members which have one of names."""
+        return {file_id for name in names for file_id in self.get_ids(name)}
+
+    def listdir(self, path: str = '') -> List[str]:
+        """Return sorted names of entries in a directory path, '' is a root of an archive."""
+        entries = self.children.get(path.rstrip('/'))
+        if entries is None:
+            raise KeyError('There is no directory named {} in the archive'.format(path))
+        return sorted(entries)
+
+    def select(self, patterns: List[str], regex: bool = False) -> List[str]:
+        """Return names which match one of glob patterns, or regular expressions when regex is True.
+        Patterns are compiled at once, and every name is tested only once."""
+        if regex:
+            compiled = [re.compile(pattern) for pattern in patterns]
+        else:
+            compiled = [re.compile(fnmatch.translate(pattern)) for pattern in patterns]
+        matchers = [c.match for c in compiled]
+        selected = []  # type: List[str]
+        seen = set()  # type: Set[str]
+        for name in self.names:
+            if name not in seen and any(match(name) for match in matchers):
+                selected.append(name)
+            seen.add(name)
+        return selected
+
+
 # ------------------
 # Exported Classes
 # ------------------
@@ -253,16 +358,20 @@ class SevenZipFile(contextlib.AbstractContextManager):
     """The SevenZipFile Class provides an interface to 7z archives."""
 
     def __init__(self, file: Union[BinaryIO, str, pathlib.Path], mode: str = 'r',
-                 *, filters: Optional[str] = None, password: Optional[str] = None) -> None:
+                 *, filters: Optional[str] = None, password: Optional[str] = None, mp: bool = False,
+                 lazy: bool = False, index_cache: Optional[Union[str, pathlib.Path, HeaderCache]] = None,
+                 blocks: int = 1, block_size: Optional[int] = None, copy_crc: bool = True) -> None:
         if mode not in ('r', 'w', 'x', 'a'):
             raise ValueError("ZipFile requires mode 'r', 'w', 'x', or 'a'")
+        if blocks < 1:
+            raise ValueError("blocks should be 1 or more.")
         if password is not None:
             if mode not in ('r'):
                 raise NotImplementedError("It has not been implemented to create archive with password.")
-            ArchivePassword(password)
             self.password_protected = True
         else:
             self.password_protected = False
+        self.password = password  # type: Optional[str]
         # Check if we were passed a file-like object or not
         if isinstance(file, str):
             self._filePassed = False  # type: bool
@@ -300,12 +409,24 @@ class SevenZipFile(contextlib.AbstractContextManager):
         else:
             raise TypeError("invalid file: {}".format(type(file)))
         self._fileRefCnt = 1
+        self.mp = mp
+        self.lazy = lazy
+        if index_cache is not None and not isinstance(index_cache, HeaderCache):
+            index_cache = HeaderCache(index_cache)
+        self.index_cache = index_cache  # type: Optional[HeaderCache]
+        self.blocks = blocks
+        self.block_size = block_size
+        self.copy_crc = copy_crc
+        self._index = None  # type: Optional[ArchiveIndex]
+        self._worker = None  # type: Optional[Worker]
+        self._password_checked = False
         try:
             if mode == "r":
                 self._real_get_contents(self.fp)
                 self._reset_worker()
             elif mode in 'w':
                 # FIXME: check filters here
+                self.filters = filters
                 self.folder = self._create_folder(filters)
                 self.files = ArchiveFileList()
                 self._prepare_write()
@@ -329,7 +450,7 @@ class SevenZipFile(contextlib.AbstractContextManager):
 
     def _create_folder(self, filters):
         folder = Folder()
-        folder.compressor = SevenZipCompressor(filters)
+        folder.compressor = SevenZipCompressor(filters, block_size=self.block_size)
         folder.coders = folder.compressor.coders
         folder.solid = True
         folder.digestdefined = False
@@ -349,22 +470,73 @@ class SevenZipFile(contextlib.AbstractContextManager):
             raise Bad7zFile('not a 7z file')
         self.sig_header = SignatureHeader.retrieve(self.fp)
         self.afterheader = self.fp.tell()
-        buffer = self._read_header_data()
-        header = Header.retrieve(self.fp, buffer, self.afterheader)
+        cache_key = self._header_cache_key()
+        header = self._get_cached_header(cache_key)
+        cached = header is not None
+        # a header is parsed entirely to be cached
+        lazy = self.lazy and cache_key is None
+        if header is None:
+            buffer = self._read_header_data()
+            header = Header.retrieve(self.fp, buffer, self.afterheader, lazy=lazy)
         if header is None:
             return
         self.header = header
-        buffer.close()
         self.files = ArchiveFileList()
         if getattr(self.header, 'files_info', None) is not None:
-            self._filelist_retrieve()
+            self._filelist_retrieve(cached, lazy)
+        if cache_key is not None and not cached:
+            self._put_cached_header(cache_key)
+        if getattr(self.header, 'main_streams', None) is not None:
+            for folder in self.header.main_streams.unpackinfo.folders:
+                folder.password = self.password
+
+    def _header_cache_key(self) -> Optional[Tuple]:
+        """Return a key of the archive in the header cache, or None when the archive is not cached."""
+        if self.index_cache is None or not isinstance(self.filename, str):
+            # a file object opened on a file descriptor has an integer name, which is not a stable key.
+            return None
+        try:
+            fstat = os.stat(self.filename)
+        except OSError:
+            return None
+        return (os.path.abspath(self.filename), fstat.st_size, fstat.st_mtime_ns, self.sig_header.nextheadercrc)
+
+    def _signature(self) -> Tuple:
+        sig = self.sig_header
+        return sig.startheadercrc, sig.nextheaderofs, sig.nextheadersize, sig.nextheadercrc
+
+    def _get_cached_header(self, cache_key: Optional[Tuple]) -> Optional[Header]:
+        """Return a header from the cache when an entry of the archive has a same signature header.
+        Folders are given their file lists, which are not pickled with folders."""
+        if cache_key is None:
+            return None
+        entry = self.index_cache.get(cache_key)
+        if entry is None or not isinstance(entry, tuple) or entry[0] != self._signature():
+            return None
+        _, header, folder_ids = entry
+        if header.main_streams is not None:
+            table = header.files_info.files
+            for folder, ids in zip(header.main_streams.unpackinfo.folders, folder_ids):
+                if ids is not None:
+                    folder.files = ArchiveFileList(offset=ids[0], table=table)
+                    folder.files.ids.extend(ids)
+        return header
+
+    def _put_cached_header(self, cache_key: Tuple) -> None:
+        # folders are stored without passwords, which are set after the header is cached.
+        folder_ids = []  # type: List[Optional[array]]
+        if self.header.main_streams is not None:
+            folder_ids = [folder.files.ids if folder.files is not None else None
+                          for folder in self.header.main_streams.unpackinfo.folders]
+        self.index_cache.put(cache_key, (self._signature(), self.header, folder_ids))
 
     def _read_header_data(self) -> BytesIO:
         self.fp.seek(self.sig_header.nextheaderofs, os.SEEK_CUR)
-        buffer = io.BytesIO(self.fp.read(self.sig_header.nextheadersize))
-        if self.sig_header.nextheadercrc != calculate_crc32(buffer.getvalue()):
+        data = self.fp.read(self.sig_header.nextheadersize)
+        if self.sig_header.nextheadercrc != calculate_crc32(data):
             raise Bad7zFile('invalid header data')
-        return buffer
+        # BytesIO shares data until it is modified
+        return io.BytesIO(data)
 
     class ParseStatus:
         def __init__(self, src_pos=0):
@@ -404,7 +576,23 @@ class SevenZipFile(contextlib.AbstractContextManager):
         packsize = packsizes[pstat.stream:pstat.stream + numinstreams]
         return maxsize, compressed, uncompressed, packsize, folder.solid
 
-    def _filelist_retrieve(self) -> None:
+    def _filelist_retrieve(self, cached: bool = False, lazy: bool = False) -> None:
+        table = self.header.files_info.files  # type: FileTable
+        self.files = ArchiveFileList(table=table)
+        self.files.ids.extend(range(len(table)))
+        if cached:
+            # stream properties and file lists of folders are restored from the cache
+            return
+        if 'filename' not in table.loaders and None in table.basenames:
+            for file_id, basename in enumerate(table.basenames):
+                if basename is None:
+                    table.set(file_id, 'filename', self._gen_filename())
+        if lazy:
+            table.add_loader(FileTable.STREAM_COLUMNS, self._streams_retrieve)
+        else:
+            self._streams_retrieve()
+
+    def _streams_retrieve(self) -> None:
         # Initialize references for convenience
         if hasattr(self.header, 'main_streams') and self.header.main_streams is not None:
             folders = self.header.main_streams.unpackinfo.folders
@@ -422,9 +610,11 @@ class SevenZipFile(contextlib.AbstractContextManager):
         pstat = self.ParseStatus()
         pstat.src_pos = self.afterheader
         file_in_solid = 0
+        table = self.header.files_info.files  # type: FileTable
+        table.set_folders(folders if folders is not None else [])
 
-        for file_id, file_info in enumerate(self.header.files_info.files):
-            if not file_info['emptystream'] and folders is not None:
+        for file_id in range(len(table)):
+            if not table.emptystream[file_id] and folders is not None:
                 folder = folders[pstat.folder]
                 numinstreams = max([coder.get('numinstreams', 1) for coder in folder.coders])
                 (maxsize, compressed, uncompressed,
@@ -432,38 +622,24 @@ class SevenZipFile(contextlib.AbstractContextManager):
                                                              unpacksizes, file_in_solid, numinstreams)
                 pstat.input += 1
                 folder.solid = solid
-                file_info['folder'] = folder
-                file_info['maxsize'] = maxsize
-                file_info['compressed'] = compressed
-                file_info['uncompressed'] = uncompressed
-                file_info['packsizes'] = packsize
-                if subinfo.digestsdefined[pstat.outstreams]:
-                    file_info['digest'] = subinfo.digests[pstat.outstreams]
+                digest = subinfo.digests[pstat.outstreams] if subinfo.digestsdefined[pstat.outstreams] else None
+                table.set_stream(file_id, pstat.folder, maxsize, compressed, uncompressed, packsize, digest)
                 if folder is None:
-                    pstat.src_pos += file_info['compressed']
+                    pstat.src_pos += compressed
                 else:
                     if folder.solid:
                         file_in_solid += 1
                     pstat.outstreams += 1
                     if folder.files is None:
-                        folder.files = ArchiveFileList(offset=file_id)
-                    folder.files.append(file_info)
+                        folder.files = ArchiveFileList(offset=file_id, table=table)
+                    folder.files.append(None, file_id)
                     if pstat.input >= subinfo.num_unpackstreams_folders[pstat.folder]:
                         file_in_solid = 0
                         pstat.src_pos += sum(packinfo.packsizes[pstat.stream:pstat.stream + numinstreams])
                         pstat.folder += 1
                         pstat.stream += numinstreams
                         pstat.input = 0
-            else:
-                file_info['folder'] = None
-                file_info['maxsize'] = 0
-                file_info['compressed'] = 0
-                file_info['uncompressed'] = [0]
-                file_info['packsizes'] = [0]
-
-            if 'filename' not in file_info:
-                file_info['filename'] = self._gen_filename()
-            self.files.append(file_info)
+            # properties of a file without a stream are initialized by table.set_folders()
 
     def _num_files(self) -> int:
         if getattr(self.header, 'files_info', None) is not None:
@@ -491,9 +667,18 @@ class SevenZipFile(contextlib.AbstractContextManager):
                 folder.decompressor = None
 
     def _reset_worker(self) -> None:
-        """Seek to where archive data start in archive and recreate new worker."""
+        """Seek to where archive data start in archive and recreate new worker on next use."""
         self.fp.seek(self.afterheader)
-        self.worker = Worker(self.files, self.afterheader, self.header)
+        self._worker = None
+
+    @property
+    def worker(self) -> Worker:
+        if self._worker is None:
+            if self.files.table is not None:
+                # folders are assigned their files when stream properties are loaded
+                self.files.table.load(FileTable.STREAM_COLUMNS)
+            self._worker = Worker(self.files, self.afterheader, self.header, mp=self.mp, copy_crc=self.copy_crc)
+        return self._worker
 
     def set_encoded_header_mode(self, mode: bool) -> None:
         self.encoded_header_mode = mode
@@ -535,8 +720,8 @@ class SevenZipFile(contextlib.AbstractContextManager):
         for f in self.files:
             self.worker.register_filelike(f.id, None)
         try:
-            self.worker.extract(self.fp, parallel=(not self.password_protected))  # TODO: print progress
-        except Bad7zFile:
+            self.worker.extract(self.fp, parallel=True)  # TODO: print progress
+        except (Bad7zFile, DecompressionError):
             return False
         else:
             return True
@@ -558,7 +743,8 @@ class SevenZipFile(contextlib.AbstractContextManager):
         self.header = Header.build_header([self.folder])
 
     def _write_archive(self):
-        self.worker.archive(self.fp, self.folder)
+        folders = [self.folder] + [self._create_folder(self.filters) for _ in range(1, self.blocks)]
+        self.worker.archive(self.fp, folders)
         # Write header and update signature header
         (header_pos, header_len, header_crc) = self.header.write(self.fp, self.afterheader,
                                                                  encoded=self.encoded_header_mode)
@@ -616,13 +802,42 @@ class SevenZipFile(contextlib.AbstractContextManager):
         f['lastaccesstime'] = target.stat().st_atime
         return f
 
+    def _get_index(self) -> ArchiveIndex:
+        """Return an index of member names, which is built on first use."""
+        if self._index is None or len(self._index) != len(self.files):
+            self._index = ArchiveIndex(self.files)
+        return self._index
+
     # --------------------------------------------------------------------------
     # The public methods which SevenZipFile provides:
     def getnames(self) -> List[str]:
         """Return the members of the archive as a list of their names. It has
            the same order as the list returned by getmembers().
         """
-        return list(map(lambda x: x.filename, self.files))
+        return self.files.names()
+
+    def getinfo(self, name: str) -> ArchiveFile:
+        """Return ArchiveFile object of the member `name'. When the archive has several members
+           with the name, the last one is returned. It raises KeyError when there is no member.
+        """
+        ids = self._get_index().get_ids(name)
+        if not ids:
+            raise KeyError('There is no item named {} in the archive'.format(name))
+        return ArchiveFile(ids[-1], self.files.files_list[ids[-1]])
+
+    def listdir(self, path: str = '') -> List[str]:
+        """Return a sorted list of names of entries in a directory `path' of the archive,
+           default is a root of the archive. It raises KeyError when there is no such directory.
+        """
+        return self._get_index().listdir(path)
+
+    def select(self, patterns: Union[str, List[str]], *, regex: bool = False) -> List[str]:
+        """Return a list of member names which match one of glob `patterns', or regular
+           expressions when `regex' is True. The result can be given to extract() and read() as targets.
+        """
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        return self._get_index().select(patterns, regex=regex)
 
     def archiveinfo(self) -> ArchiveInfo:
         fstat = os.stat(self.filename)
@@ -631,6 +846,8 @@ class SevenZipFile(contextlib.AbstractContextManager):
 
     def list(self) -> List[FileInfo]:
         """Returns contents information """
+        if self.files.table is not None:
+            return self._list_table(self.files.table)
         alist = []  # type: List[FileInfo]
         creationtime = None  # type: Optional[datetime.datetime]
         for f in self.files:
@@ -640,19 +857,93 @@ class SevenZipFile(contextlib.AbstractContextManager):
                                   creationtime))
         return alist
 
+    def _list_table(self, table: FileTable) -> List[FileInfo]:
+        """list() which reads columns of a file table, rows with extra properties are read through ArchiveFile."""
+        alist = []  # type: List[FileInfo]
+        creationtime = None  # type: Optional[datetime.datetime]
+        table.load()
+        names = table.names()
+        attributes = table.columns.get('attributes')
+        lastwritetimes = table.columns.get('lastwritetime')
+        compressed = table.columns['compressed']
+        archive_flag = stat.FILE_ATTRIBUTE_ARCHIVE  # type: ignore  # noqa
+        directory_flag = stat.FILE_ATTRIBUTE_DIRECTORY  # type: ignore  # noqa
+        for i in self.files.ids:
+            if i in table.extras:
+                f = ArchiveFile(i, table[i])
+                if f.lastwritetime is not None:
+                    creationtime = filetime_to_dt(f.lastwritetime)
+                alist.append(FileInfo(f.filename, f.compressed, f.uncompressed_size, f.archivable, f.is_directory,
+                                      creationtime))
+                continue
+            if lastwritetimes is not None and lastwritetimes[i] >= 0:
+                creationtime = filetime_to_dt(lastwritetimes[i])
+            a = attributes[i] if attributes is not None and attributes[i] >= 0 else 0
+            alist.append(FileInfo(names[i], compressed[i] if compressed[i] >= 0 else None,
+                                  table.uncompressed[i] * table.numcoders[i], a & archive_flag == archive_flag,
+                                  a & directory_flag == directory_flag, creationtime))
+        return alist
+
     def test(self) -> bool:
         """Test archive using CRC digests."""
         return self._test_digests()
 
-    def extractall(self, path: Optional[Any] = None) -> None:
+    def check_password(self) -> Optional[bool]:
+        """Verify the password with a beginning of the smallest encrypted folder.
+        It raises WrongPasswordError when the password is wrong, returns True when it is verified,
+        and None when it is not determined from the beginning of the folder.
+        It is also called before data of a password protected archive is read first."""
+        result = self.worker.check_password(self.fp)
+        if result is False:
+            raise WrongPasswordError('wrong password for {}'.format(self.filename))
+        self._password_checked = True
+        return result
+
+    def _check_password_once(self) -> None:
+        if self.password_protected and not self._password_checked:
+            self.check_password()
+
+    def open(self, name: str) -> ArchiveFileReader:
+        """Return a read-only file object of the member `name'. The member is decompressed
+           on demand while reading, so it is not written to any storage. CRC of the member
+           is checked when reaching the end of the member and CrcError is raised on mismatch.
+           When the archive has several members with the name, the last one is returned.
+        """
+        if self.mode != 'r':
+            raise ValueError("open() requires mode 'r'")
+        target = self.getinfo(name)
+        self._check_password_once()
+        fp = PositionalReader(self.fp)
+        folder = target.folder
+        if target.emptystream or folder is None:
+            return ArchiveFileReader(fp, None, 0, 0, None, 0, 0)
+        # skip preceding members in a solid folder
+        offset = 0
+        for file_id, file_info in zip(folder.files.ids, folder.files.files_list):
+            if file_id == target.id:
+                break
+            offset += file_info['uncompressed'][-1]
+        folders = self.header.main_streams.unpackinfo.folders
+        start, end = self.header.main_streams.folder_positions()[folders.index(folder)]
+        return ArchiveFileReader(fp, folder, offset, target.uncompressed[-1], target.digest,
+                                 self.afterheader + start, self.afterheader + end)
+
+    def extractall(self, path: Optional[Any] = None, *, max_workers: Optional[int] = None) -> None:
         """Extract all members from the archive to the current working
            directory and set owner, modification time and permissions on
            directories afterwards. `path' specifies a different directory
-           to extract to.
+           to extract to. `max_workers' limits a number of folders extracted
+           concurrently, default is a number of available CPUs.
+        """
+        return self.extract(path, max_workers=max_workers)
+
+    def extract(self, path: Optional[Any] = None, targets: Optional[List[str]] = None,
+                *, max_workers: Optional[int] = None, dry_run: bool = False) -> Optional[ExtractPlan]:
+        """Extract members in `targets' or all the members when targets is None.
+           Folders which have no target are skipped, and decompression of a solid folder
+           stops after its last target. When `dry_run' is True, nothing is written and
+           it returns ExtractPlan object which reports bytes to be decompressed.
         """
-        return self.extract(path)
-
-    def extract(self, path: Optional[Any] = None, targets: Optional[List[str]] = None) -> None:
         target_junction = []  # type: List[pathlib.Path]
         target_sym = []  # type: List[pathlib.Path]
         target_files = []  # type: List[Tuple[pathlib.Path, Dict[str, Any]]]
@@ -660,6 +951,7 @@ class SevenZipFile(contextlib.AbstractContextManager):
         if path is not None:
             if isinstance(path, str):
                 path = pathlib.Path(path)
+        if path is not None and not dry_run:
             try:
                 if not path.exists():
                     path.mkdir(parents=True)
@@ -670,7 +962,11 @@ class SevenZipFile(contextlib.AbstractContextManager):
                     pass
                 else:
                     raise e
-        fnames = []  # type: List[str]  # check duplicated filename in one archive?
+        selected = None  # type: Optional[Set[int]]
+        if targets is not None:
+            selected = self._get_index().select_ids(targets)
+        target_parents = set()  # type: Set[pathlib.Path]
+        fnames = set()  # type: Set[str]  # check duplicated filename in one archive?
         for f in self.files:
             # TODO: sanity check
             # check whether f.filename with invalid characters: '../'
@@ -688,14 +984,16 @@ class SevenZipFile(contextlib.AbstractContextManager):
                     outname = f.filename + '_%d' % i
                     if outname not in fnames:
                         break
-            fnames.append(outname)
+                    i += 1
+            fnames.add(outname)
             if path is not None:
                 outfilename = path.joinpath(outname)
             else:
                 outfilename = pathlib.Path(outname)
-            if targets is not None and f.filename not in targets:
+            if selected is not None and f.id not in selected:
                 self.worker.register_filelike(f.id, None)
                 continue
+            target_parents.add(outfilename.parent)
             if f.is_directory:
                 if not outfilename.exists():
                     target_dirs.append(outfilename)
@@ -713,6 +1011,13 @@ class SevenZipFile(contextlib.AbstractContextManager):
             else:
                 self.worker.register_filelike(f.id, outfilename)
                 target_files.append((outfilename, f.file_properties()))
+        if dry_run:
+            return self.worker.plan(only_targets=targets is not None)
+        self._check_password_once()
+        if selected is not None:
+            # parent directories of selected members are created even when they are not selected.
+            for parent in sorted(target_parents):
+                parent.mkdir(parents=True, exist_ok=True)
         for target_dir in sorted(target_dirs):
             try:
                 target_dir.mkdir()
@@ -724,7 +1029,7 @@ class SevenZipFile(contextlib.AbstractContextManager):
                     raise Exception("Directory name is existed as a normal file.")
                 else:
                     raise Exception("Directory making fails on unknown condition.")
-        self.worker.extract(self.fp, parallel=(not self.password_protected and not self._filePassed))
+        self.worker.extract(self.fp, parallel=True, max_workers=max_workers, only_targets=targets is not None)
 
         # create symbolic links on target path as a working directory.
         # if path is None, work on current working directory.
@@ -746,6 +1051,42 @@ class SevenZipFile(contextlib.AbstractContextManager):
 
         for o, p in target_files:
             self._set_file_property(o, p)
+        return None
+
+    def read(self, targets: Optional[List[str]] = None, *, max_workers: Optional[int] = None) -> Dict[str, BytesIO]:
+        """Decompress members into memory and return a dictionary of member name and BytesIO object.
+           `targets' selects members to read, default is all the members except directories.
+           Each buffer is allocated with a size of the member in advance, and folders are
+           decompressed in parallel as same as extract().
+        """
+        if self.mode != 'r':
+            raise ValueError("read() requires mode 'r'")
+        selected = set(targets) if targets is not None else None
+        buffers = {}  # type: Dict[str, MemIO]
+        for f in self.files:
+            if f.is_directory or (selected is not None and f.filename not in selected):
+                self.worker.register_filelike(f.id, None)
+                continue
+            buffer = MemIO(0 if f.emptystream else f.uncompressed[-1])
+            buffers[f.filename] = buffer
+            self.worker.register_filelike(f.id, buffer)
+        self._check_password_once()
+        self.worker.extract(self.fp, parallel=True, max_workers=max_workers, only_targets=selected is not None)
+        return {name: buffer.buffer for name, buffer in buffers.items()}
+
+    def iter_content(self, chunk_size: int = 65536) -> Iterator[Tuple[ArchiveFile, Union[memoryview, EndOfMember]]]:
+        """Generator which decompresses all the members in physical order and yields tuples of
+           ArchiveFile and memoryview of a chunk of its data, which is not larger than `chunk_size'.
+           After the chunks of each member, including directories and empty files, a tuple of
+           ArchiveFile and EndOfMember object is yielded, which tells a result of CRC check.
+        """
+        if self.mode != 'r':
+            raise ValueError("iter_content() requires mode 'r'")
+        if chunk_size <= 0:
+            raise ValueError("chunk_size should be positive")
+        members = list(self.files)
+        self._check_password_once()
+        return self.worker.iter_content(self.fp, members, chunk_size)
 
     def writeall(self, path: Union[pathlib.Path, str], arcname: Optional[str] = None):
         """Write files in target path into archive."""
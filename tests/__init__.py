@@ -12,6 +12,15 @@ testdata_path = os.path.join(os.path.dirname(__file__), 'data')
 os.umask(0o022)
 
 
+def corrupt_copy_archive(tmp_path):
+    """Write a copy of copy.7z which has a flipped byte in data of test1.txt, and return its path."""
+    data = bytearray(pathlib.Path(testdata_path).joinpath('copy.7z').read_bytes())
+    data[data.index(b'located in the root')] ^= 0xff
+    target = tmp_path.joinpath('corrupt.7z')
+    target.write_bytes(bytes(data))
+    return target
+
+
 def check_output(expected, tmpdir):
     for exp in expected:
         if isinstance(tmpdir, str):
@@ -6,6 +6,11 @@ import pytest
 from pyannotate_runtime import collect_types
 
 
+def pytest_addoption(parser):
+    parser.addoption('--many-files', type=int, default=0, metavar='N',
+                     help='run benchmarks which open an archive of N files, e.g. 1000000; skipped by default.')
+
+
 def pytest_collection_finish(session):
     """Handle the pytest collection finish hook: configure pyannotate.
     Explicitly delay importing `collect_types` until all tests have
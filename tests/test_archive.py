@@ -14,6 +14,7 @@ import pytest
 
 import py7zr.archiveinfo
 import py7zr.compression
+import py7zr.exceptions
 import py7zr.helpers
 import py7zr.properties
 from py7zr import SevenZipFile, pack_7zarchive
@@ -46,6 +47,42 @@ def test_simple_compress_and_decompress():
     assert out6 == b'Some data\nAnother piece of data\nEven more data\n'
 
 
+@pytest.mark.unit
+def test_compress_blocks():
+    data = b''.join(b'line %d of data\n' % i for i in range(20000))
+    compressor = py7zr.compression.SevenZipCompressor(block_size=65536, max_workers=2)
+    out = [compressor.compress(data[i:i + 10000]) for i in range(0, len(data), 10000)]
+    out.append(compressor.flush())
+    result = b''.join(out)
+    assert result.endswith(b'\x00')
+    decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=compressor.filters)
+    assert decompressor.decompress(result) == data
+    assert decompressor.eof
+    # empty input is an empty LZMA2 stream
+    compressor = py7zr.compression.SevenZipCompressor(block_size=65536)
+    assert compressor.compress(b'') + compressor.flush() == b'\x00'
+    with pytest.raises(py7zr.exceptions.UnsupportedCompressionMethodError):
+        py7zr.compression.SevenZipCompressor([{'id': lzma.FILTER_X86}, {'id': lzma.FILTER_LZMA2}], block_size=65536)
+
+
+@pytest.mark.files
+@pytest.mark.skipif(sys.version_info < (3, 6), reason="requires python3.6 or higher")
+def test_compress_file_block_size(tmp_path):
+    data = b''.join(b'line %d of data\n' % i for i in range(100000))
+    tmp_path.joinpath('src').mkdir()
+    tmp_path.joinpath('src', 'data.txt').write_bytes(data)
+    tmp_path.joinpath('src', 'small.txt').write_bytes(b'small')
+    target = tmp_path.joinpath('target.7z')
+    with py7zr.SevenZipFile(target, 'w', block_size=256 * 1024) as archive:
+        archive.writeall(str(tmp_path.joinpath('src')), 'src')
+    with py7zr.SevenZipFile(target, 'r') as archive:
+        assert len(archive.header.main_streams.unpackinfo.folders) == 1
+        assert archive.test()
+        result = archive.read()
+    assert result['src/data.txt'].read() == data
+    assert result['src/small.txt'].read() == b'small'
+
+
 @pytest.mark.basic
 @pytest.mark.skipif(sys.version_info < (3, 6), reason="requires python3.6 or higher")
 def test_compress_single_encoded_header(capsys, tmp_path):
@@ -403,6 +440,65 @@ def test_compress_symlink(tmp_path):
     reader.close()
 
 
+@pytest.mark.files
+@pytest.mark.skipif(sys.version_info < (3, 6), reason="requires python3.6 or higher")
+@pytest.mark.skipif(sys.platform.startswith("win") and (ctypes.windll.shell32.IsUserAnAdmin() == 0),
+                    reason="Administrator rights is required to make symlink on windows")
+@pytest.mark.parametrize("encoded", [False, True])
+def test_compress_files_blocks(tmp_path, encoded):
+    tmp_path.joinpath('src').mkdir()
+    tmp_path.joinpath('tgt').mkdir()
+    py7zr.unpack_7zarchive(os.path.join(testdata_path, 'test_3.7z'), path=tmp_path.joinpath('src'))
+    target = tmp_path.joinpath('target.7z')
+    os.chdir(tmp_path.joinpath('src'))
+    archive = py7zr.SevenZipFile(target, 'w', blocks=3)
+    archive.set_encoded_header_mode(encoded)
+    archive.writeall('.')
+    archive._write_archive()
+    streams = archive.header.main_streams
+    assert streams.unpackinfo.numfolders == 3
+    assert streams.packinfo.numstreams == 3
+    substreams = streams.substreamsinfo
+    assert len(substreams.num_unpackstreams_folders) == 3
+    assert sum(substreams.num_unpackstreams_folders) == len(substreams.unpacksizes)
+    start = 0
+    for folder, num in zip(streams.unpackinfo.folders, substreams.num_unpackstreams_folders):
+        assert num > 0
+        assert folder.unpacksizes == [sum(substreams.unpacksizes[start:start + num])]
+        start += num
+    archive._fpclose()
+    with py7zr.SevenZipFile(target, 'r') as reader:
+        assert reader.test()
+        assert len(reader.header.main_streams.unpackinfo.folders) == 3
+        reader.extractall(path=tmp_path.joinpath('tgt'))
+    dc = filecmp.dircmp(tmp_path.joinpath('src'), tmp_path.joinpath('tgt'))
+    assert dc.diff_files == []
+
+
+@pytest.mark.files
+def test_compress_blocks_workers(tmp_path):
+    tmp_path.joinpath('src').mkdir()
+    py7zr.unpack_7zarchive(os.path.join(testdata_path, 'test_3.7z'), path=tmp_path.joinpath('src'))
+    os.chdir(tmp_path.joinpath('src'))
+    archive = py7zr.SevenZipFile(tmp_path.joinpath('target.7z'), 'w', blocks=2, block_size=65536)
+    archive.writeall('.')
+    folders = [archive.folder, archive._create_folder(archive.filters)]
+    archive.worker.archive(archive.fp, folders, max_workers=4)
+    # two folders and their block compressors do not run more than 4 compressing threads
+    assert [folder.compressor.max_workers for folder in folders] == [2, 2]
+    archive._fpclose()
+
+
+@pytest.mark.unit
+def test_split_streams():
+    split = py7zr.compression.Worker._split_streams
+    assert split([], [], 4) == [[]]
+    assert split([0, 1, 2], [10, 10, 10], 1) == [[0, 1, 2]]
+    assert split([0, 2, 3, 5], [100, 100, 100, 100], 2) == [[0, 2], [3, 5]]
+    assert split([0, 1, 2], [1000, 0, 0], 3) == [[0], [1, 2]]
+    assert split([0, 1], [0, 0], 4) == [[0], [1]]
+
+
 @pytest.mark.files
 @pytest.mark.skipif(sys.version_info < (3, 6), reason="requires python3.6 or higher")
 def test_compress_zerofile(tmp_path):
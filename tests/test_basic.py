@@ -12,7 +12,7 @@ import py7zr.cli
 import py7zr.compression
 import py7zr.properties
 
-from . import check_output, decode_all, ltime2
+from . import check_output, corrupt_copy_archive, decode_all, ltime2
 
 if sys.version_info < (3, 6):
     import pathlib2 as pathlib
@@ -235,6 +235,15 @@ Everything is Ok
     assert expected == out
 
 
+@pytest.mark.cli
+def test_cli_test_corrupt(tmp_path, capsys):
+    arcfile = corrupt_copy_archive(tmp_path)
+    cli = py7zr.cli.Cli()
+    assert cli.run(["t", str(arcfile)]) == 1
+    out, err = capsys.readouterr()
+    assert out.endswith('Bad 7zip file\n')
+
+
 @pytest.mark.cli
 def test_cli_info(capsys):
     if lzma.is_check_supported(lzma.CHECK_CRC64):
@@ -439,3 +448,24 @@ def test_context_manager_2(tmp_path):
     target = tmp_path.joinpath('target.7z')
     with py7zr.SevenZipFile(target, 'w') as z:
         z.writeall(os.path.join(testdata_path, "src"), "src")
+
+
+@pytest.mark.cli
+def test_cli_list_include(capsys):
+    arcfile = os.path.join(testdata_path, "test_1.7z")
+    cli = py7zr.cli.Cli()
+    cli.run(["l", "-i", "setup.*", "--include", "scripts", arcfile])
+    out, err = capsys.readouterr()
+    assert 'total 3 files and directories in solid archive' in out
+    assert ' setup.cfg\n' in out
+    assert ' scripts\n' in out
+    assert 'scripts/py7zr' not in out
+
+
+@pytest.mark.cli
+def test_cli_extract_include(tmp_path):
+    arcfile = os.path.join(testdata_path, "test_1.7z")
+    cli = py7zr.cli.Cli()
+    cli.run(["x", "-i", "*/py7zr", arcfile, str(tmp_path)])
+    assert [p.name for p in tmp_path.iterdir()] == ['scripts']
+    assert [p.name for p in tmp_path.joinpath('scripts').iterdir()] == ['py7zr']
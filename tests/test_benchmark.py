@@ -1,9 +1,17 @@
+import io
 import os
+import struct
 import tempfile
+import zlib
 
 import pytest
 
 import py7zr
+from py7zr.archiveinfo import Folder, Header, SignatureHeader, write_byte, write_uint64
+from py7zr.compression import SevenZipCompressor
+from py7zr.extra import CopyDecompressor, DeflateDecompressor
+from py7zr.helpers import calculate_crc32
+from py7zr.properties import DECOMPRESS_CHUNKSIZE, READ_BLOCKSIZE, Property
 
 testdata_path = os.path.join(os.path.dirname(__file__), 'data')
 
@@ -21,3 +29,142 @@ def test_extract_benchmark(tmp_path, benchmark, data, password):
         szf.close()
 
     benchmark(extractor, tmp_path, data, password)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("data, password", [('mblock_1.7z', None),
+                                            ('bzip2_2.7z', None),
+                                            ('deflate.7z', None),
+                                            ('copy.7z', None),
+                                            ('encrypted_1.7z', 'secret')])
+@pytest.mark.parametrize("chunk_size", [io.DEFAULT_BUFFER_SIZE, DECOMPRESS_CHUNKSIZE])
+def test_decompress_benchmark(benchmark, data, password, chunk_size):
+    """Throughput of decode loop which decompresses all the folders and bins off data."""
+    szf = py7zr.SevenZipFile(os.path.join(testdata_path, data), 'r', password=password)
+    szf.worker.chunk_size = chunk_size
+    size = sum([f.uncompressed[-1] for f in szf.files if not f.emptystream])
+
+    def decompressor():
+        for f in szf.files:
+            szf.worker.register_filelike(f.id, None)
+        szf.worker.extract(szf.fp, parallel=False)
+
+    benchmark(decompressor)
+    szf.close()
+    if benchmark.stats is not None:
+        benchmark.extra_info['MB/s'] = size / benchmark.stats.stats.mean / 1000000
+
+
+def _feed(decompressor, data, max_length):
+    size = 0
+    for i in range(0, len(data), READ_BLOCKSIZE):
+        size += len(decompressor.decompress(data[i:i + READ_BLOCKSIZE], max_length))
+        while not decompressor.needs_input:
+            size += len(decompressor.decompress(b'', max_length))
+    return size
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("max_length", [io.DEFAULT_BUFFER_SIZE, DECOMPRESS_CHUNKSIZE])
+def test_deflate_decompressor_benchmark(benchmark, max_length):
+    plain = b''.join([b'%d,%x\n' % (i, i * i) for i in range(200000)])
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    data = compressor.compress(plain) + compressor.flush()
+    size = benchmark(lambda: _feed(DeflateDecompressor(), data, max_length))
+    assert size == len(plain)
+    if benchmark.stats is not None:
+        benchmark.extra_info['MB/s'] = len(plain) / benchmark.stats.stats.mean / 1000000
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("max_length", [io.DEFAULT_BUFFER_SIZE, DECOMPRESS_CHUNKSIZE])
+def test_copy_decompressor_benchmark(benchmark, max_length):
+    data = bytes(range(256)) * 16384
+    size = benchmark(lambda: _feed(CopyDecompressor(), data, max_length))
+    assert size == len(data)
+    if benchmark.stats is not None:
+        benchmark.extra_info['MB/s'] = len(data) / benchmark.stats.stats.mean / 1000000
+
+
+def _write_many_files_archive(path, count):
+    """Write an archive of `count' one byte files in 100 directories.
+    Files info is built in bulk, because writing it with SevenZipFile takes too long."""
+    compressor = SevenZipCompressor()
+    packed = compressor.compress(b'x' * count) + compressor.flush()
+    folder = Folder()
+    folder.coders = compressor.coders
+    folder.bindpairs = []
+    folder.totalin = 1
+    folder.totalout = 1
+    folder.digestdefined = False
+    folder.unpacksizes = [count]
+    header = Header.build_header([folder])
+    streams = header.main_streams
+    streams.packinfo.numstreams = 1
+    streams.packinfo.packsizes = [len(packed)]
+    streams.substreamsinfo.num_unpackstreams_folders = [count]
+    streams.substreamsinfo.unpacksizes = [1] * count
+    streams.substreamsinfo.digests = [calculate_crc32(b'x')] * count
+    streams.substreamsinfo.digestsdefined = [True] * count
+    buf = io.BytesIO()
+    write_byte(buf, Property.HEADER)
+    streams.write(buf)
+    write_byte(buf, Property.FILES_INFO)
+    write_uint64(buf, count)
+    names = ''.join(['dir%d/file_%d.txt\0' % (i % 100, i) for i in range(count)]).encode('utf-16-le')
+    for prop, data in [(Property.NAME, b'\x00' + names),
+                       (Property.LAST_WRITE_TIME, b'\x01\x00' + struct.pack('<Q', 132223104000000000) * count),
+                       (Property.ATTRIBUTES, b'\x01\x00' + struct.pack('<L', 0x20) * count)]:
+        write_byte(buf, prop)
+        write_uint64(buf, len(data))
+        buf.write(data)
+    write_byte(buf, Property.END)
+    write_byte(buf, Property.END)
+    raw_header = buf.getvalue()
+    sig_header = SignatureHeader()
+    with open(path, 'wb') as fp:
+        sig_header._write_skelton(fp)
+        fp.write(packed)
+        fp.write(raw_header)
+        sig_header.nextheaderofs = len(packed)
+        sig_header.calccrc(len(raw_header), calculate_crc32(raw_header))
+        sig_header.write(fp)
+
+
+@pytest.fixture(scope='module')
+def many_files_archive(request, tmp_path_factory):
+    """Archive of files as many as --many-files option, which takes tens of seconds for a million."""
+    count = request.config.getoption('--many-files')
+    if count <= 0:
+        pytest.skip('needs --many-files option')
+    path = str(tmp_path_factory.mktemp('many') / 'many.7z')
+    _write_many_files_archive(path, count)
+    return path, count
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("lazy", [False, True])
+def test_open_getnames_benchmark(benchmark, many_files_archive, lazy):
+    """Time to open an archive of many files and get their names."""
+    path, count = many_files_archive
+
+    def opener():
+        with py7zr.SevenZipFile(path, 'r', lazy=lazy) as szf:
+            return szf.getnames()
+
+    names = benchmark.pedantic(opener, rounds=3, iterations=1)
+    assert len(names) == count
+    assert names[-1] == 'dir%d/file_%d.txt' % ((count - 1) % 100, count - 1)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("lazy", [False, True])
+def test_open_benchmark(benchmark, many_files_archive, lazy):
+    """Time to open an archive of many files, without access to its members."""
+    path, count = many_files_archive
+
+    def opener():
+        with py7zr.SevenZipFile(path, 'r', lazy=lazy):
+            pass
+
+    benchmark.pedantic(opener, rounds=3, iterations=1)
@@ -2,6 +2,7 @@ import asyncio
 import binascii
 import ctypes
 import hashlib
+import io
 import os
 import pathlib
 import shutil
@@ -11,11 +12,12 @@ from datetime import datetime
 import pytest
 
 import py7zr
+import py7zr.compression
 from py7zr import unpack_7zarchive
 from py7zr.exceptions import UnsupportedCompressionMethodError
 from py7zr.helpers import UTC
 
-from . import aio7zr, decode_all
+from . import aio7zr, corrupt_copy_archive, decode_all
 
 testdata_path = os.path.join(os.path.dirname(__file__), 'data')
 os.umask(0o022)
@@ -207,6 +209,115 @@ def test_multiblock(tmp_path):
     assert m.digest() == binascii.unhexlify('e14d8201c5c0d1049e717a63898a3b1c7ce4054a24871daebaa717da64dcaff5')
 
 
+@pytest.mark.files
+def test_multiblock_mp(tmp_path):
+    archive = py7zr.SevenZipFile(os.path.join(testdata_path, 'mblock_1.7z'), 'r', mp=True)
+    archive.extractall(path=tmp_path)
+    archive.close()
+    assert archive.worker.crc_errors == []
+    m = hashlib.sha256()
+    m.update(tmp_path.joinpath('bin/7zdec.exe').open('rb').read())
+    assert m.digest() == binascii.unhexlify('e14d8201c5c0d1049e717a63898a3b1c7ce4054a24871daebaa717da64dcaff5')
+
+
+@pytest.mark.files
+def test_multiblock_bytesio(tmp_path):
+    with open(os.path.join(testdata_path, 'mblock_1.7z'), 'rb') as f:
+        data = io.BytesIO(f.read())
+    archive = py7zr.SevenZipFile(data, 'r')
+    archive.extractall(path=tmp_path)
+    archive.close()
+    assert archive.worker.crc_errors == []
+    m = hashlib.sha256()
+    m.update(tmp_path.joinpath('bin/7zdec.exe').open('rb').read())
+    assert m.digest() == binascii.unhexlify('e14d8201c5c0d1049e717a63898a3b1c7ce4054a24871daebaa717da64dcaff5')
+
+
+@pytest.mark.files
+def test_multiblock_max_workers(tmp_path):
+    archive = py7zr.SevenZipFile(os.path.join(testdata_path, 'mblock_2.7z'), 'r')
+    archive.extractall(path=tmp_path, max_workers=1)
+    archive.close()
+    assert archive.worker.crc_errors == []
+
+
+@pytest.fixture
+def created(monkeypatch):
+    """List of readers returned by SegmentReader.create(), None when a folder is decoded sequentially."""
+    readers = []
+    create = py7zr.compression.SegmentReader.create
+
+    def spy(*args):
+        reader = create(*args)
+        readers.append(reader)
+        return reader
+
+    monkeypatch.setattr(py7zr.compression.SegmentReader, 'create', spy)
+    return readers
+
+
+@pytest.mark.files
+def test_extract_lzma2_segments(tmp_path, monkeypatch, created):
+    data = [b''.join(b'%d: line %d of data\n' % (n, i) for i in range(30000)) for n in range(3)]
+    tmp_path.joinpath('src').mkdir()
+    for n in range(3):
+        tmp_path.joinpath('src', 'data%d.txt' % n).write_bytes(data[n])
+    target = tmp_path.joinpath('target.7z')
+    with py7zr.SevenZipFile(target, 'w', block_size=200000) as archive:
+        archive.writeall(str(tmp_path.joinpath('src')), 'src')
+    monkeypatch.setattr(py7zr.compression, 'LZMA2_SEGMENT_SIZE', 300000)
+    with py7zr.SevenZipFile(target, 'r') as archive:
+        archive.extractall(path=tmp_path.joinpath('tgt'), max_workers=3)
+        assert archive.worker.crc_errors == []
+    assert len(created) == 1 and created[0] is not None
+    for n in range(3):
+        assert tmp_path.joinpath('tgt', 'src', 'data%d.txt' % n).read_bytes() == data[n]
+    # a stream without dictionary resets is decoded sequentially
+    created.clear()
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'test_1.7z'), 'r') as archive:
+        archive.extractall(path=tmp_path.joinpath('tgt2'), max_workers=3)
+    assert created == [None]
+
+
+@pytest.mark.files
+def test_extract_lzma2_segments_incompressible(tmp_path, monkeypatch, created):
+    # random leading bytes are stored in uncompressed chunks, which reset dictionary of blocks
+    data = os.urandom(500000) + b''.join(b'line %d of data\n' % i for i in range(60000))
+    tmp_path.joinpath('src').mkdir()
+    tmp_path.joinpath('src', 'data.bin').write_bytes(data)
+    target = tmp_path.joinpath('target.7z')
+    with py7zr.SevenZipFile(target, 'w', block_size=200000) as archive:
+        archive.writeall(str(tmp_path.joinpath('src')), 'src')
+    monkeypatch.setattr(py7zr.compression, 'LZMA2_SEGMENT_SIZE', 300000)
+    with py7zr.SevenZipFile(target, 'r') as archive:
+        archive.extractall(path=tmp_path.joinpath('tgt'), max_workers=3)
+        assert archive.worker.crc_errors == []
+    assert len(created) == 1 and created[0] is not None
+    assert tmp_path.joinpath('tgt', 'src', 'data.bin').read_bytes() == data
+
+
+@pytest.mark.files
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_extract_lzma2_segments_crc(tmp_path, monkeypatch, max_workers):
+    data = os.urandom(300000)
+    tmp_path.joinpath('src').mkdir()
+    tmp_path.joinpath('src', 'data.bin').write_bytes(data)
+    tmp_path.joinpath('src', 'text.txt').write_bytes(b''.join(b'line %d of data\n' % i for i in range(30000)))
+    target = tmp_path.joinpath('target.7z')
+    with py7zr.SevenZipFile(target, 'w', block_size=100000) as archive:
+        archive.writeall(str(tmp_path.joinpath('src')), 'src')
+    # flip a byte of the member which is stored in an uncompressed chunk
+    stream = bytearray(target.read_bytes())
+    pos = stream.index(data[1000:1100])
+    stream[pos] ^= 0xff
+    target.write_bytes(bytes(stream))
+    monkeypatch.setattr(py7zr.compression, 'LZMA2_SEGMENT_SIZE', 100000)
+    with py7zr.SevenZipFile(target, 'r') as archive:
+        with pytest.raises(py7zr.CrcError):
+            archive.extractall(path=tmp_path.joinpath('tgt'), max_workers=max_workers)
+        assert len(archive.worker.crc_errors) == 1
+
+
 @pytest.mark.files
 @pytest.mark.skipif(sys.platform.startswith('win'), reason="Cannot unlink opened file on Windows")
 def test_multiblock_unlink(tmp_path):
@@ -289,6 +400,99 @@ def test_extract_encrypted_2(tmp_path):
     archive.close()
 
 
+@pytest.mark.files
+@pytest.mark.timeout(30)
+@pytest.mark.skipif(sys.platform.startswith("win") and (ctypes.windll.shell32.IsUserAnAdmin() == 0),
+                    reason="Administrator rights is required to make symlink on windows")
+def test_extract_encrypted_passwords_per_archive(tmp_path):
+    archive = py7zr.SevenZipFile(os.path.join(testdata_path, 'encrypted_2.7z'), 'r', password='secret')
+    # other archive object without password should not affect the first one.
+    other = py7zr.SevenZipFile(os.path.join(testdata_path, 'encrypted_1.7z'), 'r')
+    assert [f.password for f in archive.header.main_streams.unpackinfo.folders] == ['secret', 'secret']
+    assert other.header.main_streams.unpackinfo.folders[0].password is None
+    archive.extractall(path=tmp_path)
+    archive.close()
+    other.close()
+    assert archive.worker.crc_errors == []
+
+
+@pytest.mark.files
+@pytest.mark.timeout(60)
+@pytest.mark.skipif(sys.platform.startswith("win") and (ctypes.windll.shell32.IsUserAnAdmin() == 0),
+                    reason="Administrator rights is required to make symlink on windows")
+def test_extract_encrypted_mp(tmp_path):
+    archive = py7zr.SevenZipFile(os.path.join(testdata_path, 'encrypted_2.7z'), 'r', password='secret', mp=True)
+    archive.extractall(path=tmp_path)
+    archive.close()
+    assert archive.worker.crc_errors == []
+
+
+@pytest.mark.files
+@pytest.mark.parametrize("data", ['encrypted_1.7z', 'encrypted_2.7z'])
+def test_extract_encrypted_wrong_password(tmp_path, data):
+    # opening an archive does not decode data, the password is checked before it is extracted
+    with py7zr.SevenZipFile(os.path.join(testdata_path, data), 'r', password='wrong', lazy=True) as archive:
+        assert len(archive.getnames()) > 0
+        with pytest.raises(py7zr.WrongPasswordError):
+            archive.extractall(path=tmp_path)
+        with pytest.raises(py7zr.WrongPasswordError):
+            archive.read()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.files
+def test_extract_encrypted_check_password():
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'encrypted_1.7z'), 'r', password='secret') as archive:
+        assert archive.check_password()
+        archive.password = 'wrong'
+        for folder in archive.header.main_streams.unpackinfo.folders:
+            folder.password = 'wrong'
+        with pytest.raises(py7zr.WrongPasswordError):
+            archive.check_password()
+
+
+@pytest.mark.files
+def test_extract_encrypted_check_password_undetermined(monkeypatch):
+    # the first file does not end in the limit, so the password is neither verified nor rejected
+    monkeypatch.setattr(py7zr.compression, 'PASSWORD_CHECK_SIZE', 16)
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'encrypted_1.7z'), 'r', password='secret') as archive:
+        assert archive.check_password() is None
+
+
+@pytest.mark.files
+@pytest.mark.parametrize("first_size", [0, 1])
+def test_extract_encrypted_check_password_tiny_first(tmp_path, first_size):
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'encrypted_1.7z'), 'r', password='secret') as archive:
+        archive.extractall(path=tmp_path)
+    data = tmp_path.joinpath('test1.txt').read_bytes() + tmp_path.joinpath('test', 'test2.txt').read_bytes()
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'encrypted_1.7z'), 'r', password='secret') as archive:
+        # pretend a tiny first file without CRC, so the check should go on to the next file.
+        first, second = archive.header.main_streams.unpackinfo.folders[0].files
+        first._file_info['uncompressed'] = [first_size]
+        first._file_info['digest'] = None
+        second._file_info['uncompressed'] = [len(data) - first_size]
+        second._file_info['digest'] = py7zr.helpers.calculate_crc32(data[first_size:])
+        assert archive.check_password()
+        for folder in archive.header.main_streams.unpackinfo.folders:
+            folder.password = 'wrong'
+        with pytest.raises(py7zr.WrongPasswordError):
+            archive.check_password()
+
+
+@pytest.mark.files
+def test_extract_corrupt_crc(tmp_path, capsys):
+    target = corrupt_copy_archive(tmp_path)
+    with py7zr.SevenZipFile(target, 'r') as archive:
+        assert not archive.test()
+        with pytest.raises(py7zr.CrcError):
+            archive.read(['test1.txt'])
+        # an error of the previous call does not remain in the reused worker
+        assert archive.read(['test/test2.txt'])['test/test2.txt'].read().startswith(b'This file')
+        with pytest.raises(py7zr.CrcError):
+            archive.extractall(path=tmp_path.joinpath('out'))
+    assert 'CRC error' not in capsys.readouterr().out
+
+
 @pytest.mark.files
 def test_extract_bzip2(tmp_path):
     archive = py7zr.SevenZipFile(open(os.path.join(testdata_path, 'bzip2.7z'), 'rb'))
@@ -303,6 +507,19 @@ def test_extract_bzip2_2(tmp_path):
     archive.close()
 
 
+@pytest.mark.files
+def test_extract_bzip2_parallel(tmp_path, created):
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'bzip2_2.7z'), 'r') as archive:
+        expected = {name: data.read() for name, data in archive.read().items()}
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'bzip2_2.7z'), 'r') as archive:
+        actual = {name: data.read() for name, data in archive.read(max_workers=2).items()}
+        assert archive.worker.crc_errors == []
+    assert len(created) == 1 and created[0] is not None
+    # blocks are counted by the block size of the stream for the limit of data decoded ahead
+    assert created[0].sizeof((0, 0)) in range(100000, 1000000, 100000)
+    assert actual == expected
+
+
 @pytest.mark.files
 def test_extract_ppmd(tmp_path):
     with pytest.raises(UnsupportedCompressionMethodError):
@@ -336,3 +553,252 @@ def test_extract_emptystream_mix(tmp_path):
     archive = py7zr.SevenZipFile(os.path.join(testdata_path, 'test_6.7z'), 'r')
     archive.extractall(path=tmp_path)
     archive.close()
+
+
+@pytest.mark.files
+def test_open_members_in_solid_folders(tmp_path):
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'mblock_1.7z'), 'r') as archive:
+        archive.extractall(path=tmp_path)
+        for name in ['C/7z.h', 'DOC/lzma.txt', 'bin/7zS2.sfx', 'bin/x64/7zr.exe']:
+            with archive.open(name) as member:
+                assert member.readable()
+                assert member.read() == tmp_path.joinpath(name).open('rb').read()
+
+
+@pytest.mark.files
+def test_open_readinto():
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'test_1.7z'), 'r') as archive:
+        member = archive.open('scripts/py7zr')
+        buf = bytearray(10)
+        assert member.readinto(buf) == 10
+        assert bytes(buf) == b'#!/usr/bin'
+        assert member.read(4) == b'/env'
+        rest = member.read()
+        assert member.size == 14 + len(rest)
+        assert member.read() == b''
+        member.close()
+        assert member.closed
+
+
+@pytest.mark.files
+def test_open_encrypted_and_empty():
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'encrypted_1.7z'), 'r', password='secret') as archive:
+        with archive.open('test1.txt') as member:
+            assert member.read() == b'This file is located in the root.'
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'test_1.7z'), 'r') as archive:
+        with archive.open('scripts') as member:
+            assert member.read() == b''
+        with pytest.raises(KeyError):
+            archive.open('not_found')
+
+
+@pytest.mark.files
+def test_open_crc_error():
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'solid.7z'), 'r') as archive:
+        archive.header.files_info.files[2]['digest'] = 0
+        with archive.open('test1.txt') as member:
+            with pytest.raises(py7zr.CrcError):
+                member.read()
+
+
+@pytest.mark.files
+def test_read_all(tmp_path):
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'mblock_1.7z'), 'r') as archive:
+        contents = archive.read()
+        archive.extractall(path=tmp_path)
+    assert 'C' not in contents
+    assert len(contents) == 122
+    for name in ['C/7z.h', 'bin/7zS2.sfx', 'bin/x64/7zr.exe']:
+        assert contents[name].read() == tmp_path.joinpath(name).open('rb').read()
+
+
+@pytest.mark.files
+def test_read_targets():
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'test_1.7z'), 'r', mp=True) as archive:
+        contents = archive.read(['setup.cfg', 'scripts/py7zr'])
+    assert sorted(contents.keys()) == ['scripts/py7zr', 'setup.cfg']
+    assert contents['scripts/py7zr'].read(21) == b'#!/usr/bin/env python'
+
+
+@pytest.mark.files
+def test_iter_content():
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'mblock_1.7z'), 'r') as archive:
+        expected = archive.read()
+        names = archive.getnames()
+        contents = {}
+        ended = []
+        for member, chunk in archive.iter_content(chunk_size=1000):
+            if isinstance(chunk, py7zr.EndOfMember):
+                assert chunk.crc_ok
+                assert chunk.size == len(contents.get(member.filename, b''))
+                ended.append(member.filename)
+            else:
+                assert isinstance(chunk, memoryview)
+                assert 0 < len(chunk) <= 1000
+                contents[member.filename] = contents.get(member.filename, b'') + chunk.tobytes()
+    assert ended == names
+    for name, data in expected.items():
+        assert contents.get(name, b'') == data.getvalue()
+
+
+@pytest.mark.files
+def test_iter_content_crc_error():
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'solid.7z'), 'r') as archive:
+        archive.header.files_info.files[2]['digest'] = 0
+        results = {member.filename: chunk.crc_ok for member, chunk in archive.iter_content()
+                   if isinstance(chunk, py7zr.EndOfMember)}
+    assert results == {'test': True, 'test/test2.txt': True, 'test1.txt': False}
+
+
+@pytest.mark.files
+def test_extract_targets_plan(tmp_path):
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'mblock_1.7z'), 'r') as archive:
+        plan = archive.extract(path=tmp_path, targets=['C', 'C/7z.h'], dry_run=True)
+        assert list(tmp_path.iterdir()) == []
+        assert [p.index for p in plan.folders] == [0]
+        assert plan.skipped_folders == [1, 2]
+        assert len(plan.folders[0].files) == 1
+        assert plan.decode_size == 5263
+        assert plan.unpack_size > plan.decode_size
+        assert 'decode 5263 of' in str(plan)
+        full = archive.extract(path=tmp_path, dry_run=True)
+        assert full.decode_size == full.unpack_size
+        archive.extract(path=tmp_path, targets=['C', 'C/7z.h', 'DOC', 'DOC/lzma.txt'])
+    assert sorted([p.name for p in tmp_path.iterdir()]) == ['C', 'DOC']
+    assert [p.name for p in tmp_path.joinpath('C').iterdir()] == ['7z.h']
+    assert tmp_path.joinpath('DOC/lzma.txt').stat().st_size == 10355
+
+
+@pytest.mark.files
+def test_folder_files_id_with_emptystream():
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'test_6.7z'), 'r') as archive:
+        names = archive.getnames()
+        for cf in archive.header.main_streams.unpackinfo.folders[0].files:
+            assert names[cf.id] == cf.filename
+        with archive.open('5.9.7/gcc_64/lib/libQt5X11Extras.so') as member:
+            assert member.read() == b'libQt5X11Extras.so.5.9.7'
+
+
+@pytest.mark.files
+def test_getinfo_listdir_select():
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'test_3.7z'), 'r') as archive:
+        info = archive.getinfo('5.9.7/gcc_64/lib/libQt5X11Extras.so.5.9.7')
+        assert info.filename == '5.9.7/gcc_64/lib/libQt5X11Extras.so.5.9.7'
+        assert info.uncompressed[-1] == 14568
+        assert archive.getinfo('5.9.7/gcc_64').is_directory
+        with pytest.raises(KeyError):
+            archive.getinfo('5.9.7/gcc_64/lib/not_found')
+        assert archive.listdir() == ['5.9.7']
+        assert archive.listdir('5.9.7/gcc_64/') == ['include', 'lib', 'mkspecs']
+        assert archive.listdir('5.9.7/gcc_64/lib/pkgconfig') == ['Qt5X11Extras.pc']
+        with pytest.raises(KeyError):
+            archive.listdir('5.9.7/gcc_64/lib/not_found')
+        assert archive.select(['*.pri', '*.pc']) == ['5.9.7/gcc_64/lib/pkgconfig/Qt5X11Extras.pc',
+                                                     '5.9.7/gcc_64/mkspecs/modules/qt_lib_x11extras.pri',
+                                                     '5.9.7/gcc_64/mkspecs/modules/qt_lib_x11extras_private.pri']
+        assert archive.select(r'.*\.so\.5$', regex=True) == ['5.9.7/gcc_64/lib/libQt5X11Extras.so.5']
+
+
+@pytest.mark.files
+def test_extract_selected_without_parents(tmp_path):
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'test_3.7z'), 'r') as archive:
+        archive.extract(path=tmp_path, targets=archive.select('*/pkgconfig/*'))
+    assert tmp_path.joinpath('5.9.7/gcc_64/lib/pkgconfig/Qt5X11Extras.pc').exists()
+    assert [p.name for p in tmp_path.joinpath('5.9.7/gcc_64/lib').iterdir()] == ['pkgconfig']
+
+
+@pytest.mark.files
+def test_extract_duplicated_names(tmp_path):
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'test_1.7z'), 'r') as archive:
+        archive.header.files_info.files[2]['filename'] = 'setup.py'
+        archive.header.files_info.files[0]['filename'] = 'setup.py_0'
+        assert archive.getinfo('setup.py').id == 3
+        archive.extract(path=tmp_path, targets=['setup.py', 'setup.py_0'])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['setup.py', 'setup.py_0', 'setup.py_1']
+    assert tmp_path.joinpath('setup.py').stat().st_size == 58
+    assert tmp_path.joinpath('setup.py_1').stat().st_size == 559
+
+
+@pytest.mark.files
+@pytest.mark.parametrize('data', ['test_1.7z', 'test_3.7z', 'test_6.7z', 'mblock_1.7z', 'empty.7z'])
+def test_extract_lazy(tmp_path, data):
+    with py7zr.SevenZipFile(os.path.join(testdata_path, data), 'r') as archive:
+        expected = archive.list()
+        names = archive.getnames()
+        archive.extractall(path=tmp_path.joinpath('eager'))
+    with py7zr.SevenZipFile(os.path.join(testdata_path, data), 'r', lazy=True) as archive:
+        assert archive.getnames() == names
+        assert [vars(f) for f in archive.list()] == [vars(f) for f in expected]
+        archive.extractall(path=tmp_path.joinpath('lazy'))
+    for name in names:
+        eager = tmp_path.joinpath('eager', name)
+        lazy = tmp_path.joinpath('lazy', name)
+        assert eager.is_dir() == lazy.is_dir()
+        if eager.is_file():
+            assert eager.read_bytes() == lazy.read_bytes()
+
+
+@pytest.mark.files
+def test_read_lazy():
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'test_1.7z'), 'r', lazy=True) as archive:
+        assert archive.getnames() == ['scripts', 'scripts/py7zr', 'setup.cfg', 'setup.py']
+        assert archive.header.files_info.files.loaders
+        assert archive.getinfo('setup.py').uncompressed[-1] == 559
+        with archive.open('setup.cfg') as member:
+            assert len(member.read()) == 58
+        contents = archive.read()
+    assert len(contents['scripts/py7zr'].read()) == 111
+
+
+@pytest.mark.files
+def test_extract_index_cache(tmp_path, monkeypatch):
+    cache_path = tmp_path.joinpath('cache')
+    shutil.copyfile(os.path.join(testdata_path, 'test_3.7z'), str(tmp_path.joinpath('test_3.7z')))
+    archive_path = str(tmp_path.joinpath('test_3.7z'))
+    with py7zr.SevenZipFile(archive_path, 'r') as archive:
+        names = archive.getnames()
+    with py7zr.SevenZipFile(archive_path, 'r', index_cache=cache_path) as archive:
+        assert archive.getnames() == names
+    assert len(os.listdir(str(cache_path))) == 1
+    with monkeypatch.context() as m:
+        # header is not read from the archive
+        m.setattr(py7zr.SevenZipFile, '_read_header_data', None)
+        archive = py7zr.SevenZipFile(archive_path, 'r', index_cache=str(cache_path))
+    with archive:
+        assert archive.getnames() == names
+        assert archive.getinfo('5.9.7/gcc_64/lib/libQt5X11Extras.so.5.9.7').uncompressed[-1] == 14568
+        archive.extractall(path=tmp_path.joinpath('out'))
+    assert tmp_path.joinpath('out', '5.9.7/gcc_64/lib/libQt5X11Extras.so.5.9.7').stat().st_size == 14568
+    # a modified archive is parsed again
+    os.utime(archive_path, (0, 0))
+    with py7zr.SevenZipFile(archive_path, 'r', index_cache=cache_path) as archive:
+        assert archive.getnames() == names
+    assert len(os.listdir(str(cache_path))) == 2
+
+
+@pytest.mark.files
+def test_extract_index_cache_fd(tmp_path):
+    cache_path = tmp_path.joinpath('cache')
+    fd = os.open(os.path.join(testdata_path, 'test_3.7z'), os.O_RDONLY)
+    with open(fd, 'rb') as f, py7zr.SevenZipFile(f, 'r', index_cache=cache_path) as archive:
+        assert len(archive.getnames()) > 0
+    # an archive named by a file descriptor is not cached
+    assert not cache_path.exists() or len(os.listdir(str(cache_path))) == 0
+
+
+@pytest.mark.files
+def test_extract_encrypted_index_cache(tmp_path):
+    cache = py7zr.helpers.HeaderCache(tmp_path.joinpath('cache'))
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'encrypted_1.7z'), 'r', password='secret',
+                            index_cache=cache) as archive:
+        archive.extractall(path=tmp_path.joinpath('out1'))
+    entry = tmp_path.joinpath('cache', os.listdir(str(tmp_path.joinpath('cache')))[0]).read_bytes()
+    assert b'secret' not in entry
+    assert 'secret'.encode('utf-16LE') not in entry
+    with py7zr.SevenZipFile(os.path.join(testdata_path, 'encrypted_1.7z'), 'r', password='secret',
+                            index_cache=cache) as archive:
+        archive.extractall(path=tmp_path.joinpath('out2'))
+    for name in os.listdir(str(tmp_path.joinpath('out1'))):
+        path = tmp_path.joinpath('out1', name)
+        if path.is_file():
+            assert path.read_bytes() == tmp_path.joinpath('out2', name).read_bytes()
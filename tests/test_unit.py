@@ -1,17 +1,22 @@
 import binascii
+import bz2
 import datetime
 import io
 import lzma
 import os
+import pickle
 import platform
+import random
 import stat
 import struct
 import sys
+import zlib
 
 import pytest
 
 import py7zr.archiveinfo
 import py7zr.compression
+import py7zr.extra
 import py7zr.helpers
 import py7zr.properties
 from Crypto.Cipher import AES
@@ -264,6 +269,21 @@ def test_read_booleans(abytes, count, checkall, expected):
     assert actual == expected
 
 
+@pytest.mark.unit
+def test_unpack_booleans_fallback(monkeypatch):
+    monkeypatch.setattr(py7zr.archiveinfo, "numpy", None)
+    assert py7zr.archiveinfo.unpack_booleans(b'\xb4\x80\xff', 9) == [True, False, True, True, False, True, False, False,
+                                                                     True]
+    assert py7zr.archiveinfo.unpack_booleans(memoryview(b'\x01'), 8) == [False] * 7 + [True]
+
+
+@pytest.mark.unit
+def test_unpack_defined():
+    data = memoryview(b'\x01\x00\xa0\x55')
+    assert py7zr.archiveinfo.unpack_defined(data, 0, 3) == ([True, True, True], 1)
+    assert py7zr.archiveinfo.unpack_defined(data, 1, 3) == ([True, False, True], 3)
+
+
 @pytest.mark.unit
 @pytest.mark.parametrize("booleans, all_defined, expected",
                          [([True, False, True, True, False, True, False, False, True], False, b'\xb4\x80'),
@@ -286,6 +306,9 @@ def test_write_booleans(booleans, all_defined, expected):
                           (0xffffffff, b'\xf0\xff\xff\xff\xff'),
                           (0x7f1234567f, b'\xf8\x7f\x56\x34\x12\x7f'),
                           (0x1234567890abcd, b'\xfe\xcd\xab\x90\x78\x56\x34\x12'),
+                          (0xffffffffffffff, b'\xfe\xff\xff\xff\xff\xff\xff\xff'),
+                          (0x100000000000000, b'\xff\x00\x00\x00\x00\x00\x00\x00\x01'),
+                          (0x1ffffffffffffff, b'\xff\xff\xff\xff\xff\xff\xff\xff\x01'),
                           (0xcf1234567890abcd, b'\xff\xcd\xab\x90\x78\x56\x34\x12\xcf')])
 def test_write_uint64(testinput, expected):
     buf = io.BytesIO()
@@ -294,6 +317,22 @@ def test_write_uint64(testinput, expected):
     assert actual == expected
 
 
+@pytest.mark.unit
+def test_pack_vectors():
+    values = [0, 127, 128, 441, 0xffffffff, 1 << 56, 0xcf1234567890abcd]
+    buf = io.BytesIO(py7zr.archiveinfo.pack_uint64s(values))
+    assert [py7zr.archiveinfo.read_uint64(buf) for _ in values] == values
+    assert buf.read() == b''
+    assert py7zr.archiveinfo.pack_uint64s([1, 2, 127]) == b'\x01\x02\x7f'
+    assert py7zr.archiveinfo.pack_uint64s([]) == b''
+    booleans = [i % 3 == 0 for i in range(21)]
+    assert py7zr.archiveinfo.unpack_booleans(py7zr.archiveinfo.pack_booleans(booleans), 21) == booleans
+    names = ['test', 'test/テスト.txt', '']
+    data = py7zr.archiveinfo.pack_utf16s(names)
+    assert data == b''.join(n.encode('utf-16LE') + b'\x00\x00' for n in names)
+    assert py7zr.archiveinfo.unpack_utf16s(data, 3) == names
+
+
 @pytest.mark.unit
 @pytest.mark.parametrize("testinput, expected",
                          [(b'\x01', 1), (b'\x7f', 127), (b'\x80\x80', 128), (b'\x81\xb9', 441),
@@ -317,6 +356,30 @@ def test_read_utf16(testinput, expected):
     assert actual == expected
 
 
+@pytest.mark.unit
+def test_unpack_utf16s():
+    data = 'test\x00\U0001f600.txt\x00\x00dir/a\x00'.encode('utf-16LE')
+    assert py7zr.archiveinfo.unpack_utf16s(memoryview(data), 4) == ['test', '\U0001f600.txt', '', 'dir/a']
+    with pytest.raises(py7zr.exceptions.Bad7zFile):
+        py7zr.archiveinfo.unpack_utf16s(data, 5)
+
+
+@pytest.mark.unit
+def test_filesinfo_read_vectors():
+    filesinfo = py7zr.archiveinfo.FilesInfo()
+    filesinfo.files = [{'emptystream': i == 1, 'filename': 'file%d' % i, 'attributes': 0x20 if i != 2 else None,
+                        'creationtime': 1577836800.0, 'lastaccesstime': 1577836800.0,
+                        'lastwritetime': 1577836800.0 + i} for i in range(10)]
+    buf = io.BytesIO()
+    filesinfo.write(buf)
+    buf.seek(1)
+    actual = py7zr.archiveinfo.FilesInfo.retrieve(buf)
+    assert [f['filename'] for f in actual.files] == ['file%d' % i for i in range(10)]
+    assert [f['emptystream'] for f in actual.files] == [i == 1 for i in range(10)]
+    assert [f['attributes'] for f in actual.files] == [0x20, 0x20, None] + [0x20] * 7
+    assert actual.files[9]['lastwritetime'].totimestamp() == 1577836809.0
+
+
 @pytest.mark.unit
 @pytest.mark.parametrize("testinput, expected",
                          [('test', b't\x00e\x00s\x00t\x00\x00\x00')])
@@ -356,6 +419,25 @@ def test_write_packinfo():
     assert actual == b'\x06\x00\x01\t0\n\xf0\x11\xcd\x82\xed\x00'
 
 
+@pytest.mark.unit
+def test_streamsinfo_folder_positions():
+    # first folder is BCJ2 alike and has four packed streams, second has one.
+    packinfo = py7zr.archiveinfo.PackInfo()
+    packinfo.numstreams = 5
+    packinfo.packsizes = [100, 10, 20, 30, 40]
+    packinfo.packpositions = [sum(packinfo.packsizes[:i]) for i in range(packinfo.numstreams + 1)]
+    bcj2 = py7zr.archiveinfo.Folder()
+    bcj2.totalin = 7
+    bcj2.bindpairs = [(1, 0), (2, 1), (3, 2)]
+    lzma = py7zr.archiveinfo.Folder()
+    lzma.totalin = 1
+    streams = py7zr.archiveinfo.StreamsInfo()
+    streams.packinfo = packinfo
+    streams.unpackinfo = py7zr.archiveinfo.UnpackInfo()
+    streams.unpackinfo.folders = [bcj2, lzma]
+    assert streams.folder_positions() == [(0, 160), (160, 200)]
+
+
 @pytest.mark.unit
 def test_utc():
     dt = datetime.datetime(2019, 6, 1, 12, 13, 14, 0, tzinfo=py7zr.helpers.UTC())
@@ -392,6 +474,111 @@ def test_file_list_length():
     assert len(file_list) == 1
 
 
+@pytest.mark.unit
+def test_file_table():
+    table = py7zr.archiveinfo.FileTable(3)
+    table.set_names(['a/b/c.txt', 'a/b/d.txt', 'e'])
+    table.set_column('attributes', [0x20, None, 0x10])
+    assert table.dirnames == ['', 'a/b/']
+    assert table.names() == ['a/b/c.txt', 'a/b/d.txt', 'e']
+    assert table[1]['attributes'] is None
+    assert table[-1]['emptystream'] is False
+    table[1]['digest'] = 1234
+    table[1]['filename'] = 'f'
+    table[2]['origin'] = '/tmp/e'
+    assert dict(table[1]) == {'emptystream': False, 'filename': 'f', 'attributes': None, 'digest': 1234}
+    assert table[0]['digest'] is None
+    assert table.extras == {2: {'origin': '/tmp/e'}}
+    assert table[2].get('origin') == '/tmp/e'
+    assert 'folder' not in table[0]
+    with pytest.raises(IndexError):
+        table[3]
+    columns = table.numeric_columns()
+    assert list(columns['attributes']) == [0x20, -1, 0x10]
+    assert list(columns['emptystream']) == [0, 0, 0]
+
+
+@pytest.mark.unit
+def test_get_headerdata_from_streams():
+    with open(os.path.join(testdata_path, 'test_1.7z'), 'rb') as fp:
+        sig_header = py7zr.archiveinfo.SignatureHeader.retrieve(fp)
+        start_pos = fp.tell()
+        fp.seek(sig_header.nextheaderofs, os.SEEK_CUR)
+        buffer = io.BytesIO(fp.read(sig_header.nextheadersize))
+        assert buffer.read(1) == py7zr.properties.Property.ENCODED_HEADER
+        streams = py7zr.archiveinfo.HeaderStreamsInfo.retrieve(buffer)
+        header = py7zr.archiveinfo.Header()
+        header._start_pos = start_pos
+        data = header._get_headerdata_from_streams(fp, streams)
+        assert len(data.getvalue()) == streams.unpackinfo.folders[0].unpacksizes[-1]
+        assert data.read(1) == py7zr.properties.Property.HEADER
+        streams.unpackinfo.folders[0].crc ^= 1
+        with pytest.raises(py7zr.exceptions.Bad7zFile):
+            header._get_headerdata_from_streams(fp, streams)
+
+
+@pytest.mark.unit
+def test_file_table_loader():
+    table = py7zr.archiveinfo.FileTable(2)
+    calls = []
+
+    def loader():
+        calls.append(True)
+        table.set_column('creationtime', [1, None])
+        table.set_column('lastwritetime', [2, 3])
+
+    table.add_loader(['creationtime', 'lastwritetime'], loader)
+    table.add_loader(['filename'], lambda: table.set_names(['a', 'b/c']))
+    assert table[0]['emptystream'] is False
+    assert calls == []
+    assert table.names() == ['a', 'b/c']
+    assert table[1]['creationtime'] is None
+    assert table[1]['lastwritetime'] == 3
+    assert table.loaders == {}
+    assert len(calls) == 1
+
+
+@pytest.mark.unit
+def test_filesinfo_read_lazy():
+    files_info = py7zr.archiveinfo.FilesInfo()
+    files_info.files = [{'emptystream': False, 'filename': 'a', 'lastwritetime': 1577836800.0,
+                         'creationtime': 1577836800.0, 'lastaccesstime': 1577836800.0, 'attributes': 0x20}]
+    buf = io.BytesIO()
+    files_info.write(buf)
+    buf.seek(1, 0)
+    restored = py7zr.archiveinfo.FilesInfo.retrieve(buf, lazy=True)
+    assert sorted(restored.files.loaders.keys()) == ['attributes', 'creationtime', 'filename',
+                                                     'lastaccesstime', 'lastwritetime']
+    assert restored.files[0]['attributes'] == 0x20
+    assert restored.files.names() == ['a']
+    assert 'attributes' not in restored.files.loaders
+    assert restored.files[0]['lastwritetime'] == 132223104000000000
+
+
+@pytest.mark.unit
+def test_file_table_numpy():
+    numpy = pytest.importorskip('numpy')
+    archive = py7zr.SevenZipFile(os.path.join(testdata_path, 'test_1.7z'), 'r')
+    columns = archive.header.files_info.files.to_numpy()
+    assert isinstance(columns['uncompressed'], numpy.ndarray)
+    assert columns['uncompressed'].tolist() == [0, 111, 58, 559]
+    archive.close()
+
+
+@pytest.mark.unit
+def test_archive_file_view_pickle():
+    archive = py7zr.SevenZipFile(os.path.join(testdata_path, 'test_1.7z'), 'r')
+    members = list(archive.files)
+    assert isinstance(archive.header.files_info.files, py7zr.archiveinfo.FileTable)
+    assert isinstance(members[3]._file_info, py7zr.archiveinfo.FileRecord)
+    restored = pickle.loads(pickle.dumps(members[3]))
+    assert restored.id == 3
+    assert restored.filename == members[3].filename
+    assert restored.uncompressed == members[3].uncompressed
+    assert restored.folder.files is None
+    archive.close()
+
+
 @pytest.mark.unit
 def test_fileinfo_st_fmt():
     file_info = {}
@@ -493,6 +680,36 @@ def test_simple_compress_and_decompress():
     assert out6 == b'Some data\nAnother piece of data\nEven more data\n'
 
 
+def _decompress_all(decompressor, data, chunk_size, max_length):
+    out = []
+    for i in range(0, len(data), chunk_size):
+        out.append(decompressor.decompress(data[i:i + chunk_size], max_length))
+        while not decompressor.needs_input:
+            out.append(decompressor.decompress(b'', max_length))
+            assert len(out[-1]) <= max_length
+    return b''.join(out)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("chunk_size, max_length", [(1000, 7), (1000, 100000), (32248, 8192)])
+def test_deflate_decompressor(chunk_size, max_length):
+    plain = b''.join([b'%d\n' % i for i in range(100000)])
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    data = compressor.compress(plain) + compressor.flush()
+    decompressor = py7zr.extra.DeflateDecompressor()
+    assert _decompress_all(decompressor, data, chunk_size, max_length) == plain
+    assert decompressor.eof
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("chunk_size, max_length", [(1000, 7), (1000, 100000), (32248, 8192)])
+def test_copy_decompressor(chunk_size, max_length):
+    plain = bytes(range(256)) * 1000
+    decompressor = py7zr.extra.CopyDecompressor()
+    assert _decompress_all(decompressor, memoryview(bytearray(plain)), chunk_size, max_length) == plain
+    assert decompressor.decompress(b'abc') == b'abc'
+
+
 @pytest.mark.unit
 def test_aescipher():
     key = b'e\x11\xf1Pz<*\x98*\xe6\xde\xf4\xf6X\x18\xedl\xf2Be\x1a\xca\x19\xd1\\\xeb\xc6\xa6z\xe2\x89\x1d'
@@ -538,6 +755,55 @@ def test_aesdecrypt(monkeypatch):
     assert decompressor.decompress(indata) == expected
 
 
+def _encrypt_lzma2(plain):
+    """Compress plain by LZMA2 and encrypt it with password 'secret' as 7-Zip does.
+    It returns the encrypted data, AES properties and coders after AES coder."""
+    filters = [{'id': lzma.FILTER_LZMA2, 'preset': 1}]
+    compressed = lzma.compress(plain, format=lzma.FORMAT_RAW, filters=filters)
+    salt = b'salt'
+    iv = b'0123456789abcdef'
+    key = py7zr.helpers.calculate_key('secret'.encode('utf-16LE'), 6, salt, 'sha256')
+    data = AES.new(key, AES.MODE_CBC, iv).encrypt(compressed + bytes(-len(compressed) & 15))
+    properties = bytes([6 | 0xc0, ((len(salt) - 1) << 4) | (len(iv) - 1)]) + salt + iv
+    coders = [{'method': py7zr.properties.CompressionMethod.LZMA2, 'numinstreams': 1, 'numoutstreams': 1,
+               'properties': lzma._encode_filter_properties(filters[0])}]
+    return data, properties, coders
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("chunk_size", [7, 16, 1000, 32248, 1000000])
+def test_aesdecompressor_chunks(chunk_size):
+    plain = b''.join([b'%d\n' % i for i in range(20000)])
+    data, properties, coders = _encrypt_lzma2(plain)
+    decompressor = py7zr.compression.AESDecompressor(properties, 'secret', coders)
+    out = []
+    for i in range(0, len(data), chunk_size):
+        out.append(decompressor.decompress(data[i:i + chunk_size], 4096))
+        while not decompressor.needs_input and not decompressor.eof:
+            out.append(decompressor.decompress(b'', 4096))
+    assert b''.join(out) == plain
+    assert decompressor.eof
+
+
+@pytest.mark.unit
+def test_folder_reader_aes_blocksize():
+    plain = b''.join([b'%d\n' % (i * i) for i in range(100000)])
+    data, properties, lzma_coders = _encrypt_lzma2(plain)
+    coders = [{'method': py7zr.properties.CompressionMethod.CRYPT_AES256_SHA256, 'numinstreams': 1,
+               'numoutstreams': 1, 'properties': properties}] + lzma_coders
+    decompressor = py7zr.compression.SevenZipDecompressor(coders, len(data), None, 'secret')
+    reader = py7zr.compression.FolderReader(py7zr.helpers.PositionalReader(io.BytesIO(data)), decompressor, 0, len(data))
+    # encrypted data is read in larger blocks than others
+    assert len(reader._buffer) == min(py7zr.properties.AES_READ_BLOCKSIZE, len(data))
+    assert len(reader._buffer) > py7zr.properties.READ_BLOCKSIZE
+    out = []
+    remaining = len(plain)
+    while remaining > 0:
+        out.append(reader.read(min(remaining, 65536)))
+        remaining -= len(out[-1])
+    assert b''.join(out) == plain
+
+
 @pytest.mark.unit
 def test_archive_password():
     a = py7zr.properties.ArchivePassword('secret')
@@ -579,6 +845,338 @@ def test_calculate_key2_nohash():
         py7zr.helpers._calculate_key2('secret'.encode('utf-16LE'), 16, b'', 'sha123')
 
 
+@pytest.mark.unit
+def test_get_cpu_count():
+    count = py7zr.helpers.get_cpu_count()
+    assert count >= 1
+    assert count <= (os.cpu_count() or 1)
+
+
+@pytest.mark.unit
+def test_positional_reader_file(tmp_path):
+    target = tmp_path.joinpath('data.bin')
+    target.write_bytes(b'0123456789')
+    with target.open('rb') as f:
+        reader = py7zr.helpers.PositionalReader(f)
+        assert reader.is_regular_file
+        assert reader.pread(3, 4) == b'456'
+        assert reader.pread(5, 8) == b'89'
+        assert f.tell() == 0
+
+
+@pytest.mark.unit
+def test_positional_reader_buffer():
+    buf = io.BytesIO(b'0123456789')
+    reader = py7zr.helpers.PositionalReader(buf)
+    assert not reader.is_regular_file
+    assert reader.pread(3, 4) == b'456'
+    assert reader.pread(5, 8) == b'89'
+    buf.close()
+
+
+@pytest.mark.unit
+def test_positional_reader_locked():
+
+    class Stream(io.RawIOBase):
+        def __init__(self, data):
+            self._buf = io.BytesIO(data)
+
+        def seekable(self):
+            return True
+
+        def seek(self, pos, whence=0):
+            return self._buf.seek(pos, whence)
+
+        def read(self, size=-1):
+            return self._buf.read(size)
+
+    reader = py7zr.helpers.PositionalReader(Stream(b'0123456789'))
+    assert reader.pread(3, 4) == b'456'
+    assert reader.pread(2, 0) == b'01'
+
+
+@pytest.mark.unit
+def test_memio():
+    target = py7zr.helpers.MemIO(6)
+    with target.open(mode='wb') as ofp:
+        ofp.write(b'abc')
+        ofp.write(b'def')
+    assert target.buffer.getvalue() == b'abcdef'
+    # grow when data is longer than expected
+    with target.open(mode='wb') as ofp:
+        ofp.write(b'0123')
+        ofp.write(b'4567')
+    assert target.buffer.read() == b'01234567'
+
+
+@pytest.mark.unit
+@pytest.mark.skipif(not hasattr(os, 'pread'), reason="os.pread is required")
+@pytest.mark.parametrize("fallback", [False, True])
+def test_copy_file_range(tmp_path, monkeypatch, fallback):
+    if fallback:
+        monkeypatch.delattr(os, 'copy_file_range', raising=False)
+        monkeypatch.delattr(os, 'sendfile', raising=False)
+    src = tmp_path.joinpath('src')
+    src.write_bytes(bytes(range(256)) * 8192)
+    with src.open('rb') as ifp, tmp_path.joinpath('dst').open('wb') as ofp:
+        ofp.write(b'head')
+        ofp.flush()
+        assert py7zr.helpers.copy_file_range(ifp.fileno(), ofp.fileno(), 100, 1500000) == 1500000
+        assert py7zr.helpers.copy_file_range(ifp.fileno(), ofp.fileno(), 2097100, 1000) == 52
+    assert tmp_path.joinpath('dst').read_bytes() == b'head' + src.read_bytes()[100:1500100] + src.read_bytes()[-52:]
+
+
+@pytest.mark.unit
+def test_worker_copy_crc(tmp_path):
+    archive = py7zr.SevenZipFile(os.path.join(testdata_path, 'copy.7z'), 'r')
+    archive.header.files_info.files[2]['digest'] = 1
+    with pytest.raises(py7zr.exceptions.CrcError):
+        archive.extractall(path=tmp_path)
+    assert archive.worker.crc_errors == [(1, 140667454)]
+    assert tmp_path.joinpath('test1.txt').read_bytes() == b'This file is located in the root.'
+    archive.close()
+    archive = py7zr.SevenZipFile(os.path.join(testdata_path, 'copy.7z'), 'r', copy_crc=False)
+    archive.header.files_info.files[2]['digest'] = 1
+    archive.extractall(path=tmp_path)
+    assert archive.worker.crc_errors == []
+    assert tmp_path.joinpath('test1.txt').read_bytes() == b'This file is located in the root.'
+    archive.close()
+
+
+@pytest.mark.unit
+def test_worker_schedule_folders():
+    archive = py7zr.SevenZipFile(os.path.join(testdata_path, 'mblock_1.7z'), 'r')
+    folders = archive.header.main_streams.unpackinfo.folders
+    schedule = archive.worker._schedule_folders(archive.worker.plan().folders)
+    assert sorted([p.index for p in schedule]) == list(range(len(folders)))
+    sizes = [p.decode_size for p in schedule]
+    assert sizes == sorted(sizes, reverse=True)
+    archive.close()
+
+
+@pytest.mark.unit
+def test_derived_key_cache():
+    cache = py7zr.helpers.DerivedKeyCache(maxsize=2)
+    password = 'secret'.encode('utf-16LE')
+    expected = py7zr.helpers.calculate_key(password, 10, b'salt', 'sha256')
+    assert cache.get(password, 10, b'salt') == expected
+    assert cache.get(password, 10, b'salt') == expected
+    assert len(cache) == 1
+    stored = list(cache._keys.values())[0]
+    cache.get(password, 10, b'salt2')
+    cache.get(password, 10, b'salt3')
+    assert len(cache) == 2
+    # evicted key is wiped
+    assert stored == bytearray(len(expected))
+    cache.clear()
+    assert len(cache) == 0
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("processes", [False, True])
+def test_derived_key_cache_precompute(processes):
+    cache = py7zr.helpers.DerivedKeyCache()
+    password = 'secret'.encode('utf-16LE')
+    params = [(password, 12, b'a'), (password, 12, b'b'), (password, 12, b'a')]
+    cache.precompute(params, max_workers=2, processes=processes)
+    assert len(cache) == 2
+    for _, cycles, salt in params:
+        assert cache.get(password, cycles, salt) == py7zr.helpers.calculate_key(password, cycles, salt, 'sha256')
+
+
+@pytest.mark.unit
+def test_derived_key_cache_precompute_no_processes(monkeypatch):
+    class DaemonicPool:
+        def __init__(self, max_workers=None):
+            raise AssertionError('daemonic processes are not allowed to have children')
+
+    monkeypatch.setattr(py7zr.helpers.concurrent.futures, 'ProcessPoolExecutor', DaemonicPool)
+    cache = py7zr.helpers.DerivedKeyCache()
+    password = 'secret'.encode('utf-16LE')
+    params = [(password, 12, b'a'), (password, 12, b'b')]
+    # processes are not used by default, and keys are derived in place when they cannot start
+    cache.precompute(params, max_workers=2)
+    assert len(cache) == 2
+    cache.clear()
+    cache.precompute(params, max_workers=2, processes=True)
+    assert len(cache) == 2
+    for _, cycles, salt in params:
+        assert cache.get(password, cycles, salt) == py7zr.helpers.calculate_key(password, cycles, salt, 'sha256')
+
+
+@pytest.mark.unit
+def test_scan_lzma2_chunks():
+    data = bytes(range(256)) * 4096
+    compressor = py7zr.compression.SevenZipCompressor(block_size=300000)
+    stream = compressor.compress(data) + compressor.flush()
+    points = py7zr.compression.scan_lzma2_chunks(py7zr.helpers.PositionalReader(io.BytesIO(stream)), 0, len(stream))
+    assert [out for _, out in points] == [0, 300000, 600000, 900000, len(data)]
+    assert points[-1][0] == len(stream) - 1
+    for pos, _ in points[:-1]:
+        assert stream[pos] >= 0xe0
+    # truncated stream
+    assert py7zr.compression.scan_lzma2_chunks(py7zr.helpers.PositionalReader(io.BytesIO(stream[:-1])),
+                                               0, len(stream) - 1) is None
+    # incompressible blocks start with uncompressed chunks
+    noise = random.Random(0)
+    data = b''.join(bytes(noise.getrandbits(8) for _ in range(250000)) + bytes(range(250)) * 200 for _ in range(3))
+    compressor = py7zr.compression.SevenZipCompressor(block_size=300000)
+    stream = compressor.compress(data) + compressor.flush()
+    points = py7zr.compression.scan_lzma2_chunks(py7zr.helpers.PositionalReader(io.BytesIO(stream)), 0, len(stream))
+    assert [out for _, out in points] == [0, 300000, 600000, len(data)]
+    assert [stream[pos] for pos, _ in points] == [0x01, 0x01, 0x01, 0x00]
+
+
+@pytest.mark.unit
+def test_scan_bzip2_blocks():
+    data = b''.join(b'%d: line of data\n' % (i * 7919 % 100003) for i in range(60000))
+    stream = bz2.compress(data, compresslevel=1) + bz2.compress(b'second stream')
+    fp = py7zr.helpers.PositionalReader(io.BytesIO(stream))
+    blocks = py7zr.compression.scan_bzip2_blocks(fp, 0, len(stream))
+    assert len(blocks) > 3
+    assert blocks[0][0] == 32
+    decode = py7zr.compression.SegmentReader._decode_bzip2
+    assert b''.join(decode(fp, start, end) for start, end in blocks) == data + b'second stream'
+    # a block split at a false boundary is decoded together with a following part
+    start, end = blocks[1]
+    segments = [blocks[0], (start, start + 1000), (start + 1000, end)] + blocks[2:]
+    reader = py7zr.compression.SegmentReader(fp, decode, segments, 2, zlib.crc32(data + b'second stream'),
+                                             merge=py7zr.compression.SegmentReader._merge_bzip2)
+    try:
+        out = b''
+        while len(out) < len(data) + 13:
+            out += reader.read(65536)
+        assert out == data + b'second stream'
+        assert reader.crc_error() is None
+    finally:
+        reader.close()
+    assert py7zr.compression.scan_bzip2_blocks(fp, 1, len(stream)) is None
+
+
+@pytest.mark.unit
+def test_segment_reader_queue(monkeypatch):
+    monkeypatch.setattr(py7zr.compression, 'SEGMENT_QUEUE_SIZE', 1000)
+    data = bytes(range(256)) * 20
+
+    def decode(fp, start, end, size):
+        return data[start:end]
+
+    segments = [(i, min(i + 400, len(data)), min(400, len(data) - i)) for i in range(0, len(data), 400)]
+    reader = py7zr.compression.SegmentReader(None, decode, segments, 4, sizeof=lambda segment: segment[2])
+    try:
+        out = b''
+        while len(out) < len(data):
+            # two segments of 400 bytes are in the limit, the limit is less than twice of max_workers segments
+            assert len(reader._pending) + (len(reader._data) > 0) <= 3
+            assert reader._queued <= 1000
+            out += reader.read(300)
+        assert out == data
+        assert len(reader._pending) == 0
+    finally:
+        reader.close()
+    # a larger segment than the limit is decoded alone
+    reader = py7zr.compression.SegmentReader(None, decode, [(0, 3000, 3000), (3000, len(data), len(data) - 3000)], 4,
+                                             sizeof=lambda segment: segment[2])
+    try:
+        assert len(reader._pending) == 1
+        assert reader.read(len(data)) == data[:3000]
+        assert reader.read(len(data)) == data[3000:]
+    finally:
+        reader.close()
+
+
+@pytest.mark.files
+def test_segment_reader_max_segment(tmp_path, monkeypatch):
+    data = b''.join(b'line %d of data\n' % i for i in range(60000))
+    tmp_path.joinpath('data.txt').write_bytes(data)
+    target = tmp_path.joinpath('target.7z')
+    with py7zr.SevenZipFile(target, 'w', block_size=200000) as archive:
+        archive.write(str(tmp_path.joinpath('data.txt')), 'data.txt')
+    monkeypatch.setattr(py7zr.compression, 'LZMA2_SEGMENT_SIZE', 300000)
+    with py7zr.SevenZipFile(target, 'r') as archive:
+        folder = archive.header.main_streams.unpackinfo.folders[0]
+        fp = py7zr.helpers.PositionalReader(archive.fp)
+        src_start = archive.afterheader + archive.header.main_streams.packinfo.packpos
+        src_end = src_start + archive.header.main_streams.packinfo.packsizes[0]
+        reader = py7zr.compression.SegmentReader.create(fp, folder, src_start, src_end, 2)
+        assert reader is not None
+        reader.close()
+        # segments larger than the limit are not held in memory, the folder is decoded sequentially
+        monkeypatch.setattr(py7zr.compression, 'LZMA2_MAX_SEGMENT_SIZE', 350000)
+        assert py7zr.compression.SegmentReader.create(fp, folder, src_start, src_end, 2) is None
+
+
+@pytest.mark.unit
+def test_header_cache(tmp_path):
+    cache = py7zr.helpers.HeaderCache(tmp_path, maxsize=1100)
+    assert cache.get(('a', 1)) is None
+    cache.put(('a', 1), {'data': b'x' * 300})
+    assert cache.get(('a', 1)) == {'data': b'x' * 300}
+    assert cache.get(('a', 2)) is None
+    # broken entry is treated as missing
+    entry = tmp_path / os.listdir(str(tmp_path))[0]
+    entry.write_bytes(py7zr.helpers.HeaderCache.MAGIC + b'broken')
+    assert cache.get(('a', 1)) is None
+    entry.write_bytes(b'other data')
+    assert cache.get(('a', 1)) is None
+    # least recently used entries are evicted
+    cache.put(('a', 1), b'x' * 300)
+    os.utime(str(entry), (0, 0))
+    cache.put(('b', 1), b'y' * 300)
+    cache.put(('c', 1), b'z' * 300)
+    cache.put(('d', 1), b'w' * 300)
+    assert cache.get(('a', 1)) is None
+    assert cache.get(('d', 1)) == b'w' * 300
+    assert len(os.listdir(str(tmp_path))) == 3
+    # too large object is not stored
+    cache.put(('e', 1), b'v' * 1100)
+    assert cache.get(('e', 1)) is None
+    cache.clear()
+    assert os.listdir(str(tmp_path)) == []
+
+
+@pytest.mark.unit
+def test_filesinfo_write():
+    files_info = py7zr.archiveinfo.FilesInfo()
+    files_info.files = [{'filename': 'test', 'emptystream': True, 'attributes': 0x10,
+                         'lastwritetime': 1577836800.0},
+                        {'filename': 'test/a.txt', 'emptystream': False, 'attributes': 0x20,
+                         'creationtime': 1577836800.0, 'lastwritetime': 1577836801.0},
+                        {'filename': 'test/b.txt', 'emptystream': True, 'creationtime': None,
+                         'lastwritetime': py7zr.helpers.ArchiveTimestamp(132223104020000000)}]
+    files_info.emptyfiles = [False, True]
+    buf = io.BytesIO()
+    files_info.write(buf)
+    buf.seek(1, 0)
+    actual = py7zr.archiveinfo.FilesInfo.retrieve(buf)
+    assert buf.read() == b''
+    files = actual.files
+    assert files.names() == ['test', 'test/a.txt', 'test/b.txt']
+    assert [f['emptystream'] for f in files] == [True, False, True]
+    assert actual.emptyfiles == [False, True]
+    assert [f['attributes'] for f in files] == [0x10, 0x20, None]
+    assert [f['creationtime'] for f in files] == [None, 132223104000000000, None]
+    assert [f['lastwritetime'] for f in files] == [132223104000000000, 132223104010000000, 132223104020000000]
+    assert 'lastaccesstime' not in files[0].keys()
+    # a table is written as is
+    buf2 = io.BytesIO()
+    actual.write(buf2)
+    assert buf2.getvalue() == buf.getvalue()
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("encoded", [False, True])
+def test_header_write_crc(encoded):
+    header = py7zr.archiveinfo.Header()
+    header.files_info = py7zr.archiveinfo.FilesInfo()
+    header.files_info.files = [{'filename': 'test%d' % i, 'emptystream': True, 'attributes': 0x10} for i in range(100)]
+    buf = io.BytesIO()
+    buf.write(b'\x00' * 32)
+    startpos, length, crc = header.write(buf, 32, encoded=encoded)
+    assert startpos + length == buf.tell()
+    assert crc == zlib.crc32(buf.getvalue()[startpos:])
+
+
 @pytest.mark.benchmark
 def test_benchmark_calculate_key1(benchmark):
     password = 'secret'.encode('utf-16LE')